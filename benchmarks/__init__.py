@@ -0,0 +1,6 @@
+""" Benchmarks for master.
+
+Run them from the root of the repository, like
+
+    python3 -m benchmarks.startup
+"""
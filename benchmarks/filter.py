@@ -0,0 +1,73 @@
+""" Benchmark list filters on a synthetic vault.
+
+Compares evaluating a filter with eval() on every zettel, the way list used
+to, with evaluating it compiled once by master.util.filter.
+
+    python3 -m benchmarks.filter [--zettels N]
+"""
+import argparse
+import random
+import time
+from datetime import date, timedelta
+
+from libzet import Zettel
+
+from master.util.filter import compile_filter
+
+
+# Each filter as list used to eval it, and in the compiled filter syntax.
+FILTERS = [
+    ('True', 'True'),
+    ('z.attrs["stage"] != "closed"', 'z.attrs["stage"] != "closed"'),
+    ('z.attrs["stage"] == "todo" and z.attrs["assignee"] == "kim"', 'stage == "todo" and assignee == "kim"'),
+    ('"due_date" in z.attrs and z.attrs["due_date"] < date(2022, 11, 1) or "urgent" in z.attrs["tags"]',
+     'due_date < 2022-11-01 or "urgent" in tags'),
+]
+
+
+def synthetic_zettels(n, seed=0):
+    """ Build n zettels in memory with a mix of task-like attributes.
+    """
+    rng = random.Random(seed)
+    start = date(2022, 1, 1)
+    zettels = []
+    for i in range(n):
+        attrs = {
+            'creation_date': start,
+            'stage': rng.choice(['todo', 'implementation', 'review', 'closed']),
+            'assignee': rng.choice(['kim', 'sam', 'alex', None]),
+            'tags': rng.sample(['urgent', 'home', 'work', 'later'], rng.randint(0, 2)),
+        }
+        if rng.random() < 0.5:
+            attrs['due_date'] = start + timedelta(days=rng.randint(0, 730))
+
+        zettels.append(Zettel(f'Zettel {i}', {}, attrs))
+
+    return zettels
+
+
+def bench(fn, zettels):
+    start = time.perf_counter()
+    matched = sum(1 for z in zettels if fn(z))
+    return (time.perf_counter() - start) / len(zettels) * 1e9, matched
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark list filters.')
+    parser.add_argument('--zettels', type=int, default=100000, help='Size of the synthetic vault.')
+    args = parser.parse_args()
+
+    zettels = synthetic_zettels(args.zettels)
+
+    print(f'{"filter":<45} {"eval ns":>9} {"compiled ns":>12} {"matched":>8}')
+    for legacy, expr in FILTERS:
+        old, _ = bench(lambda z: eval(legacy), zettels)
+
+        f = compile_filter(expr)
+        new, matched = bench(f, zettels)
+
+        print(f'{expr:<45} {old:9.0f} {new:12.0f} {matched:8}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+""" Benchmark the memory used to hold a loaded project.
+
+Loads a synthetic project whose index is warm, once as a zettel object per
+task and once into columns of the attributes list filters read, each in a
+fresh interpreter. Reports the memory still held by the result, the peak
+while loading, and the peak resident size of the process.
+
+    python3 -m benchmarks.memory [--zettels N] [--dir DIR]
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.query import make_project
+from master.util.load import load_columns, load_zettels
+
+
+ATTRS = ['stage', 'assignee', 'sprint', 'due_date']
+
+CASES = ['zettels', 'columns']
+
+
+def measure(case, path):
+    """ Load a project the way a case does.
+
+    Returns:
+        A dict of the bytes held by the result and at the peak, the peak
+        resident size in KiB, and the seconds it took.
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    if case == 'zettels':
+        loaded = load_zettels(path, lazy=True)
+    else:
+        loaded = load_columns(path, ATTRS)
+    seconds = time.perf_counter() - start
+
+    held, peak = tracemalloc.get_traced_memory()
+    assert len(loaded)
+    return {'held': held, 'peak': peak, 'maxrss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            'seconds': seconds}
+
+
+def run(case, path):
+    out = subprocess.run(
+        [sys.executable, '-m', 'benchmarks.memory', '--measure', case, '--dir', path],
+        check=True, capture_output=True, text=True).stdout
+    return json.loads(out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the memory of loaded projects.')
+    parser.add_argument('--zettels', type=int, default=20000, help='Size of the synthetic project.')
+    parser.add_argument('--dir', help='Where to create the project. Defaults to a temporary directory.')
+    parser.add_argument('--measure', choices=CASES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(args.measure, args.dir)))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.abspath(args.dir or f'{tmp}/project')
+        if not os.path.exists(f'{path}/ztemplate.yaml'):
+            make_project(path, args.zettels)
+
+        # Warm the index.
+        load_zettels(path, lazy=True)
+
+        print(f'{"case":<10} {"held MiB":>9} {"peak MiB":>9} {"maxrss MiB":>11} {"s":>6}')
+        for case in CASES:
+            r = run(case, path)
+            print(f'{case:<10} {r["held"] / 2**20:9.1f} {r["peak"] / 2**20:9.1f} '
+                  f'{r["maxrss"] / 2**10:11.1f} {r["seconds"]:6.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+""" Benchmark planned list filters on a synthetic project.
+
+Times loading and filtering a project whose index is warm, once scanning
+every zettel and once with the filter planned against the index.
+
+    python3 -m benchmarks.query [--zettels N] [--dir DIR]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+
+from master.util.filter import compile_filter
+from master.util.load import load_zettels
+from master.util.query import plan_filter
+
+
+FILTERS = [
+    'True',
+    'assignee == "kim"',
+    'stage == "todo" and due_date < 2022-02-01',
+    'stage in ("review", "closed") or sprint == 3',
+    'z.title == "Task 7"',
+]
+
+
+def make_project(path, n, seed=0):
+    """ Write a project of n tasks with a mix of indexed attributes.
+    """
+    rng = random.Random(seed)
+    start = date(2022, 1, 1)
+    os.makedirs(path, exist_ok=True)
+    with open(f'{path}/ztemplate.yaml', 'w') as f:
+        f.write('zettel_format: md\n')
+
+    old = time.time() - 60
+    for i in range(n):
+        fname = f'{path}/TP-{i}.md'
+        with open(fname, 'w') as f:
+            f.write(
+                f'# Task {i}\n## Notes\nSome notes.\n<!--- attributes --->\n'
+                f'stage: {rng.choice(["todo", "implementation", "review", "closed"])}\n'
+                f'assignee: {rng.choice(["kim", "sam", "alex", "jo", "lee"])}\n'
+                f'sprint: {rng.randint(1, 20)}\n'
+                f'due_date: {start + timedelta(days=rng.randint(0, 365))}\n')
+
+        # Recently modified files aren't indexed.
+        os.utime(fname, (old, old))
+
+
+def bench(path, expr, planned, runs):
+    f = compile_filter(expr)
+    best = float('inf')
+    for _ in range(runs):
+        start = time.perf_counter()
+        plan = plan_filter(f) if planned else None
+        matched = sum(1 for z in load_zettels(path, lazy=True, where=plan) if f(z))
+        best = min(best, time.perf_counter() - start)
+
+    return best * 1000, matched
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark planned list filters.')
+    parser.add_argument('--zettels', type=int, default=5000, help='Size of the synthetic project.')
+    parser.add_argument('--runs', type=int, default=3, help='Report the best of this many runs.')
+    parser.add_argument('--dir', help='Where to create the project. Defaults to a temporary directory.')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.dir or f'{tmp}/project'
+        if not os.path.exists(f'{path}/ztemplate.yaml'):
+            make_project(path, args.zettels)
+
+        # Warm the index.
+        load_zettels(path, lazy=True)
+
+        print(f'{"filter":<45} {"scan ms":>9} {"planned ms":>11} {"matched":>8}')
+        for expr in FILTERS:
+            scan, matched = bench(path, expr, False, args.runs)
+            planned, check = bench(path, expr, True, args.runs)
+            assert matched == check, expr
+            print(f'{expr:<45} {scan:9.1f} {planned:11.1f} {matched:8}')
+
+
+if __name__ == '__main__':
+    main()
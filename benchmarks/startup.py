@@ -0,0 +1,63 @@
+""" Benchmark the startup time of master.
+
+Each case runs in a fresh interpreter several times. The median time of a
+bare interpreter is subtracted, leaving master's own overhead, which is
+compared against the case's threshold. The exit status is 1 if any case
+exceeds it. Scale the thresholds on machines much slower than a laptop.
+
+    python3 -m benchmarks.startup [--runs N] [--scale X]
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+
+# Name, python code, max overhead in ms. Code runs with the cwd as is.
+CASES = [
+    ('version', 'import sys; sys.argv = ["master", "--version"]; from master.main import main; main()', 120),
+    ('parser', 'from master.parser import create_parser; create_parser().parse_args(["list"])', 50),
+    ('import list', 'import master.main, master.cli.list.main', 300),
+    ('import todo', 'import master.main, master.cli.todo.main', 300),
+]
+
+BASELINE = 'pass'
+
+
+def time_code(code, runs):
+    """ Return the median wall time in ms of running code in a new python.
+    """
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', code], check=True, stdout=subprocess.DEVNULL)
+        times.append((time.perf_counter() - start) * 1000)
+
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the startup time of master.')
+    parser.add_argument('--runs', type=int, default=15, help='Runs per case.')
+    parser.add_argument(
+        '--scale', type=float, default=1.0, help='Multiply every threshold by this.')
+    args = parser.parse_args()
+
+    baseline = time_code(BASELINE, args.runs)
+    print(f'{"interpreter":<12} {baseline:8.1f} ms')
+
+    failed = False
+    for name, code, threshold in CASES:
+        overhead = time_code(code, args.runs) - baseline
+        status = 'ok'
+        if overhead > threshold * args.scale:
+            status = 'REGRESSION'
+            failed = True
+        print(f'{name:<12} {overhead:+8.1f} ms  {status}')
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,310 @@
+""" Benchmark the core commands on a synthetic vault.
+
+Generates a vault with benchmarks.vault, unless DIR already holds one of
+the same size and seed, and times loading its projects, "list" with common
+filters, "todo" and its modes, adding tasks, and batches of "cp", "mv" and
+"rm". Copies also report their throughput. The index is warmed first, so loads are timed the way they usually
+run. Every case runs --runs times and the best and median are kept.
+
+Results are written as JSON with -o, and --compare reports the cases that
+got slower than in an earlier result, exiting with 1 if any did.
+
+    python3 -m benchmarks.suite [--size 10k] [--dir DIR] [-o OUT.json] [--compare OLD.json]
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from argparse import Namespace
+from datetime import datetime
+
+import master
+from benchmarks.vault import REFERENCE, SIZES, make_vault
+from master.Project import Project
+from master.cli.cp.main import do_cp
+from master.cli.list.main import do_list
+from master.cli.mv.main import do_mv
+from master.cli.rm.main import do_rm
+from master.cli.todo.main import do_todo
+from master.util.load import load_zettels
+
+
+MANIFEST = 'vault.json'
+
+# Zettels in each batch of add, cp, mv and rm.
+BATCH = 100
+
+# Attachments copied by "cp attachments", and the size of each.
+ATTACHMENTS = 8
+ATTACHMENT_SIZE = 8 << 20
+
+FILTERS = [
+    ('all', 'True'),
+    ('stage', 'stage == "todo"'),
+    ('sprint', 'assignee == "kim" and sprint == 3'),
+    ('due', f'due_date < {REFERENCE.isoformat()}'),
+    ('tags', '"work" in tags'),
+    ('headings', '"References" in z.headings'),
+]
+
+TODOS = [
+    ('pretty', {}),
+    ('week', {'days': 7}),
+    ('remind', {'remind': True}),
+    ('list-active', {'list_active': True}),
+]
+
+
+class Case:
+    """ A timed benchmark.
+
+    Args:
+        name: Name of the case in the results.
+        run: Function that is timed.
+        setup: Function called before each run, outside the timing.
+        size: Bytes each run copies, to report its throughput.
+    """
+    def __init__(self, name, run, setup=None, size=None):
+        self.name = name
+        self.run = run
+        self.setup = setup
+        self.size = size
+
+
+def _list_args(expr, paths, jobs):
+    return Namespace(filter=expr, explain=False, stream=False, sort=None, limit=None, watch=False,
+                     zettels=paths, jobs=jobs)
+
+
+def _todo_args(paths, jobs, **kwargs):
+    args = {'date': REFERENCE.isoformat(), 'from_': None, 'to': None, 'days': None, 'list_active': False,
+            'remind': False, 'watch': False, 'zettels': paths, 'jobs': jobs}
+    args.update(kwargs)
+    return Namespace(**args)
+
+
+def _fresh(d, files=()):
+    """ Empty d, then copy files into it.
+
+    Returns:
+        The paths of the copies.
+    """
+    shutil.rmtree(d, ignore_errors=True)
+    os.makedirs(d)
+    return [shutil.copy(f, d) for f in files]
+
+
+def _batch(project):
+    files = []
+    for root, dirs, names in os.walk(project):
+        dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+        files.extend(os.path.join(root, n) for n in sorted(names) if n.endswith('.md'))
+        if len(files) >= BATCH:
+            break
+    return files[:BATCH]
+
+
+def cases(projects, scratch, jobs):
+    """ The cases of the suite, in the order they run.
+
+    Cases that change the vault come last, and leave it as they found it.
+    """
+    vault = os.path.dirname(projects['tasks'])
+    paths = list(projects.values())
+
+    for name, path in projects.items():
+        yield Case(f'load {name}', lambda path=path: Project.loadFromDisk(path, jobs=jobs))
+
+    for name, expr in FILTERS:
+        yield Case(f'list {name}', lambda expr=expr: do_list(_list_args(expr, paths, jobs)))
+
+    for name, kwargs in TODOS:
+        yield Case(f'todo {name}', lambda kwargs=kwargs: do_todo(_todo_args([vault], jobs, **kwargs)))
+
+    created = []
+
+    def add():
+        project = Project.loadFromDisk(projects['tasks'], load_tasks=False)
+        created.extend(project.createTask(projects['tasks'], f'Bench {i}') for i in range(BATCH))
+
+    def remove_created():
+        for z in created:
+            os.remove(z.attrs['_loadpath'])
+        created.clear()
+
+    yield Case('add', add, remove_created)
+
+    # Batches of notes are copied out of the vault, so mv and rm don't
+    # touch it.
+    notes = _batch(projects['notes'])
+    moved = []
+
+    def copy(files):
+        _fresh(f'{scratch}/cp')
+        do_cp(Namespace(zettels=files, dest=f'{scratch}/cp', jobs=jobs))
+
+    # Large files next to the notes, like images.
+    attachments = f'{scratch}/attachments'
+    os.makedirs(attachments)
+    for i in range(ATTACHMENTS):
+        with open(f'{attachments}/{i}.bin', 'wb') as f:
+            f.write(os.urandom(ATTACHMENT_SIZE))
+
+    def setup_mv():
+        moved[:] = _fresh(f'{scratch}/mv', notes)
+        _fresh(f'{scratch}/mv-dest')
+
+    def setup_rm():
+        moved[:] = _fresh(f'{scratch}/rm', notes)
+
+    def move():
+        do_mv(Namespace(zettels=moved, dest=f'{scratch}/mv-dest', jobs=jobs, resume=False, rollback=False))
+
+    def remove():
+        do_rm(Namespace(zettels=moved, jobs=jobs, resume=False, rollback=False))
+
+    yield Case('cp', lambda: copy(notes), size=sum(os.path.getsize(f) for f in notes))
+    yield Case('cp attachments', lambda: copy([attachments]), size=ATTACHMENTS * ATTACHMENT_SIZE)
+    yield Case('mv', move, setup_mv)
+    yield Case('rm', remove, setup_rm)
+
+    # Undo the last run of add.
+    remove_created()
+
+
+def measure(case, runs):
+    """ Time the runs of a case.
+
+    Returns:
+        A dict of the best and median seconds, and of every run.
+    """
+    times = []
+    with open(os.devnull, 'w') as devnull:
+        for _ in range(runs):
+            if case.setup:
+                case.setup()
+            with contextlib.redirect_stdout(devnull):
+                start = time.perf_counter()
+                case.run()
+                times.append(time.perf_counter() - start)
+
+    r = {'best': min(times), 'median': statistics.median(times), 'runs': times}
+    if case.size:
+        r['bytes'] = case.size
+        r['throughput'] = case.size / r['median']
+    return r
+
+
+def prepare(path, size, seed):
+    """ Generate the vault at path, unless it's already there.
+
+    Returns:
+        A dict of project names to their paths.
+    """
+    manifest = os.path.join(path, MANIFEST)
+    wanted = {'size': size, 'seed': seed}
+    try:
+        with open(manifest) as f:
+            found = json.load(f)
+    except (OSError, ValueError):
+        found = None
+
+    if found is not None and found.get('size') == size and found.get('seed') == seed:
+        return found['projects']
+
+    if os.path.exists(path) and os.listdir(path):
+        sys.exit(f'ERROR: {path} is not empty and holds no {size} vault with seed {seed}.')
+
+    start = time.perf_counter()
+    projects = make_vault(path, SIZES[size], seed)
+    print(f'Generated {size} zettels in {time.perf_counter() - start:.1f}s.', file=sys.stderr)
+
+    with open(manifest, 'w') as f:
+        json.dump(dict(wanted, projects=projects), f)
+    return projects
+
+
+def compare(results, old, threshold):
+    """ Print how each case changed since an earlier result.
+
+    Returns:
+        Names of the cases whose median grew by more than threshold.
+    """
+    slower = []
+    for name, r in results['results'].items():
+        before = old['results'].get(name)
+        if before is None:
+            continue
+        ratio = r['median'] / before['median'] if before['median'] else float('inf')
+        flag = ''
+        if ratio > 1 + threshold:
+            slower.append(name)
+            flag = '  SLOWER'
+        print(f'{name:<20} {before["median"]:9.4f} {r["median"]:9.4f} {ratio:6.2f}x{flag}')
+    return slower
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the core commands on a synthetic vault.')
+    parser.add_argument('--size', choices=SIZES, default='10k', help='Number of zettels in the vault.')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the vault.')
+    parser.add_argument('--dir', help='Where to keep the vault. Defaults to a temporary directory.')
+    parser.add_argument('--runs', type=int, default=5, help='Runs of each case.')
+    parser.add_argument('--jobs', type=int, help='Processes used to parse zettels.')
+    parser.add_argument('-o', '--output', help='Write the results to this JSON file.')
+    parser.add_argument('--compare', metavar='OLD', help='Compare with the results in this JSON file.')
+    parser.add_argument(
+        '--threshold', type=float, default=0.25,
+        help='Fraction by which a median may grow before --compare reports it. Defaults to 0.25.')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # The caches of todo and dates would otherwise be shared with the
+        # user's, and the editor would be opened for new tasks.
+        os.environ['XDG_CACHE_HOME'] = f'{tmp}/cache'
+        os.environ['EDITOR'] = 'true'
+
+        projects = prepare(os.path.abspath(args.dir or f'{tmp}/vault'), args.size, args.seed)
+
+        # Warm the index.
+        load_zettels(list(projects.values()), jobs=args.jobs, lazy=True)
+
+        results = {
+            'version': getattr(master, '__version__', None),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'size': args.size,
+            'seed': args.seed,
+            'results': {},
+        }
+        print(f'{"case":<20} {"best":>9} {"median":>9}')
+        for case in cases(projects, f'{tmp}/scratch', args.jobs):
+            r = measure(case, args.runs)
+            results['results'][case.name] = r
+            throughput = f'{r["throughput"] / 2**20:9.1f} MiB/s' if 'throughput' in r else ''
+            print(f'{case.name:<20} {r["best"]:9.4f} {r["median"]:9.4f} {throughput}'.rstrip())
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            old = json.load(f)
+        if old.get('size') != args.size:
+            print(f'WARNING: comparing with a {old.get("size")} vault.', file=sys.stderr)
+        print(f'\n{"case":<20} {"before":>9} {"after":>9} {"ratio":>7}')
+        if compare(results, old, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
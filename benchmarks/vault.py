@@ -0,0 +1,204 @@
+""" Generate synthetic vaults for benchmarks.
+
+A vault holds a project made from each template; notes, tasks, agile and
+calendar, in a mix that follows the sizes of real vaults. Attributes and
+recurrences are drawn from fixed distributions with a seeded generator,
+so a vault of a given size and seed is the same on every machine. Dates
+are spread around REFERENCE, which is what benchmarks should pass as
+todo's --date.
+
+Tasks are sharded by creation month, like projects with a task_shard,
+so no directory holds more than a few thousand zettels. Files are aged so
+the index trusts them.
+
+    python3 -m benchmarks.vault DIR [--size 10k] [--seed 0]
+"""
+import argparse
+import os
+import random
+import time
+from datetime import date, datetime, timedelta
+
+from master.Project import Project
+from master.configs.agile import agile
+from master.configs.calendar import calendar
+from master.configs.note import note
+from master.configs.task import task
+
+
+SIZES = {'1k': 1000, '10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+
+# Day the vault's dates are spread around.
+REFERENCE = date(2024, 1, 1)
+
+# Share of the vault each project takes up.
+MIX = [('notes', note, 0.4), ('tasks', task, 0.3), ('agile', agile, 0.2), ('calendar', calendar, 0.1)]
+
+SHARD = '%Y/%m'
+
+# (value, weight) distributions.
+STAGES = [('todo', 35), ('implementation', 20), ('testing', 5), ('review', 10), ('closed', 30)]
+RRULES = [
+    (None, 60),
+    ('FREQ=WEEKLY;BYDAY=MO,WE,FR', 10),
+    ('FREQ=WEEKLY', 10),
+    ('FREQ=DAILY', 5),
+    ('FREQ=WEEKLY;INTERVAL=2', 5),
+    ('FREQ=MONTHLY;BYMONTHDAY={day}', 6),
+    ('FREQ=YEARLY', 4),
+]
+DURATIONS = [('30m', 30), ('1h', 35), ('1h 30m', 10), ('2h', 15), ('4h 30m', 5), (None, 5)]
+ASSIGNEES = ['kim', 'sam', 'alex', 'jo', 'lee', 'ari', 'max', 'noa']
+TAGS = ['work', 'home', 'reading', 'idea', 'meeting', 'travel', 'health', 'finance', 'project', 'draft']
+WORDS = ('lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor incididunt ut labore '
+         'et dolore magna aliqua').split()
+
+
+def _choice(rng, weighted):
+    values, weights = zip(*weighted)
+    return rng.choices(values, weights)[0]
+
+
+def _date(d):
+    return d.strftime('%Y-%m-%d, %a')
+
+
+def _datetime(d):
+    return d.strftime('%Y-%m-%d, %a, %H:%M')
+
+
+def _text(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+
+def _common(rng, i, kind):
+    created = REFERENCE - timedelta(days=rng.randint(0, 5 * 365))
+    return created, {
+        'creation_date': _date(created),
+        'creator': rng.choice(ASSIGNEES),
+        'id': f'{kind}-{i}',
+        'tags': sorted(rng.sample(TAGS, rng.choice([0, 0, 1, 1, 2, 3]))),
+    }
+
+
+def make_note(rng, i):
+    created, attrs = _common(rng, i, 'note')
+    headings = {'Notes': _text(rng, rng.randint(20, 400))}
+    if rng.random() < 0.3:
+        headings['References'] = _text(rng, 10)
+    return created, f'Note {i}', headings, attrs
+
+
+def make_task(rng, i):
+    created, attrs = _common(rng, i, 'task')
+    if rng.random() < 0.7:
+        attrs['due_date'] = _date(REFERENCE + timedelta(days=rng.randint(-180, 180)))
+    attrs['stage'] = _choice(rng, STAGES)
+    return created, f'Task {i}', {'Notes': _text(rng, rng.randint(5, 100))}, attrs
+
+
+def make_agile(rng, i):
+    created, attrs = _common(rng, i, 'agile')
+    stage = _choice(rng, STAGES)
+    attrs.update({
+        'assignee': rng.choice(ASSIGNEES),
+        'sprint': rng.randint(1, 40),
+        'estimate': rng.choice([1, 2, 3, 5, 8, 13]),
+        'stage': stage,
+        'type': 'epic' if rng.random() < 0.15 else 'story',
+        'value': rng.choice(['high', 'medium', 'low']),
+        'resolution': rng.choice(['completed', "won't do"]) if stage == 'closed' else None,
+    })
+    return created, f'Story {i}', {'Notes': _text(rng, rng.randint(5, 150))}, attrs
+
+
+def make_event(rng, i):
+    created, attrs = _common(rng, i, 'event')
+    day = REFERENCE + timedelta(days=rng.randint(-365, 365))
+    if rng.random() < 0.2:
+        attrs['event_begin'] = _date(day)
+        if rng.random() < 0.5:
+            attrs['event_end'] = _date(day + timedelta(days=rng.randint(1, 5)))
+    else:
+        begin = datetime.combine(day, datetime.min.time()) + timedelta(minutes=30 * rng.randint(14, 40))
+        attrs['event_begin'] = _datetime(begin)
+        attrs['duration'] = _choice(rng, DURATIONS)
+
+    rrule = _choice(rng, RRULES)
+    if rrule:
+        attrs['recurring'] = rrule.format(day=day.day)
+        if rng.random() < 0.5:
+            attrs['recurring_stop'] = _date(day + timedelta(days=rng.randint(30, 720)))
+    return created, f'Event {i}', {}, attrs
+
+
+MAKERS = {'notes': make_note, 'tasks': make_task, 'agile': make_agile, 'calendar': make_event}
+
+
+def _yaml(v):
+    if v is None:
+        return ''
+    if isinstance(v, list):
+        return '[' + ', '.join(v) + ']'
+    if isinstance(v, str) and ("'" in v or ':' in v or ',' in v):
+        return "'" + v.replace("'", "''") + "'"
+    return str(v)
+
+
+def render(title, headings, attrs):
+    """ Write a zettel the way libzet does.
+    """
+    lines = [f'# {title}']
+    for h, text in headings.items():
+        lines.extend([f'## {h}', text])
+    lines.append('<!--- attributes --->')
+    lines.extend(f'{k}: {_yaml(v)}' for k, v in attrs.items())
+    return '\n'.join(lines) + '\n'
+
+
+def make_vault(path, n, seed=0):
+    """ Write a vault of n zettels.
+
+    Returns:
+        A dict of project names to their paths.
+    """
+    rng = random.Random(seed)
+    old = time.time() - 60
+    projects = {}
+    for name, template, share in MIX:
+        project = os.path.join(path, name)
+        projects[name] = project
+        if not os.path.exists(f'{project}/ztemplate.yaml'):
+            os.makedirs(path, exist_ok=True)
+            template = template.replace('\ntask_shard:\n', '\n')
+            Project.initOnDisk(project, f'{template}\ntask_shard: "{SHARD}"\n')
+
+        for i in range(int(n * share)):
+            created, title, headings, attrs = MAKERS[name](rng, i)
+            d = os.path.join(project, created.strftime(SHARD))
+            os.makedirs(d, exist_ok=True)
+
+            fname = f'{d}/{name}-{i}.md'
+            with open(fname, 'w') as f:
+                f.write(render(title, headings, attrs))
+
+            # Recently modified files aren't indexed.
+            os.utime(fname, (old, old))
+
+    return projects
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic vault.')
+    parser.add_argument('dir', help='Where to create the vault.')
+    parser.add_argument('--size', choices=SIZES, default='10k', help='Number of zettels.')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the generator.')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    make_vault(args.dir, SIZES[args.size], args.seed)
+    print(f'Wrote {SIZES[args.size]} zettels to {args.dir} in {time.perf_counter() - start:.1f}s.')
+
+
+if __name__ == '__main__':
+    main()
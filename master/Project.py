@@ -4,10 +4,47 @@ import os
 import re
 from glob import glob
 
-from libzet import Attributes, create_zettel, load_zettels
+from libzet import Attributes, Zettel, create_zettel, edit_zettels, save_zettels
 import yaml
 
 from master.configs.note import note
+from master.util.ids import allocate_ids
+from master.util.layout import DATE_PREFIX, shard_depth, shard_dir, task_prefix
+from master.util.load import load_zettels
+
+
+def _create_reserved(path, title, zettel_format, template):
+    """ Create a zettel like create_zettel, over the empty file reserved for it.
+
+    create_zettel refuses to write over existing files, and removing the
+    reserved file first would let another task take its name in between.
+    The reserved file is removed if nothing was written to it.
+
+    Args:
+        path: The reserved file.
+        title: Title of the zettel.
+        zettel_format: md or rst.
+        template: Path to a ztemplate.yaml, which may not exist.
+
+    Returns:
+        The new zettel.
+
+    Raises:
+        ValueError if the zettel was edited into an invalid one.
+    """
+    settings = Attributes.fromYaml(template) if os.path.exists(template) else Attributes()
+    headings = {k: '' for k in settings['headings']} if 'headings' in settings and settings['headings'] else None
+    attrs = settings['attrs'] if 'attrs' in settings else None
+
+    z = Zettel(title, headings, attrs)
+    z.attrs['_loadpath'] = path
+    try:
+        edit_zettels([z], zettel_format, headings)
+    finally:
+        if os.path.exists(path) and not os.path.getsize(path):
+            os.remove(path)
+
+    return z
 
 
 class Project:
@@ -104,7 +141,7 @@ class Project:
         return Project.loadFromDisk(path)
 
     @classmethod
-    def loadFromDisk(cls, path):
+    def loadFromDisk(cls, path, jobs=None, load_tasks=True):
         """ Load a project from disk.
 
         Projects will be recursively loaded from a path on the
@@ -113,6 +150,9 @@ class Project:
 
         Args:
             path: Dir where project is located.
+            jobs: Number of processes used to parse tasks.
+            load_tasks: False to only load the settings, for adding tasks
+                to large projects.
 
         Returns: A new Project instance. None if the path didn't
             contain a project config.
@@ -124,17 +164,20 @@ class Project:
             settings = {}
 
         p = Project(settings, None)
+        if not load_tasks:
+            return p
 
-        # Init the project with current settings.
+        # Init the project with current settings. This includes sharded tasks.
         fmt = p.settings['zettel_format']
-        p.tasks = load_zettels(path, zettel_format=fmt)
+        p.tasks = load_zettels(path, zettel_format=fmt, jobs=jobs)
 
         return p
 
     def createTask(self, path, title):
         """ Create a new task for this project.
 
-        The task will also be written to disk.
+        The task will also be written to disk. It's created in the shard of
+        path for today if the project shards its tasks.
 
         Args:
             creator: Username of the person creating the task.
@@ -148,17 +191,87 @@ class Project:
         """
         fmt = self.settings['zettel_format']
         title = title or 'MyNewZettel'
-        if 'task_prefix' in self.settings:
-            newid = 1
-            prefix = self.settings['task_prefix']
-            while os.path.exists(f'{path}/{prefix}-{newid}.{fmt}'):
-                newid += 1
-
-            title = f'{prefix}-{newid}'
+        template = f'{path}/ztemplate.yaml'
+        dest = shard_dir(path, self.settings)
+        os.makedirs(dest, exist_ok=True)
 
-        path = f'{path}/{title}.{fmt}'
-
-        z = create_zettel(path, title=f'{title}', zettel_format=fmt)
+        prefix = task_prefix(self.settings)
+        if prefix is not None:
+            newid, reserved = self._allocate(path, dest, prefix)[0]
+            z = _create_reserved(reserved, f'{prefix}-{newid}', fmt, template)
+        else:
+            z = create_zettel(f'{dest}/{title}.{fmt}', title=f'{title}', zettel_format=fmt, template=template)
 
         self.tasks.append(z)
         return z
+
+    def _allocate(self, path, dest, prefix, count=1):
+        """ Allocate IDs of new tasks. See allocate_ids.
+        """
+        # Same-date IDs can only be in today's shard.
+        depth = 0 if self.settings['task_prefix'] == DATE_PREFIX else shard_depth(self.settings)
+        return allocate_ids(path, prefix, self.settings['zettel_format'], count, dest, depth)
+
+    def reserveTasks(self, path, dest, count):
+        """ Reserve the IDs and files of tasks put into this project.
+
+        Args:
+            path: Dir of the project.
+            dest: Dir of the project the tasks are put in.
+            count: Number of tasks.
+
+        Returns:
+            List of (id, path) tuples of the reserved files, which are
+            empty. IDs are what createTask titles tasks with.
+
+        Raises:
+            ValueError if the project doesn't prefix the IDs of its tasks.
+            OSError if the files couldn't be reserved.
+        """
+        prefix = task_prefix(self.settings)
+        if prefix is None:
+            raise ValueError('Tasks can only be reserved in projects with a task_prefix.')
+
+        return [(f'{prefix}-{i}', fname) for i, fname in self._allocate(path, dest, prefix, count)]
+
+    def createTasks(self, path, zettels):
+        """ Create many tasks for this project at once.
+
+        The tasks get their IDs the way createTask gives them, but all of
+        them at once, and they're written without being edited. They keep
+        their titles; only their files are named after their IDs. Template
+        attributes they don't have are added. They aren't added to
+        self.tasks, so any number of them may be created in batches.
+
+        Args:
+            path: Dir of the project.
+            zettels: Zettels to create.
+
+        Returns:
+            List of the paths the tasks were written to.
+
+        Raises:
+            ValueError if the project doesn't prefix the IDs of its tasks.
+            OSError if the tasks couldn't be written.
+        """
+        prefix = task_prefix(self.settings)
+        if prefix is None:
+            raise ValueError('Tasks can only be created in bulk in projects with a task_prefix.')
+
+        fmt = self.settings['zettel_format']
+        dest = shard_dir(path, self.settings)
+        os.makedirs(dest, exist_ok=True)
+
+        defaults = self.settings['attrs'] if 'attrs' in self.settings and self.settings['attrs'] else {}
+        reserved = self._allocate(path, dest, prefix, len(zettels))
+
+        for z, (_, fname) in zip(zettels, reserved):
+            for k, v in defaults.items():
+                if k not in z.attrs:
+                    z.attrs[k] = v
+
+            # The reserved file is overwritten.
+            z.attrs['_loadpath'] = fname
+
+        save_zettels(zettels, fmt)
+        return [fname for _, fname in reserved]
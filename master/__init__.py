@@ -1,9 +1,19 @@
 import sys
 
-# Determine app version from packaging.
-if sys.version_info >= (3, 8):
-    from importlib import metadata
-else:
-    import importlib_metadata as metadata
 
-__version__ = metadata.version('master')
+def __getattr__(name):
+    """ Determine app version from packaging, only when asked for.
+
+    Reading package metadata is slow enough to matter to startup time.
+    """
+    if name != '__version__':
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+    if sys.version_info >= (3, 8):
+        from importlib import metadata
+    else:
+        import importlib_metadata as metadata
+
+    global __version__
+    __version__ = metadata.version('master')
+    return __version__
@@ -1,34 +1,36 @@
 import importlib
-import inspect
 import os
 
 
 _pkg_root = os.path.dirname(os.path.abspath(__file__))
 
 
-def get_avail_subcommands(pkg_root):
-    """ List available subcommands within a module.
+def get_subcommands():
+    """ List every subcommand and the function building its parser.
 
-    Args:
-        pkg_root: a path to the root of the subpackage to be searched.
+    The list comes from the registry generated at build time. Source trees
+    that were never built fall back to scanning the package.
 
     Returns:
-        A list of strings representing the names of all subpackages
-        present in the given directory.
+        A list of (subpackage, function name) tuples.
     """
-    return [dname for dname in sorted(os.listdir(pkg_root)) if
-            os.path.isdir(os.path.join(pkg_root, dname))
-            and '__pycache__' not in dname]
+    try:
+        from master.cli._registry import SUBCOMMANDS
+    except ImportError:
+        from master.cli.registry import scan_subcommands
+        SUBCOMMANDS = scan_subcommands(_pkg_root)
+
+    return SUBCOMMANDS
 
 
 def build_out_subparsers(subparser_hook):
     """Adds subcommand subparsers to a parent parser.
 
-    This command will dynamically search all subpackages of `master.cli`,
-    import the `parser` submodule of every subpackage, and execute a
-    function named `add_*_subparser` on a `subparsers` object returned
-    by `ArgumentParser.add_subparsers()`. This will have the effect of
-    creating all subparsers for all available subcommands.
+    This command will import the `parser` submodule of every subcommand
+    listed by `get_subcommands`, and execute its `add_*_subparser` function
+    on a `subparsers` object returned by `ArgumentParser.add_subparsers()`.
+    This will have the effect of creating all subparsers for all available
+    subcommands.
 
     Args:
         subparser_hook: an object returned by
@@ -37,16 +39,6 @@ def build_out_subparsers(subparser_hook):
     Returns:
         None
     """
-    parser_modules = [importlib.import_module(f'master.cli.{x}.parser') for x in get_avail_subcommands(_pkg_root)]
-    parser_builders = []
-    for module in parser_modules:
-        fns = [item for name, item in inspect.getmembers(module)
-               if inspect.isfunction(item) and name.startswith('add_')
-               and name.endswith('_subparser')]
-        if len(fns) != 1:
-            raise RuntimeError(f'Too many functions in {module.__name__}')
-        else:
-            parser_builders.extend(fns)
-
-    for builder in parser_builders:
-        builder(subparser_hook)
+    for name, builder in get_subcommands():
+        module = importlib.import_module(f'master.cli.{name}.parser')
+        getattr(module, builder)(subparser_hook)
@@ -5,7 +5,7 @@ from master.Project import Project
 
 def do_add(args):
     args.project = args.project or './'
-    p = Project.loadFromDisk(args.project)
+    p = Project.loadFromDisk(args.project, jobs=args.jobs, load_tasks=False)
 
     title = ''
     if not os.path.isdir(args.project):
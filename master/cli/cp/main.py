@@ -1,7 +1,44 @@
-from libzet import load_zettels, copy_zettels
+import os
+import sys
+
+from master.Project import Project
+from master.util.fileops import copy_all, plan_copy
+from master.util.index import find_index_root
+from master.util.layout import task_id_re
+from master.util.profile import phase
+
+
+def _ids(dest):
+    """ Allocator of the IDs of tasks copied into dest.
+
+    Returns:
+        (ids, task_re) tuple for plan_copy, or (None, None) if dest isn't a
+        directory of a project that prefixes its tasks.
+    """
+    root = find_index_root(dest) if os.path.isdir(dest) else None
+    if not root:
+        return None, None
+
+    project = Project.loadFromDisk(root, load_tasks=False)
+    task_re = task_id_re(project.settings)
+    if task_re is None:
+        return None, None
+
+    return (lambda d, count: project.reserveTasks(root, d, count)), task_re
 
 
 def do_cp(args):
 
-    zettels = load_zettels(args.zettels)
-    copy_zettels(zettels, args.dest)
+    try:
+        with phase('plan'):
+            mkdirs, copies = plan_copy(args.zettels, args.dest, *_ids(args.dest))
+    except ValueError as e:
+        print(f'ERROR: {e}')
+        sys.exit(1)
+
+    try:
+        with phase('copy'):
+            copy_all(mkdirs, copies, args.jobs)
+    except OSError as e:
+        print(f'ERROR: {e}')
+        sys.exit(1)
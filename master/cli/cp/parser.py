@@ -2,9 +2,11 @@ def add_cp_subparser(subparsers):
 
     parser = subparsers.add_parser(
         'cp', help='Copy zettels.',
-        description='Copy zettels.')
+        description=(
+            'Copy zettels and directories. Zettels copied into a project '
+            'that prefixes its tasks get new IDs.'))
 
     parser.add_argument(
-        'zettels', metavar='task', help='Zettels to copy.', nargs='+')
+        'zettels', metavar='task', help='Zettels or directories to copy.', nargs='+')
 
     parser.add_argument('dest', help='Destination.')
@@ -1,7 +1,9 @@
-from libzet import load_zettels, edit_zettels
+from libzet import edit_zettels
+
+from master.util.load import load_zettels
 
 
 def do_edit(args):
 
-    zettels = load_zettels(args.zettels)
+    zettels = load_zettels(args.zettels, jobs=args.jobs)
     edit_zettels(zettels, headings=args.headings, delete=True)
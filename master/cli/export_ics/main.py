@@ -0,0 +1,173 @@
+""" Export the events of zettels to an iCalendar file.
+
+Events are written one at a time rather than collected into a Calendar.
+Each event's serialized VEVENT is cached along with the mtime and size of
+its zettel and the dates it was made from, so exporting again only
+serializes the events whose zettels changed, or whose relative dates
+resolve to another day. Changed events get a higher SEQUENCE, so calendar
+clients pick up the change.
+"""
+import hashlib
+import os
+import sys
+from datetime import date, datetime, timezone
+
+from master.cli.todo.main import SCHEDULE_ATTRS, extract_vevents, is_schedulable
+from master.util.cache import EventCache, cache_key
+from master.util.load import load_zettels
+from master.util.query import ActiveWindow
+
+
+_header = b'BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//master//export-ics//EN\r\n'
+_footer = b'END:VCALENDAR\r\n'
+
+
+def export_base(paths):
+    """ Directory the UIDs of zettels under some paths are relative to.
+    """
+    if type(paths) is not list:
+        paths = [paths]
+
+    dirs = [os.path.abspath(p if os.path.isdir(p) else os.path.dirname(p) or '.') for p in paths]
+    return os.path.commonpath(dirs)
+
+
+def event_uid(z, base):
+    """ Get the UID of a zettel's event.
+
+    UIDs come from the zettel's uid attribute if it has one. Otherwise
+    they're made from the zettel's path relative to base, so they stay the
+    same as long as the zettel isn't moved.
+
+    Args:
+        z: Zettel with a _loadpath attribute.
+        base: See export_base.
+    """
+    if 'uid' in z.attrs and z.attrs['uid']:
+        return str(z.attrs['uid'])
+
+    rel = os.path.relpath(os.path.abspath(z.attrs['_loadpath']), base)
+    return f'{hashlib.sha1(rel.encode()).hexdigest()}@master'
+
+
+def dates_key(z):
+    """ Key of the resolved scheduling attributes of a zettel.
+
+    It changes when relative dates, like "tomorrow", resolve differently.
+    """
+    return cache_key([z.attrs.get(k) for k in SCHEDULE_ATTRS])
+
+
+def _serialize(e, row):
+    """ Serialize an event, bumping its SEQUENCE if it changed.
+
+    Args:
+        e: icalendar.Event without a SEQUENCE.
+        row: The cached (mtime, size, dates, sequence, digest, vevent) of
+            the event, or None.
+
+    Returns:
+        (sequence, digest, vevent) tuple.
+    """
+    # DTSTAMP is when the event was serialized, not part of what changed.
+    e.pop('DTSTAMP', None)
+    digest = hashlib.sha1(e.to_ical()).hexdigest()
+    if row and row[4] == digest:
+        return row[3:]
+
+    sequence = row[3] + 1 if row else 0
+    e.add('dtstamp', datetime.now(timezone.utc))
+    e.add('sequence', sequence)
+    return sequence, digest, e.to_ical()
+
+
+def export_events(zettels, out, base, cache=None):
+    """ Write the events of zettels to a file.
+
+    Only the VEVENTs are written; see write_calendar for a whole calendar.
+
+    Args:
+        zettels: Zettels with _loadpath attributes.
+        out: Binary file to write to.
+        base: See export_base.
+        cache: An EventCache. Zettels that haven't changed since they were
+            cached, and whose dates resolve the same, are written from it,
+            and the rest are added to it.
+
+    Returns:
+        (exported, serialized) tuple counting the events written and the
+        events that had to be serialized.
+    """
+    cached = cache.lookup() if cache else {}
+    uids = []
+    misses = []
+    for z in filter(is_schedulable, zettels):
+        st = os.stat(z.attrs['_loadpath'])
+        uid = event_uid(z, base)
+        dates = dates_key(z)
+        row = cached.get(uid)
+        if row and row[:3] == (st.st_mtime_ns, st.st_size, dates):
+            out.write(row[5])
+            uids.append(uid)
+        else:
+            misses.append((z, uid, st, dates))
+
+    hits = len(uids)
+    found = {id(z): (uid, st, dates) for z, uid, st, dates in misses}
+    for z, e in extract_vevents([m[0] for m in misses], [m[1] for m in misses]):
+        uid, st, dates = found[id(z)]
+        sequence, digest, vevent = _serialize(e, cached.get(uid))
+        out.write(vevent)
+        uids.append(uid)
+        if cache:
+            cache.store(uid, st.st_mtime_ns, st.st_size, dates, sequence, digest, vevent)
+
+    if cache:
+        cache.commit(keep=uids)
+
+    return len(uids), len(uids) - hits
+
+
+def write_calendar(zettels, out, base, cache=None):
+    """ Write the events of zettels as an iCalendar file.
+
+    See export_events.
+    """
+    out.write(_header)
+    counts = export_events(zettels, out, base, cache)
+    out.write(_footer)
+
+    return counts
+
+
+def do_export_ics(args):
+    """ Export the events of zettels to an iCalendar file.
+    """
+    base = export_base(args.zettels)
+
+    # Only zettels with events have active spans in the index.
+    zettels = load_zettels(args.zettels, recurse=True, jobs=args.jobs, lazy=True, where=ActiveWindow(date.min))
+
+    feed = os.path.abspath(args.output) if args.output else base
+    cache = EventCache.open(feed)
+    try:
+        if not args.output:
+            write_calendar(zettels, sys.stdout.buffer, base, cache)
+            return
+
+        tmp = f'{args.output}.{os.getpid()}.tmp'
+        try:
+            with open(tmp, 'wb') as f:
+                write_calendar(zettels, f, base, cache)
+            os.replace(tmp, args.output)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    except ValueError as e:
+        print(f'ERROR: {e}')
+        sys.exit(1)
+
+    finally:
+        if cache:
+            cache.close()
@@ -0,0 +1,16 @@
+def add_export_ics_subparser(subparsers):
+
+    parser = subparsers.add_parser(
+        'export-ics', help='Export events to an iCalendar file.',
+        description=(
+            'Export the events of zettels to an iCalendar file. Events are '
+            'only serialized again when their zettel changed.'))
+
+    parser.add_argument(
+        'zettels', metavar='zettel', default='.', nargs='*',
+        help='Paths (dirs or files) to zettels.')
+
+    parser.add_argument(
+        '-o', '--output', metavar='FILE', help=(
+            'File to write the calendar to. It is replaced once the export '
+            'is complete. Defaults to stdout.'))
@@ -0,0 +1,162 @@
+""" Import the events of an iCalendar file into a project.
+
+The file is read one event at a time, and events are written to the
+project in batches, so calendars of any size are imported in constant
+memory. Each event becomes a zettel with the attributes of the calendar
+template.
+"""
+import sys
+from itertools import islice
+
+from libzet import Zettel
+
+from master.Project import Project
+from master.util.ics import iter_events, parse_value_date, parse_value_duration, unescape
+
+
+# Events written to the project at once.
+BATCH_SIZE = 500
+
+
+def format_duration(d):
+    """ Write a timedelta the way the calendar template does, like 4h 30m.
+
+    Returns:
+        The str, or None if d is shorter than a minute.
+    """
+    minutes = int(d.total_seconds() // 60)
+    if minutes <= 0:
+        return None
+
+    days, minutes = divmod(minutes, 24 * 60)
+    hours, minutes = divmod(minutes, 60)
+    parts = [f'{n}{unit}' for n, unit in [(days, 'd'), (hours, 'h'), (minutes, 'm')] if n]
+    return ' '.join(parts)
+
+
+def split_rrule(rrule):
+    """ Take the UNTIL out of an rrule.
+
+    Returns:
+        (rrule, until) tuple. until is a date or datetime, or None if the
+        rrule doesn't have one.
+    """
+    until = None
+    parts = []
+    for part in rrule.split(';'):
+        k, _, v = part.partition('=')
+        if k.upper() == 'UNTIL':
+            until = parse_value_date(v)
+        elif part:
+            parts.append(part)
+
+    return ';'.join(parts), until
+
+
+def event_zettel(event):
+    """ Turn a VEVENT into a zettel of the calendar template.
+
+    DTSTART, DTEND and DURATION become event_begin, event_end and
+    duration. An RRULE becomes recurring, with its UNTIL as recurring_stop.
+    The UID is kept as the uid attribute, see export-ics.
+
+    Args:
+        event: A VEVENT from master.util.ics.iter_events.
+
+    Returns:
+        A Zettel, or None if the event can't be represented; if it has no
+        start, or overrides a single occurrence of another event.
+
+    Raises:
+        ValueError if a value of the event couldn't be parsed.
+    """
+    if 'DTSTART' not in event or 'RECURRENCE-ID' in event:
+        return None
+
+    attrs = {'event_begin': parse_value_date(event['DTSTART'][1], event['DTSTART'][0])}
+
+    if 'DTEND' in event:
+        attrs['event_end'] = parse_value_date(event['DTEND'][1], event['DTEND'][0])
+    elif 'DURATION' in event:
+        duration = format_duration(parse_value_duration(event['DURATION'][1]))
+        if duration:
+            attrs['duration'] = duration
+
+    if 'RRULE' in event:
+        attrs['recurring'], until = split_rrule(event['RRULE'][1])
+        if until:
+            attrs['recurring_stop'] = until
+
+    if 'UID' in event:
+        attrs['uid'] = event['UID'][1]
+
+    title = unescape(event['SUMMARY'][1]) if 'SUMMARY' in event else ''
+    headings = {}
+    if 'DESCRIPTION' in event and event['DESCRIPTION'][1]:
+        headings['_notes'] = unescape(event['DESCRIPTION'][1])
+
+    return Zettel(title or 'Untitled event', headings, attrs)
+
+
+def import_events(lines, project, path, batch_size=BATCH_SIZE):
+    """ Import the events of a calendar into a project.
+
+    Args:
+        lines: Iterable of the lines of the calendar, like a file.
+        project: Project to create the events in. See Project.createTasks.
+        path: Dir of the project.
+        batch_size: Number of zettels created at once.
+
+    Returns:
+        (imported, skipped) tuple counting the events that were imported
+        and those that couldn't be.
+
+    Raises:
+        ValueError if the calendar is malformed. Batches before the error
+        have been imported.
+        OSError if a zettel couldn't be written.
+    """
+    imported = skipped = 0
+    events = iter_events(lines)
+    while True:
+        chunk = list(islice(events, batch_size))
+        if not chunk:
+            return imported, skipped
+
+        batch = []
+        for event in chunk:
+            try:
+                z = event_zettel(event)
+            except ValueError:
+                z = None
+
+            if z is None:
+                skipped += 1
+            else:
+                batch.append(z)
+
+        if batch:
+            project.createTasks(path, batch)
+            imported += len(batch)
+
+
+def do_import_ics(args):
+    """ Import the events of an iCalendar file into a project.
+    """
+    # Only the settings are needed, however large the project is.
+    p = Project.loadFromDisk(args.project, load_tasks=False)
+
+    try:
+        if args.file == '-':
+            imported, skipped = import_events(sys.stdin, p, args.project)
+        else:
+            with open(args.file, encoding='utf-8', newline='') as f:
+                imported, skipped = import_events(f, p, args.project)
+
+    except (OSError, ValueError) as e:
+        print(f'ERROR: {e}')
+        sys.exit(1)
+
+    print(f'Imported {imported} events into {args.project}.')
+    if skipped:
+        print(f'Skipped {skipped} events that could not be imported.')
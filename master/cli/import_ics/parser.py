@@ -0,0 +1,14 @@
+def add_import_ics_subparser(subparsers):
+
+    parser = subparsers.add_parser(
+        'import-ics', help='Import events from an iCalendar file.',
+        description=(
+            'Import the events of an iCalendar file into a project, one '
+            'zettel per event. Projects made from the calendar template '
+            'suit this best.'))
+
+    parser.add_argument(
+        'file', help='iCalendar file to import. "-" reads stdin.')
+
+    parser.add_argument(
+        'project', help='Path of the project to import into.', default='./', nargs='?')
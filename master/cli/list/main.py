@@ -1,14 +1,173 @@
-from libzet import load_zettels
+import heapq
+import sys
+from datetime import date
+from itertools import islice
+
+from superdate import SuperDate
+
+from master.util.filter import compile_filter
+from master.util.load import iter_zettels, load_columns, load_zettels
+from master.util.profile import phase
+from master.util.query import plan_filter
+from master.util.watch import Watcher, load_changed, redraw
 
 
 def _filter_zettels(zettels, filter):
-    return [z for z in zettels if eval(filter)]
+    return [z for z in zettels if filter(z)]
+
+
+def _line(z):
+    return f'{z.attrs["_loadpath"]}: {z.title}'
+
+
+def sort_entry(z, sort=None):
+    """ What to sort a zettel's line by.
+
+    Args:
+        z: The zettel.
+        sort: "path", "title", an attribute, or None for the path.
+
+    Returns:
+        A tuple ending with the line to print.
+    """
+    line = _line(z)
+    if sort in (None, 'path'):
+        return (line,)
+    if sort == 'title':
+        return (z.title, line)
+
+    # Zettels without the attribute come last, and values of different
+    # types are grouped by type instead of compared.
+    value = z.attrs.get(sort)
+    if value is None:
+        return ((1,), line)
+
+    if isinstance(value, (int, float)):
+        return ((0, 'number', value), line)
+    if isinstance(value, (str, date, SuperDate)):
+        return ((0, type(value).__name__, value), line)
+
+    # Others, like dicts or lists of mixed types, may not be ordered at all.
+    return ((0, type(value).__name__, repr(value)), line)
+
+
+def render(entries, limit=None):
+    """ Sort entries from sort_entry and join their lines.
+
+    Args:
+        entries: Iterable of entries.
+        limit: Only keep this many of the first entries, or None for all
+            of them.
+
+    Returns:
+        (output, count) tuple of the text to print and the number of
+        entries there were.
+    """
+    count = 0
+
+    def counted():
+        nonlocal count
+        for e in entries:
+            count += 1
+            yield e
+
+    if limit is None:
+        kept = sorted(counted())
+    else:
+        kept = heapq.nsmallest(limit, counted())
+
+    return '\n'.join(e[-1] for e in kept), count
+
+
+def watch_list(watcher, filter, matched, sort=None, limit=None):
+    """ Print the zettels matching a filter again whenever they change.
+
+    Args:
+        watcher: Watcher of the listed paths.
+        filter: Compiled filter.
+        matched: Zettels currently matching the filter.
+        sort: See sort_entry.
+        limit: See render.
+    """
+    entries = {z.attrs['_loadpath']: sort_entry(z, sort) for z in matched}
+    output, _ = render(entries.values(), limit)
+    while True:
+        zettels, removed = load_changed(watcher.changes())
+        for path in removed:
+            entries.pop(path, None)
+        for z in zettels:
+            if filter(z):
+                entries[z.attrs['_loadpath']] = sort_entry(z, sort)
+            else:
+                entries.pop(z.attrs['_loadpath'], None)
+
+        new, _ = render(entries.values(), limit)
+        if new != output:
+            output = new
+            redraw(output)
 
 
 def do_list(args):
 
-    zettels = load_zettels(args.zettels)
+    try:
+        with phase('compile filter'):
+            filter = compile_filter(args.filter)
+    except ValueError as e:
+        print(f'ERROR: {e}')
+        sys.exit(1)
+
+    if args.limit is not None and args.limit < 0:
+        print('ERROR: --limit can not be negative.')
+        sys.exit(1)
+
+    if args.stream and args.watch:
+        print('ERROR: --stream and --watch can not be used together.')
+        sys.exit(1)
+
+    watcher = Watcher(args.zettels) if args.watch else None
+    plan = plan_filter(filter)
+
+    if args.stream:
+        # Lines are printed as zettels are loaded, and nothing is kept.
+        with phase('stream'):
+            zettels = iter_zettels(args.zettels, jobs=args.jobs, lazy=True, where=plan)
+            matched = 0
+            for line in islice((_line(z) for z in zettels if filter(z)), args.limit):
+                print(line)
+                matched += 1
+            zettels.close()
+
+    elif args.limit is not None and not watcher:
+        # Only the first results are kept while loading.
+        with phase('load and render'):
+            zettels = iter_zettels(args.zettels, jobs=args.jobs, lazy=True, where=plan)
+            output, matched = render((sort_entry(z, args.sort) for z in zettels if filter(z)), args.limit)
+
+    else:
+        # Filters that only read titles and attributes don't need zettels.
+        with phase('load'):
+            if filter.whole:
+                zettels = load_zettels(args.zettels, jobs=args.jobs, lazy=True, where=plan)
+            else:
+                attrs = filter.attrs | ({args.sort} - {None, 'path', 'title'})
+                zettels = load_columns(args.zettels, attrs, jobs=args.jobs, where=plan)
+
+        with phase('filter'):
+            filtered = _filter_zettels(zettels, filter)
+        with phase('render'):
+            output, matched = render([sort_entry(z, args.sort) for z in filtered], args.limit)
+
+    if args.explain:
+        print(f'{plan.explain()}\nmatched: {matched}', file=sys.stderr)
+
+    if args.stream:
+        return
+
+    if not watcher:
+        with phase('print'):
+            print(output)
+        return
 
-    filtered = _filter_zettels(zettels, args.filter)
-    filtered = sorted([f'{z.attrs["_loadpath"]}: {z.title}' for z in filtered])
-    print('\n'.join(filtered))
+    with watcher:
+        redraw(output)
+        watch_list(watcher, filter, filtered, args.sort, args.limit)
@@ -5,7 +5,39 @@ def add_list_subparser(subparsers):
         description='List the title of tasks according to a filter.')
 
     parser.add_argument(
-        '-f', '--filter', help='Specify a list filter.', default='True')
+        '-f', '--filter', default='True', help=(
+            'Specify a list filter. This is a python expression where z is '
+            'the zettel and other names are its attributes, like '
+            '"stage == \'todo\' and due_date < 2022-11-01". Only '
+            'comparisons, boolean logic, attribute access and literals are '
+            'allowed.'))
+
+    parser.add_argument(
+        '--explain', action='store_true', help=(
+            'Print how the filter was planned to stderr. Comparisons of '
+            'stage, type, sprint, assignee, due_date and event_begin with '
+            'constants are looked up in the index instead of scanning every '
+            'zettel.'))
+
+    order = parser.add_mutually_exclusive_group()
+    order.add_argument(
+        '--stream', action='store_true', help=(
+            'Print zettels as soon as they match instead of sorting them '
+            'first.'))
+    order.add_argument(
+        '--sort', metavar='KEY', help=(
+            'Sort by "path", the default, "title", or an attribute. Zettels '
+            'without the attribute come last.'))
+
+    parser.add_argument(
+        '-n', '--limit', metavar='N', type=int, help=(
+            'Print at most N zettels. Only the first N are kept while '
+            'sorting.'))
+
+    parser.add_argument(
+        '--watch', action='store_true', help=(
+            'Keep running and print the list again whenever a change to the '
+            'zettels changes it.'))
 
     parser.add_argument(
         'zettels', help='Files and directories to filter.', default='.', nargs='*')
@@ -1,15 +1,18 @@
-import os
 import sys
 
-from libzet import load_zettels, move_zettels
+from master.util.fileops import plan_move, run_command
+from master.util.links import plan_link_edits
 
 
-def do_mv(args):
-
-    # We can't move directories yet
-    if any([os.path.isdir(t) for t in args.zettels]):
-        print('ERROR: Cannot move directories.')
+def _plan(args):
+    if not args.zettels:
+        print('ERROR: Give the zettels to move and where to move them.')
         sys.exit(1)
+    batch = plan_move(args.zettels, args.dest)
+    batch.links = plan_link_edits(batch.moves)
+    return batch
+
+
+def do_mv(args):
 
-    zettels = load_zettels(args.zettels)
-    move_zettels(zettels, args.dest)
+    run_command('mv', args, _plan)
@@ -1,10 +1,30 @@
+import argparse
+
+
+class _SplitDest(argparse.Action):
+    """ Split the last path off as the destination.
+    """
+    def __call__(self, parser, namespace, values, option_string=None):
+        namespace.zettels = values[:-1]
+        namespace.dest = values[-1] if values else None
+
+
 def add_mv_subparser(subparsers):
 
     parser = subparsers.add_parser(
         'mv', help='Move zettels.',
-        description='Move zettels.')
+        description=(
+            'Move zettels and directories. The moves are planned and '
+            'journaled before any file moves, so an interrupted mv can be '
+            'finished with --resume or undone with --rollback. Links to the '
+            'moved files are rewritten.'))
 
     parser.add_argument(
-        'zettels', metavar='zettel', help='Zettels to move.', nargs='+')
+        'zettels', metavar='zettel', nargs='*', action=_SplitDest,
+        help='Zettels or directories to move, followed by the destination.')
 
-    parser.add_argument('dest', help='Destination.')
+    recover = parser.add_mutually_exclusive_group()
+    recover.add_argument(
+        '--resume', action='store_true', help='Finish an interrupted mv.')
+    recover.add_argument(
+        '--rollback', action='store_true', help='Undo an interrupted mv.')
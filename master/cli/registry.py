@@ -0,0 +1,91 @@
+""" Static registry of subcommands.
+
+Discovering subcommands by listing and inspecting every subpackage of
+master.cli costs more than running most of them. The registry is a module
+listing every subcommand's parser builder that is generated when the
+package is built. This module only depends on the standard library so
+setup.py may run it before master is installed.
+"""
+import ast
+import os
+
+
+REGISTRY_MODULE = '_registry'
+
+_header = '''\
+""" Subcommands of master. Generated by master.cli.registry; do not edit.
+"""
+
+SUBCOMMANDS = [
+'''
+
+
+def get_avail_subcommands(pkg_root):
+    """ List available subcommands within a module.
+
+    Args:
+        pkg_root: a path to the root of the subpackage to be searched.
+
+    Returns:
+        A list of strings representing the names of all subpackages
+        present in the given directory.
+    """
+    return [dname for dname in sorted(os.listdir(pkg_root)) if
+            os.path.isdir(os.path.join(pkg_root, dname))
+            and '__pycache__' not in dname]
+
+
+def scan_subcommands(pkg_root):
+    """ Find the parser builder of every subcommand without importing them.
+
+    Every subpackage of pkg_root must have a parser module defining exactly
+    one function named add_*_subparser.
+
+    Args:
+        pkg_root: Path to the master.cli package.
+
+    Returns:
+        A list of (subpackage, function name) tuples sorted by subpackage.
+
+    Raises:
+        RuntimeError if a parser module doesn't have exactly one builder.
+    """
+    found = []
+    for name in get_avail_subcommands(pkg_root):
+        path = os.path.join(pkg_root, name, 'parser.py')
+        if not os.path.exists(path):
+            continue
+
+        with open(path) as f:
+            tree = ast.parse(f.read(), path)
+
+        fns = [n.name for n in tree.body if isinstance(n, ast.FunctionDef)
+               and n.name.startswith('add_') and n.name.endswith('_subparser')]
+        if len(fns) != 1:
+            raise RuntimeError(f'Expected one add_*_subparser function in {path}, found {len(fns)}.')
+
+        found.append((name, fns[0]))
+
+    return found
+
+
+def write_registry(pkg_root):
+    """ Generate the registry module inside the master.cli package.
+
+    Args:
+        pkg_root: Path to the master.cli package.
+
+    Returns:
+        Path of the generated module.
+    """
+    path = os.path.join(pkg_root, f'{REGISTRY_MODULE}.py')
+    lines = [f'    ({name!r}, {fn!r}),\n' for name, fn in scan_subcommands(pkg_root)]
+
+    with open(path, 'w') as f:
+        f.write(_header + ''.join(lines) + ']\n')
+
+    return path
+
+
+if __name__ == '__main__':
+    print(write_registry(os.path.dirname(os.path.abspath(__file__))))
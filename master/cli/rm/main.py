@@ -1,15 +1,15 @@
-import os
 import sys
 
-from libzet import load_zettels, delete_zettels
+from master.util.fileops import plan_remove, run_command
 
 
-def do_rm(args):
-
-    # Don't remove directories
-    if any([os.path.isdir(t) for t in args.zettels]):
-        print('ERROR: Cannot remove directories.')
+def _plan(args):
+    if not args.zettels:
+        print('ERROR: Give the zettels to remove.')
         sys.exit(1)
+    return plan_remove(args.zettels)
+
+
+def do_rm(args):
 
-    zettels = load_zettels(args.zettels)
-    delete_zettels(zettels)
+    run_command('rm', args, _plan)
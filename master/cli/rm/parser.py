@@ -2,7 +2,15 @@ def add_rm_subparser(subparsers):
 
     parser = subparsers.add_parser(
         'rm', help='Remove zettels.',
-        description='Remove zettels.')
+        description=(
+            'Remove zettels. The removals are journaled, so an interrupted '
+            'rm can be finished with --resume or undone with --rollback.'))
 
     parser.add_argument(
-        'zettels', metavar='zettel', help='Zettels to remove.', nargs='+')
+        'zettels', metavar='zettel', help='Zettels to remove.', nargs='*')
+
+    recover = parser.add_mutually_exclusive_group()
+    recover.add_argument(
+        '--resume', action='store_true', help='Finish an interrupted rm.')
+    recover.add_argument(
+        '--rollback', action='store_true', help='Undo an interrupted rm.')
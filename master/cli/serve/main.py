@@ -0,0 +1,140 @@
+""" Keep a project loaded and run commands for other master processes.
+
+See master.util.daemon.
+"""
+import contextlib
+import importlib
+import io
+import json
+import os
+import socket
+import socketserver
+import sys
+import traceback
+
+from master.config import add_config_args, user_conf
+from master.parser import create_parser
+from master.util.daemon import FORWARDED, socket_path
+from master.util.index import INDEX_DIR
+from master.util.load import keep_in_memory, load_zettels
+
+
+def _exit_code(e):
+    """ Exit code of a SystemExit, like the interpreter would pick.
+    """
+    if e.code is None:
+        return 0
+    if isinstance(e.code, int):
+        return e.code
+
+    print(e.code, file=sys.stderr)
+    return 1
+
+
+class _Handler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline())
+            response = self.server.run(request['argv'], request['cwd'])
+        except (ValueError, KeyError, TypeError):
+            return
+
+        self.wfile.write(json.dumps(response).encode() + b'\n')
+
+
+class Daemon(socketserver.UnixStreamServer):
+    """ Serve the commands of clients one at a time.
+
+    Zettels loaded by any command are kept in memory, so commands only
+    load the zettels that changed since a previous one.
+    """
+
+    def __init__(self, root, sock_path):
+        self.root = root
+        self.parser = create_parser()
+        super().__init__(sock_path, _Handler)
+
+    def _run(self, argv):
+        args = self.parser.parse_args(argv)
+        if args.command not in FORWARDED:
+            print(f'ERROR: "{args.command}" can not be run by master serve.')
+            return 1
+
+        args = add_config_args(args, user_conf)
+        if not args.username or not args.email:
+            print(f'Username and/or email missing in {user_conf}')
+            return 1
+
+        module = importlib.import_module(f'master.cli.{args.command}.main')
+        getattr(module, f'do_{args.command}')(args)
+        return 0
+
+    def run(self, argv, cwd):
+        """ Run a command line as if master was run in a directory.
+
+        Returns:
+            A dict of the command's exit code, stdout and stderr.
+        """
+        out, err = io.StringIO(), io.StringIO()
+        with contextlib.redirect_stdout(out), contextlib.redirect_stderr(err):
+            try:
+                os.chdir(cwd)
+                code = self._run(argv)
+            except SystemExit as e:
+                code = _exit_code(e)
+            except Exception:
+                traceback.print_exc()
+                code = 1
+            finally:
+                os.chdir(self.root)
+
+        return {'code': code, 'stdout': out.getvalue(), 'stderr': err.getvalue()}
+
+
+def _running(sock_path):
+    """ Whether a daemon is listening on a socket.
+    """
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+            s.connect(sock_path)
+        return True
+    except OSError:
+        return False
+
+
+def do_serve(args):
+    """ Serve a project until interrupted.
+    """
+    root = os.path.abspath(args.project)
+    if not os.path.isdir(root):
+        print(f'ERROR: {args.project} is not a directory.')
+        sys.exit(1)
+
+    if not os.path.exists(user_conf):
+        print(f'ERROR: {user_conf} does not exist.')
+        sys.exit(1)
+
+    # The daemon lives next to the index, which this enables.
+    os.makedirs(os.path.join(root, INDEX_DIR), exist_ok=True)
+    sock_path = socket_path(root)
+    if os.path.exists(sock_path):
+        if _running(sock_path):
+            print(f'ERROR: {root} is already served.')
+            sys.exit(1)
+        os.remove(sock_path)
+
+    os.chdir(root)
+    keep_in_memory()
+    load_zettels('.', recurse=True, jobs=args.jobs, lazy=True)
+
+    server = Daemon(root, sock_path)
+    try:
+        os.chmod(sock_path, 0o600)
+        print(f'Serving {root}. Press Ctrl-C to stop.')
+        sys.stdout.flush()
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if os.path.exists(sock_path):
+            os.remove(sock_path)
@@ -0,0 +1,11 @@
+def add_serve_subparser(subparsers):
+
+    parser = subparsers.add_parser(
+        'serve', help='Keep a project loaded for other commands.',
+        description=(
+            'Load a project once and keep its zettels in memory. While it '
+            'runs, list and todo within the project are answered by it '
+            'instead of loading the project themselves.'))
+
+    parser.add_argument(
+        'project', help='Path of the project to serve.', default='.', nargs='?')
@@ -1,11 +1,27 @@
 import sys
-from datetime import datetime, date
+from datetime import datetime, date, time, timedelta
 
-from superdate import parse_date
-from libzet import load_zettels
+from collections import namedtuple
 
-import recurring_ical_events
-from icalendar import Calendar
+from libzet import Zettel
+
+from master.util.cache import OccurrenceCache, cache_key
+from master.util.dates import resolve_date, resolve_duration, resolver
+from master.util.load import keep_in_memory, load_columns, load_zettels
+from master.util.profile import phase
+from master.util.query import ActiveWindow
+from master.util.watch import Watcher, load_changed, redraw
+
+
+# One occurrence of an event. start and end are either both dates or both
+# datetimes, and end is not inclusive.
+Occurrence = namedtuple('Occurrence', ['uid', 'start', 'end'])
+
+# Attributes the occurrences of an event depend on.
+SCHEDULE_ATTRS = ['event_begin', 'due_date', 'event_end', 'duration', 'recurring', 'recurring_stop']
+
+# Attributes print_active reads.
+ACTIVE_ATTRS = ['event_begin', 'event_end', 'due_date', 'recurring', 'recurring_stop']
 
 
 def _trim(s):
@@ -14,101 +30,318 @@ def _trim(s):
     return s
 
 
-def extract_events(cal, start, end):
+def _as_date(d):
+    return d.date() if isinstance(d, datetime) else d
+
+
+def todo_window(args):
+    """ Find the days todo should cover.
+
+    Args:
+        args: Parsed todo arguments.
+
+    Returns:
+        (start, end) tuple of dates. end is not inclusive.
+
+    Raises:
+        ValueError if a date couldn't be parsed or the window is empty.
+    """
+    start = _as_date(resolve_date(args.from_ or args.date))
+    if args.to:
+        end = _as_date(resolve_date(args.to)) + timedelta(days=1)
+    else:
+        end = start + timedelta(days=1 if args.days is None else args.days)
+
+    if end <= start:
+        raise ValueError('The window to print must cover at least one day.')
+
+    return start, end
+
+
+def is_schedulable(z):
+    """ Whether a zettel turns into an event. See Zettel.asIcsEvent.
+    """
+    return any(k in z.attrs and z.attrs[k] for k in ['event_begin', 'due_date'])
+
+
+def _is_recurring(z):
+    return 'recurring' in z.attrs and bool(z.attrs['recurring'])
+
+
+def _as_datetime(d, tzinfo=None):
+    if isinstance(d, datetime):
+        return d
+    return datetime(d.year, d.month, d.day, tzinfo=tzinfo)
+
+
+def single_occurrence(z):
+    """ Get the only occurrence of a zettel's non-recurring event.
+
+    This is what recurring_ical_events makes of Zettel.asIcsEvent without
+    building the event. Events without an end or duration last all day if
+    they're dates and no time at all if they're datetimes. Dates become
+    datetimes at midnight if the event ends at a time.
+
+    Args:
+        z: Zettel with an event_begin or due_date.
+
+    Returns:
+        An Occurrence.
+
+    Raises:
+        ValueError if the zettel's duration couldn't be parsed.
+    """
+    a = z.attrs
+    begin = a['event_begin'] if 'event_begin' in a and a['event_begin'] else a['due_date']
+    start = begin._date
+
+    if 'event_end' in a and a['event_end']:
+        end = a['event_end']._date
+    elif 'duration' in a and a['duration']:
+        duration = resolve_duration(a['duration'])
+        if duration % timedelta(days=1):
+            start = _as_datetime(start)
+        end = start + duration
+    elif isinstance(start, datetime):
+        end = start
+    else:
+        end = start + timedelta(days=1)
+
+    if isinstance(start, datetime) or isinstance(end, datetime):
+        tzinfo = getattr(start, 'tzinfo', None) or getattr(end, 'tzinfo', None)
+        start, end = _as_datetime(start, tzinfo), _as_datetime(end, tzinfo)
+
+    return Occurrence(z.title, start, end)
+
+
+def _overlaps(o, start, end):
+    """ Whether an occurrence is active between two dates.
+    """
+    if isinstance(o.start, datetime):
+        start, end = _as_datetime(start, o.start.tzinfo), _as_datetime(end, o.start.tzinfo)
+    else:
+        start, end = _as_date(start), _as_date(end)
+
+    if o.end > o.start:
+        return o.start < end and o.end > start
+
+    return start <= o.start < end
+
+
+def _schedule_key(z, start, end):
+    """ Cache key of a recurring event's occurrences within a window.
+    """
+    attrs = {}
+    for k in SCHEDULE_ATTRS:
+        if k in z.attrs:
+            v = z.attrs[k]
+            attrs[k] = v._date if hasattr(v, '_date') else v
+
+    return cache_key(attrs, start, end)
+
+
+def expand_recurring(zettels, start, end, cache=None):
+    """ Expand recurring events within a window.
+
+    Args:
+        zettels: Zettels with recurring events.
+        start: date or datetime of date to start after
+        end: date or datetime of date include before but not inclusive
+        cache: An OccurrenceCache. Events whose scheduling attributes were
+            expanded for the same window before are served from it, and
+            the rest are added to it.
+
+    Returns:
+        A list of Occurrences.
+    """
+    with phase('cache lookup'):
+        keys = [_schedule_key(z, start, end) for z in zettels]
+        cached = cache.lookup(keys) if cache else {}
+
+    misses = [i for i, k in enumerate(keys) if k not in cached]
+    expanded = {i: [] for i in misses}
+    if misses:
+        with phase('import recurring_ical_events'):
+            import recurring_ical_events
+
+        # Dates are passed as datetimes. recurring_ical_events drops the
+        # time of long events when it looks back from a date.
+        with phase('asIcsEvent'):
+            cal = extract_calendar([zettels[i] for i in misses], [str(i) for i in misses])
+
+        with phase('expand'):
+            for e in recurring_ical_events.of(cal).between(_as_datetime(start), _as_datetime(end)):
+                begin = e['DTSTART'].dt
+                finish = e['DTEND'].dt if 'DTEND' in e else begin
+                expanded[int(e['UID'])].append((begin, finish))
+
+        if cache:
+            with phase('cache store'):
+                for i, spans in expanded.items():
+                    cache.store(keys[i], spans)
+
+    occurrences = []
+    for i, z in enumerate(zettels):
+        spans = cached[keys[i]] if keys[i] in cached else expanded[i]
+        occurrences.extend(Occurrence(z.title, b, f) for b, f in spans)
+
+    return occurrences
+
+
+def extract_events(zettels, start, end, cache=None):
     """ Return events active between two dates.
 
     dates are in general, datetimes in specific
 
+    Zettels that aren't events are dropped up front. Non-recurring events
+    are compared with the window directly, and only recurring ones are
+    turned into icalendar events and expanded.
+
     Args:
+        zettels: Zettels to find events in.
         start: date or datetime of date to start after
         end: date or datetime of date include before but not inclusive
+        cache: An OccurrenceCache for the recurring events. See
+            expand_recurring.
 
     Returns:
-        tuple of general, specific. Events only specified by their date
-        are in general and datetimes are by datetime
+        tuple of general, specific lists of Occurrences. Events only
+        specified by their date are in general and datetimes are by datetime
+
+    Raises:
+        ValueError if a zettel's duration or recurrence couldn't be parsed.
     """
-    general = []
-    specific = []
+    single = []
+    recurring = []
+    for z in zettels:
+        if is_schedulable(z):
+            (recurring if _is_recurring(z) else single).append(z)
+
+    with phase('single events'):
+        occurrences = [o for o in map(single_occurrence, single) if _overlaps(o, start, end)]
+
+    if recurring:
+        with phase('recurring events'):
+            occurrences.extend(expand_recurring(recurring, start, end, cache))
 
-    for e in recurring_ical_events.of(cal).between(start, end):
-        d = e['dtstart'].dt
-        if type(d) is date:
-            general.append(e)
-        elif type(d) is datetime:
-            specific.append(e)
+    general = [o for o in occurrences if type(o.start) is date]
+    specific = [o for o in occurrences if type(o.start) is datetime]
 
     return general, specific
 
 
-def pretty_output(cal, target_date):
-    general, specific = extract_events(
-        cal,
-        parse_date(target_date),
-        parse_date(f'{target_date} + 1 day'))
+def _active_days(e, start, end):
+    """ Days of a window an event is active on.
+    """
+    first = last = _as_date(e.start)
+    if _as_date(e.end) > first:
+        # Events end right before their end.
+        if isinstance(e.end, datetime):
+            last = _as_date(e.end - timedelta(microseconds=1))
+        else:
+            last = e.end - timedelta(days=1)
+
+    first = max(first, start)
+    last = min(last, end - timedelta(days=1))
+
+    return [first + timedelta(days=i) for i in range(max((last - first).days + 1, 1))]
+
 
-    general.sort(key=lambda x: x['uid'])
-    specific.sort(key=lambda x: x['dtstart'].dt)
+def bucket_events(general, specific, start, end):
+    """ Sort events into the days of a window they're active on.
+
+    Args:
+        general: Occurrences only specified by their date.
+        specific: Occurrences specified by their datetime.
+        start: First day of the window.
+        end: Day after the last day of the window.
+
+    Returns:
+        A list of (day, general, specific) tuples, one for each day of
+        the window in order.
+    """
+    buckets = [([], []) for _ in range((end - start).days)]
+    for kind, events in enumerate([general, specific]):
+        for e in events:
+            for day in _active_days(e, start, end):
+                buckets[(day - start).days][kind].append(e)
+
+    return [(start + timedelta(days=i), g, s) for i, (g, s) in enumerate(buckets)]
+
+
+def pretty_output(general, specific, start, end):
+    """ Format what there is to do on each day of a window.
+
+    Args:
+        general: Occurrences only specified by their date.
+        specific: Occurrences specified by their datetime.
+        start: First day of the window.
+        end: Day after the last day of the window.
+    """
+    days = bucket_events(general, specific, start, end)
+
+    ret = []
+    for day, g, s in days:
+        heading = 'Todo' if len(days) == 1 else day.strftime('%Y-%m-%d, %a')
+        ret.extend(_pretty_day(g, s, heading))
+
+    return '\n'.join(ret)
+
+
+def _pretty_day(general, specific, heading):
+    general = sorted(general, key=lambda x: x.uid)
+    specific = sorted(specific, key=lambda x: (x.start, x.uid))
 
     ret = []
     if general or specific:
         ret.append('')
-        ret.append('Todo\n----')
+        ret.append(f'{heading}\n{"-" * len(heading)}')
 
     if general:
         for e in general:
-            ret.append(f'- {_trim(e["UID"])}')
+            ret.append(f'- {_trim(e.uid)}')
         ret.append('')
 
     if specific:
         for e in specific:
-            start = e['dtstart'].dt
-            s = f'- {start.strftime("%H:%M")}'
-            if 'duration' in e:
-                td = e['duration'].dt
-                days = td.days
-                seconds = td.seconds
-                hours = int(td.seconds / 3600)
-                seconds = max(seconds - hours * 3600, 0)
-                minutes = int(seconds / 60)
-
-                s += ' for '
-                l_ = []
-                if days:
-                    l_.append(f'{days} days')
-                if hours:
-                    l_.append(f'{hours} hours')
-                if minutes:
-                    l_.append(f'{minutes} minutes')
-                s += ' and '.join(l_)
-
-            s += f' {_trim(e["UID"])}'
-
-            ret.append(s)
+            ret.append(f'- {e.start.strftime("%H:%M")} {_trim(e.uid)}')
 
-    return '\n'.join(ret)
+    return ret
 
 
-def print_remind(cal, target_date):
+def print_remind(general, specific, start, end):
     """ Print remind-compliant output to stdout
 
-    Designed to piped into remind.
+    Designed to piped into remind. Each event is printed once, on the
+    first day of the window it's active on.
     """
-    general, specific = extract_events(
-        cal,
-        parse_date(target_date),
-        parse_date(f'{target_date} + 1 day'))
+    output = remind_output(general, specific, start, end)
+    if output:
+        print(output)
 
-    for e in general + specific:
-        d = e['DTSTART'].dt
-        fmt = ''
-        if type(d) is date:
-            fmt = 'REM %Y-%m-%d'
-        else:
-            fmt = 'REM %Y-%m-%d %H:%M'
-        s = d.strftime(fmt)
-        uid = e['UID']
 
-        print(f'{s} {_trim(e["UID"])}')
+def remind_output(general, specific, start, end):
+    """ Format remind-compliant output. See print_remind.
+    """
+    ret = []
+    printed = set()
+    for _, g, s in bucket_events(general, specific, start, end):
+        g = sorted(g, key=lambda x: x.uid)
+        s = sorted(s, key=lambda x: (x.start, x.uid))
+        for e in g + s:
+            if id(e) in printed:
+                continue
+            printed.add(id(e))
+
+            fmt = ''
+            if type(e.start) is date:
+                fmt = 'REM %Y-%m-%d'
+            else:
+                fmt = 'REM %Y-%m-%d %H:%M'
+
+            ret.append(f'{e.start.strftime(fmt)} {_trim(e.uid)}')
+
+    return '\n'.join(ret)
 
 
 def print_active(zettels, date_):
@@ -117,39 +350,201 @@ def print_active(zettels, date_):
     These are recurring events that are still in circulation or accute
     evnets that haven't happened yet.
     """
+    print(active_output(zettels, date_))
+
+
+def active_output(zettels, date_):
+    """ Format the events that are still active. See print_active.
+    """
     def filter_(t):
-        return (t.attrs["event_begin"] != None and t.attrs["event_begin"] >= date_
-            or t.attrs["event_end"] != None and t.attrs["event_end"] >= date_
-            or t.attrs["due_date"] != None and t.attrs["due_date"] >= date_
-            or t.attrs["recurring_stop"] == None and t.attrs["recurring"] != None
-            or t.attrs["recurring_stop"] != None and t.attrs["recurring_stop"] >= date_)
+        # Missing attributes are NoCompare, which isn't None but equals
+        # nothing, so they're read with get.
+        a = t.attrs
+        return (a.get("event_begin") is not None and a["event_begin"] >= date_
+                or a.get("event_end") is not None and a["event_end"] >= date_
+                or a.get("due_date") is not None and a["due_date"] >= date_
+                or a.get("recurring_stop") is None and a.get("recurring") is not None
+                or a.get("recurring_stop") is not None and a["recurring_stop"] >= date_)
 
     active = []
     for z in filter(filter_, zettels):
         line = _trim(f'{z.attrs["_loadpath"]}: {z.title}')
         active.append(f'- {line}')
 
-    print('\n'.join(active))
+    return '\n'.join(active)
+
+
+def _with_until(z):
+    """ Fold a zettel's recurring_stop into its rrule as an UNTIL.
 
+    libzet can't turn recurring_stop into an rrule itself.
 
-def extract_calendar(zettels, target_date):
+    Returns:
+        z, or a copy of it without a recurring_stop.
+    """
+    a = z.attrs
+    if not (_is_recurring(z) and 'recurring_stop' in a and a['recurring_stop']):
+        return z
+
+    attrs = {k: v for k, v in a.items() if k != 'recurring_stop'}
+    rrule = a['recurring'].upper()
+    if 'UNTIL=' not in rrule and 'COUNT=' not in rrule:
+        begin = a['event_begin'] if 'event_begin' in a and a['event_begin'] else a['due_date']
+        stop = a['recurring_stop']._date
+        if isinstance(begin._date, datetime):
+            # The last occurrence may be any time on the day recurrence stops.
+            stop = stop if isinstance(stop, datetime) else datetime.combine(stop, time(23, 59, 59))
+            attrs['recurring'] = f'{a["recurring"]};UNTIL={stop.strftime("%Y%m%dT%H%M%S")}'
+        else:
+            attrs['recurring'] = f'{a["recurring"]};UNTIL={_as_date(stop).strftime("%Y%m%d")}'
+
+    return Zettel(z.title, z.headings, attrs)
+
+
+def extract_vevents(zettels, uids=None):
+    """ Turn zettels into icalendar events one at a time.
+
+    Args:
+        zettels: Zettels to turn into events.
+        uids: UIDs of the events. Defaults to the zettels' titles.
+
+    Yields:
+        (zettel, icalendar.Event) tuples. Zettels that aren't events are
+        skipped.
+    """
+    uids = uids or [t.title for t in zettels]
+    for t, uid in zip(zettels, uids):
+        e = _with_until(t).asIcsEvent(uid)
+        if not e:
+            continue
+
+        # libzet's durations are off by however far into the minute they
+        # were parsed.
+        if 'DURATION' in e:
+            e.pop('DURATION')
+            e.add('duration', resolve_duration(t.attrs['duration']))
+
+        yield t, e
+
+
+def extract_calendar(zettels, uids=None):
     """ Get an icalendar Calendar from a list oz zettels.
+
+    Args:
+        zettels: Zettels to turn into events.
+        uids: UIDs of the events. Defaults to the zettels' titles.
     """
+    from icalendar import Calendar
+
     cal = Calendar()
-    events = [t.asIcsEvent(t.title) for t in zettels]
-    [cal.add_component(e) for e in events if e]
+    [cal.add_component(e) for _, e in extract_vevents(zettels, uids)]
 
     return cal
 
 
+def todo_output(args, zettels, start, end):
+    """ Format what todo prints for some zettels.
+    """
+    if args.list_active:
+        with phase('format'):
+            return active_output(zettels, start)
+
+    cache = OccurrenceCache.open()
+    try:
+        with phase('events'):
+            general, specific = extract_events(zettels, start, end, cache)
+    finally:
+        if cache:
+            cache.close()
+
+    with phase('format'):
+        if args.remind:
+            return remind_output(general, specific, start, end)
+        return pretty_output(general, specific, start, end)
+
+
+def _load(args, start, end):
+    # Only load zettels the index says may be active, and only the
+    # attributes print_active reads when listing them.
+    if args.list_active:
+        return load_columns(args.zettels, ACTIVE_ATTRS, recurse=True, jobs=args.jobs, where=ActiveWindow(start))
+    return load_zettels(args.zettels, recurse=True, jobs=args.jobs, lazy=True, where=ActiveWindow(start, end))
+
+
+def _until_tomorrow():
+    return (datetime.combine(date.today(), time()) + timedelta(days=1) - datetime.now()).total_seconds()
+
+
+def watch_todo(args, watcher, zettels, window):
+    """ Print what there is to do again whenever it changes.
+
+    The output is updated when zettels change, and when the day does. Zettels
+    are loaded again when the day changes, since their relative dates and
+    the window may depend on it.
+
+    Args:
+        args: Parsed todo arguments.
+        watcher: Watcher of args.zettels.
+        zettels: Zettels currently loaded for the window.
+        window: (start, end) tuple of the window they were loaded for.
+    """
+    live = {z.attrs['_loadpath']: z for z in zettels}
+    output = None
+    day = date.today()
+    while True:
+        current = todo_window(args)
+        if date.today() != day:
+            # Relative dates of zettels, like "tomorrow", were resolved for
+            # the day before. Forget the zettels kept with them.
+            day = date.today()
+            keep_in_memory()
+            window = None
+
+        if current != window:
+            window = current
+            live = {z.attrs['_loadpath']: z for z in _load(args, *window)}
+
+        new = todo_output(args, list(live.values()), *window)
+        resolver.save()
+        if new != output:
+            output = new
+            redraw(output)
+
+        # Wake up at midnight in case the day changed.
+        changed = watcher.changes(timeout=_until_tomorrow() + 1)
+        zettels, removed = load_changed(changed, jobs=args.jobs)
+        for path in removed:
+            live.pop(path, None)
+        for z in zettels:
+            live[z.attrs['_loadpath']] = z
+
+
 def do_todo(args):
     """ Look at tasks within a project and print things you should do.
     """
-    zettels = load_zettels(args.zettels, recurse=True)
-    cal = extract_calendar(zettels, args.date)
-    if args.remind:
-        print_remind(cal, args.date)
-    elif args.list_active:
-        print_active(zettels, args.date)
-    else:
-        print(pretty_output(cal, args.date))
+    # Reuse the dates resolved by previous runs.
+    with phase('load dates'):
+        resolver.load()
+
+    try:
+        start, end = todo_window(args)
+    except ValueError as e:
+        print(f'ERROR: {e}')
+        sys.exit(1)
+
+    if args.watch:
+        with Watcher(args.zettels, recurse=True) as watcher:
+            keep_in_memory()
+            watch_todo(args, watcher, _load(args, start, end), (start, end))
+
+    try:
+        with phase('load'):
+            zettels = _load(args, start, end)
+        output = todo_output(args, zettels, start, end)
+    finally:
+        with phase('save dates'):
+            resolver.save()
+
+    if output or not args.remind:
+        with phase('print'):
+            print(output)
@@ -12,10 +12,25 @@ def add_todo_subparser(subparsers):
         '-d', '--date', help='Print what should be done for a given date.',
         default='today')
 
+    parser.add_argument(
+        '--from', dest='from_', metavar='DATE',
+        help='Print what should be done from a given date on. Overrides --date.')
+
+    window = parser.add_mutually_exclusive_group()
+    window.add_argument(
+        '--to', metavar='DATE', help='Print every day up to and including a given date.')
+    window.add_argument(
+        '--days', metavar='N', type=int, help='Print this many days.')
+
     parser.add_argument(
         '--list-active', help='Print events that have yet to occur or expire.',
         action='store_true')
 
+    parser.add_argument(
+        '--watch', action='store_true', help=(
+            'Keep running and print again whenever a change to the zettels, '
+            'or the date, changes what there is to do.'))
+
     parser.add_argument(
         '--remind', help='Use this flag to pipe output to remind.',
         action='store_true')
@@ -3,12 +3,9 @@
 
 import configparser
 import os
-from pathlib import Path
-from master.util.edit import edit
-from master.configs.default_ini import default_ini
 
 
-user_confdir = '{}/.config/master'.format(Path.home())
+user_confdir = '{}/.config/master'.format(os.path.expanduser('~'))
 user_conf = '{}/master.ini'.format(user_confdir)
 
 
@@ -22,6 +19,9 @@ def do_first_time_setup():
         FileNotFoundError if the default config could not be read, or
         any of the exceptions raised by master.util.edit
     """
+    from master.util.edit import edit
+    from master.configs.default_ini import default_ini
+
     os.makedirs(user_confdir, exist_ok=True)
     edit(default_ini, output_file=user_conf)
 
@@ -9,4 +9,9 @@ default_ini = '''\
 #
 username =
 email =
+
+# Number of processes used to parse zettels when loading large projects.
+# Leave empty to use one per CPU, or set to 1 to always parse serially.
+#
+jobs =
 '''
@@ -32,4 +32,11 @@ attrs:
 # their filenames and IDs) be interpreted as a date or datetime.
 #
 task_prefix: __DEFAULT_PREFIX
+
+################################################################################
+# Optionally create new tasks in subdirectories named after the date they were
+# created, so no single directory grows too large. The value is a strftime
+# pattern. For example '%Y/%m' creates tasks in directories like 2022/07/.
+#
+task_shard:
 """
@@ -5,21 +5,64 @@ import importlib
 import os
 import sys
 
-import argcomplete
-
 from master.parser import create_parser
 from master.config import add_config_args, do_first_time_setup, user_conf
+from master.util import profile
+from master.util.profile import phase
+
+
+def _close_stdout():
+    """ Send what's left of stdout nowhere, so flushing it at exit can't fail.
+    """
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, sys.stdout.fileno())
+
+
+def _global_args(argv):
+    """ Arguments of master that come before the subcommand.
+    """
+    from master.util.daemon import subcommand
+    command = subcommand(argv)
+    return argv[:argv.index(command)] if command else argv
 
 
 def main():
-    parser = create_parser()
-    argcomplete.autocomplete(parser)
+    # Profiling starts before the parser is built, so that it's timed too.
+    # The global --profile has to come before the subcommand anyway.
+    trace = os.environ.get(profile.TRACE_ENV)
+    table = '--profile' in _global_args(sys.argv[1:])
+    if table or trace:
+        profile.start(table, trace)
+
+    # A running "master serve" answers read-only commands without loading
+    # the project again. Profiled commands have to run here.
+    if '_ARGCOMPLETE' not in os.environ and not profile.enabled():
+        from master.util.daemon import forward
+        served = forward(sys.argv[1:])
+        if served:
+            code, out, err = served
+            try:
+                sys.stdout.write(out)
+                sys.stdout.flush()
+            except BrokenPipeError:
+                _close_stdout()
+            sys.stderr.write(err)
+            sys.exit(code)
+
+    with phase('parser'):
+        parser = create_parser()
+
+    # Only tab completion needs argcomplete.
+    if '_ARGCOMPLETE' in os.environ:
+        import argcomplete
+        argcomplete.autocomplete(parser)
 
     # Default daily command should be add
     if sys.argv[-1] == 'daily':
         sys.argv.append('add')
 
-    args = parser.parse_args()
+    with phase('parse args'):
+        args = parser.parse_args()
 
     if not os.path.exists(user_conf) or args.setup:
         print(f'INFO: Performing first-use setup.')
@@ -33,19 +76,28 @@ def main():
         sys.exit(1)
 
     # fill in args with values from config.
-    args = add_config_args(args, user_conf)
+    with phase('config'):
+        args = add_config_args(args, user_conf)
 
     if not args.username or not args.email:
         print(f'Username and/or email missing in {user_conf}')
         sys.exit(1)
 
-    subcommand = importlib.import_module('master.cli.{}.main'.format(args.command))
-    subcommand = getattr(subcommand, 'do_{}'.format(args.command))
+    # Commands like export-ics live in packages like export_ics.
+    name = args.command.replace('-', '_')
+    with phase('import'):
+        subcommand = importlib.import_module('master.cli.{}.main'.format(name))
+    subcommand = getattr(subcommand, 'do_{}'.format(name))
 
     try:
-        subcommand(args)
+        with phase(args.command):
+            subcommand(args)
+            sys.stdout.flush()
     except KeyboardInterrupt:
         print('Interrupt caught - closing.')
+    except BrokenPipeError:
+        # Whatever read the output, like head, has had enough of it.
+        _close_stdout()
 
     sys.exit(0)
 
@@ -4,13 +4,13 @@
 import argparse
 import sys
 
-from master import __version__
 from master.cli import build_out_subparsers
 
 
 def print_version():
     class printVersion(argparse.Action):
         def __call__(self, parser, args, values, option_string=None):
+            from master import __version__
             print(__version__)
             sys.exit(0)
     return printVersion
@@ -30,6 +30,17 @@ def create_parser():
     parser.add_argument(
         '--setup', help='Redo the first-time setup.', action='store_true')
 
+    parser.add_argument(
+        '-j', '--jobs', help=(
+            'Number of processes used to parse zettels. Defaults to the '
+            '"jobs" key of master.ini, or one per CPU.'))
+
+    parser.add_argument(
+        '--profile', action='store_true', help=(
+            'Print the time and memory blocks each phase of the command '
+            'took to stderr. Set MASTER_TRACE to a path to write them as a '
+            'Chrome trace instead.'))
+
     parser.add_argument(
         '--version', nargs=0, help='Print the version of master and exit.',
         action=print_version())
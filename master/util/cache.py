@@ -0,0 +1,227 @@
+""" Caches kept in the user's cache directory.
+
+Unlike the index, these don't belong to a project; they hold results that
+are expensive to compute but depend only on their inputs, so they're keyed
+by a hash of those inputs and never go stale.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+from master.util.index import dumps, loads
+
+
+# Bump whenever what's cached changes. Older caches are dropped.
+SCHEMA_VERSION = 2
+
+# Entries unused for this long are forgotten.
+_MAX_AGE_S = 30 * 24 * 3600
+
+
+def cache_dir():
+    """ Directory master keeps its caches in.
+
+    This is $XDG_CACHE_HOME/master, or ~/.cache/master if unset.
+    """
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'master')
+
+
+def cache_key(*parts):
+    """ Hash json-serializable parts into a cache key.
+
+    Dates and other values json can't serialize are hashed as their str.
+    """
+    s = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha1(s.encode()).hexdigest()
+
+
+class _Cache:
+    """ SQLite database in cache_dir holding one table.
+
+    Subclasses name their table and its columns.
+    """
+    _file = None
+    _table = None
+    _columns = None
+
+    def __init__(self, path=None):
+        """ Open or create the cache.
+
+        Args:
+            path: Path of the database. Defaults to a file in cache_dir
+                named after the cache.
+
+        Raises:
+            OSError if the cache directory couldn't be created.
+            sqlite3.Error if the database couldn't be opened.
+        """
+        self.path = path or os.path.join(cache_dir(), self._file)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+        self._db = sqlite3.connect(self.path, timeout=10)
+        self._pending = []
+        self._init_schema()
+
+    @classmethod
+    def open(cls, *args, **kwargs):
+        """ Open the cache. Errors are swallowed.
+
+        Returns:
+            An instance of the cache or None if it couldn't be opened.
+        """
+        try:
+            return cls(*args, **kwargs)
+        except (OSError, sqlite3.Error):
+            return None
+
+    def _init_schema(self):
+        version = self._db.execute('PRAGMA user_version').fetchone()[0]
+        if version == SCHEMA_VERSION:
+            return
+
+        with self._db:
+            self._db.execute(f'DROP TABLE IF EXISTS {self._table}')
+            self._db.execute(f'CREATE TABLE {self._table} ({self._columns})')
+            self._db.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+    def close(self):
+        self.commit()
+        self._db.close()
+
+
+class OccurrenceCache(_Cache):
+    """ Expanded occurrences of recurring events.
+
+    Each entry is a list of (start, end) tuples of the occurrences of one
+    event within one window. Keys come from cache_key and should cover
+    everything the occurrences depend on.
+    """
+    _file = 'occurrences.sqlite'
+    _table = 'occurrences'
+    _columns = 'key TEXT PRIMARY KEY, spans TEXT NOT NULL, used INTEGER NOT NULL'
+
+    def lookup(self, keys):
+        """ Fetch the occurrences of several keys.
+
+        Returns:
+            A dict of key to a list of (start, end) tuples. Keys that aren't
+            cached are absent.
+        """
+        found = {}
+        batch = 500
+        for i in range(0, len(keys), batch):
+            chunk = keys[i:i + batch]
+            marks = ','.join('?' * len(chunk))
+            cur = self._db.execute(f'SELECT key, spans FROM occurrences WHERE key IN ({marks})', chunk)
+            for key, spans in cur:
+                found[key] = [tuple(s) for s in loads(spans)]
+
+        try:
+            with self._db:
+                self._db.executemany(
+                    'UPDATE occurrences SET used = ? WHERE key = ?', [(int(time.time()), k) for k in found])
+        except sqlite3.Error:
+            pass
+
+        return found
+
+    def store(self, key, spans):
+        """ Queue occurrences to be written on the next commit.
+
+        Occurrences that can't be serialized faithfully, like those with
+        time zones, are silently skipped.
+
+        Args:
+            key: Key from cache_key.
+            spans: List of (start, end) tuples.
+        """
+        if any(getattr(d, 'tzinfo', None) for span in spans for d in span):
+            return
+
+        s = dumps([list(span) for span in spans])
+        if s is not None:
+            self._pending.append((key, s, int(time.time())))
+
+    def commit(self):
+        """ Write queued entries and forget old ones.
+
+        Failures to write are ignored; this is only a cache.
+        """
+        pending, self._pending = self._pending, []
+        try:
+            with self._db:
+                if pending:
+                    self._db.executemany(
+                        'INSERT OR REPLACE INTO occurrences (key, spans, used) VALUES (?, ?, ?)', pending)
+                self._db.execute('DELETE FROM occurrences WHERE used < ?', (int(time.time()) - _MAX_AGE_S,))
+        except sqlite3.Error:
+            pass
+
+
+class EventCache(_Cache):
+    """ Serialized VEVENTs of exported zettels.
+
+    Entries belong to a feed, like the file a calendar is exported to, and
+    are keyed by the UID of their event. Each remembers the mtime and size
+    of the zettel it was serialized from, a key of the dates the event was
+    made from, the SEQUENCE of the event and a digest of its contents, so
+    unchanged zettels don't have to be serialized again and changed ones can
+    be told apart from touched ones. Relative dates, like "tomorrow", change
+    the key of the dates when they resolve to another day.
+    """
+    _file = 'events.sqlite'
+    _table = 'events'
+    _columns = (
+        'feed TEXT NOT NULL, uid TEXT NOT NULL, mtime INTEGER NOT NULL, size INTEGER NOT NULL, dates TEXT NOT NULL,'
+        ' sequence INTEGER NOT NULL, digest TEXT NOT NULL, vevent BLOB NOT NULL, PRIMARY KEY (feed, uid)')
+
+    def __init__(self, feed, path=None):
+        """ Open or create the cache of a feed. See _Cache.
+
+        Args:
+            feed: str naming the feed.
+            path: See _Cache.
+        """
+        self.feed = feed
+        super().__init__(path)
+
+    def lookup(self):
+        """ Fetch every entry of the feed.
+
+        Returns:
+            A dict of UID to (mtime, size, dates, sequence, digest, vevent)
+            tuples.
+        """
+        cur = self._db.execute(
+            'SELECT uid, mtime, size, dates, sequence, digest, vevent FROM events WHERE feed = ?', (self.feed,))
+        return {uid: tuple(rest) for uid, *rest in cur}
+
+    def store(self, uid, mtime, size, dates, sequence, digest, vevent):
+        """ Queue an entry to be written on the next commit.
+        """
+        self._pending.append((self.feed, uid, mtime, size, dates, sequence, digest, vevent))
+
+    def commit(self, keep=None):
+        """ Write queued entries.
+
+        Failures to write are ignored; this is only a cache.
+
+        Args:
+            keep: Set of UIDs still in the feed. Other entries of the feed
+                are forgotten. Defaults to keeping everything.
+        """
+        pending, self._pending = self._pending, []
+        try:
+            with self._db:
+                if pending:
+                    self._db.executemany(
+                        'INSERT OR REPLACE INTO events (feed, uid, mtime, size, dates, sequence, digest, vevent)'
+                        ' VALUES (?, ?, ?, ?, ?, ?, ?, ?)', pending)
+                if keep is not None:
+                    gone = [(self.feed, uid) for uid in set(self.lookup()) - set(keep)]
+                    self._db.executemany('DELETE FROM events WHERE feed = ? AND uid = ?', gone)
+        except sqlite3.Error:
+            pass
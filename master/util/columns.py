@@ -0,0 +1,247 @@
+""" Compact, read-only storage of many zettels.
+
+Commands that only look at a few attributes of every zettel don't need a
+Zettel object, with its Attributes dict, per zettel. ZettelColumns keeps
+the title, load path and selected attributes of each zettel in columns
+backed by arrays instead:
+
+- titles and load paths are packed into one bytes buffer each,
+- dates are day ordinals, with the seconds of datetimes alongside,
+- other values are stored once each and referred to by a code, which
+  suits attributes with few distinct values like stage and type.
+
+Rows are read through ColumnZettel views, which look enough like Zettels
+for filters and for todo --list-active.
+"""
+from array import array
+from datetime import date, datetime
+
+from libzet.NoCompare import NoCompare
+from superdate import SuperDate
+
+from master.util.dates import resolve_date
+from master.util.index import is_date_attr
+
+
+# Attributes libzet's Zettel sets on zettels that don't have them, and
+# functions making their values.
+_DEFAULTS = {
+    'creation_date': date.today,
+    'zlinks': dict,
+}
+
+
+class _Strings:
+    """ Column of strs packed into a single buffer.
+    """
+
+    def __init__(self):
+        self.data = bytearray()
+        self.offsets = array('Q', [0])
+
+    def append(self, s):
+        self.data += s.encode()
+        self.offsets.append(len(self.data))
+
+    def __getitem__(self, i):
+        return self.data[self.offsets[i]:self.offsets[i + 1]].decode()
+
+    def nbytes(self):
+        return len(self.data) + self.offsets.itemsize * len(self.offsets)
+
+
+class _Dates:
+    """ Column of dates and datetimes.
+
+    Values that aren't naive dates or datetimes with whole seconds, like
+    unparsed strings or None, are kept as is on the side.
+    """
+
+    def __init__(self):
+        # Day ordinals, 0 when there's no date. Seconds into the day of
+        # datetimes, -1 for dates.
+        self.days = array('l')
+        self.seconds = array('l')
+        self.other = {}
+
+    def append(self, value, present=True):
+        i = len(self.days)
+        if isinstance(value, SuperDate):
+            value = value._date
+        elif value and isinstance(value, str):
+            try:
+                value = resolve_date(value)
+            except ValueError:
+                pass
+
+        if isinstance(value, datetime) and value.tzinfo is None and not value.microsecond:
+            self.days.append(value.toordinal())
+            self.seconds.append(value.hour * 3600 + value.minute * 60 + value.second)
+            return
+
+        if type(value) is date:
+            self.days.append(value.toordinal())
+            self.seconds.append(-1)
+            return
+
+        self.days.append(0)
+        self.seconds.append(-1)
+        if present:
+            self.other[i] = value
+
+    def has(self, i):
+        return self.days[i] != 0 or i in self.other
+
+    def __getitem__(self, i):
+        day = self.days[i]
+        if not day:
+            return self.other[i]
+
+        d = date.fromordinal(day)
+        s = self.seconds[i]
+        if s >= 0:
+            d = datetime(d.year, d.month, d.day, s // 3600, s // 60 % 60, s % 60)
+
+        # Like Attributes, dates compare with dates and datetimes alike.
+        return SuperDate(d)
+
+    def nbytes(self):
+        return (self.days.itemsize + self.seconds.itemsize) * len(self.days)
+
+
+class _Values:
+    """ Dictionary encoded column of any values.
+    """
+
+    def __init__(self):
+        self.codes = array('L')
+
+        # Code 0 is for zettels without the attribute.
+        self.values = [None]
+        self._codes = {}
+
+    def append(self, value, present=True):
+        if not present:
+            self.codes.append(0)
+            return
+
+        try:
+            # Tell apart values that are equal but have different types,
+            # like True and 1.
+            key = (type(value), value)
+            code = self._codes.get(key)
+        except TypeError:
+            key = code = None
+
+        if code is None:
+            code = len(self.values)
+            self.values.append(value)
+            if key is not None:
+                self._codes[key] = code
+
+        self.codes.append(code)
+
+    def has(self, i):
+        return self.codes[i] != 0
+
+    def __getitem__(self, i):
+        return self.values[self.codes[i]]
+
+    def nbytes(self):
+        return self.codes.itemsize * len(self.codes)
+
+
+class ZettelColumns:
+    """ The titles, load paths and some attributes of many zettels.
+
+    Args:
+        attrs: Names of the attributes to keep.
+    """
+
+    def __init__(self, attrs):
+        self.titles = _Strings()
+        self.loadpaths = _Strings()
+        self.columns = {a: _Dates() if is_date_attr(a) else _Values() for a in attrs if a != '_loadpath'}
+
+    def append(self, loadpath, title, attrs):
+        """ Add a zettel.
+
+        Args:
+            loadpath: Path it was loaded from.
+            title: Its title.
+            attrs: Dict of its attributes. Only the kept ones are stored.
+                Those a Zettel always has get their defaults, like in
+                Zettel.
+        """
+        self.titles.append(title or '')
+        self.loadpaths.append(loadpath)
+        for name, column in self.columns.items():
+            if name in attrs:
+                column.append(attrs[name])
+            elif name in _DEFAULTS:
+                column.append(_DEFAULTS[name]())
+            else:
+                column.append(None, False)
+
+    def __len__(self):
+        return len(self.titles.offsets) - 1
+
+    def __getitem__(self, i):
+        if not -len(self) <= i < len(self):
+            raise IndexError('ZettelColumns index out of range')
+        return ColumnZettel(self, i % len(self))
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield ColumnZettel(self, i)
+
+    def nbytes(self):
+        """ Approximate size of the columns in bytes, not counting distinct values.
+        """
+        return self.titles.nbytes() + self.loadpaths.nbytes() + sum(c.nbytes() for c in self.columns.values())
+
+
+class _ColumnAttrs:
+    """ Attributes of a row, read like libzet's Attributes.
+
+    Missing attributes are NoCompare. Attributes that weren't kept raise a
+    KeyError, since whether the zettel had them isn't known.
+    """
+
+    def __init__(self, columns, i):
+        self._columns = columns
+        self._i = i
+
+    def _column(self, key):
+        try:
+            return self._columns.columns[key]
+        except KeyError:
+            raise KeyError(f'Attribute {key} was not loaded.')
+
+    def __getitem__(self, key):
+        return self.get(key, NoCompare())
+
+    def get(self, key, default=None):
+        if key == '_loadpath':
+            return self._columns.loadpaths[self._i]
+
+        column = self._column(key)
+        return column[self._i] if column.has(self._i) else default
+
+    def __contains__(self, key):
+        return key == '_loadpath' or self._column(key).has(self._i)
+
+    def keys(self):
+        return ['_loadpath'] + [k for k, c in self._columns.columns.items() if c.has(self._i)]
+
+    def items(self):
+        return [(k, self[k]) for k in self.keys()]
+
+
+class ColumnZettel:
+    """ A read-only view of one zettel of a ZettelColumns.
+    """
+
+    def __init__(self, columns, i):
+        self.title = columns.titles[i]
+        self.attrs = _ColumnAttrs(columns, i)
@@ -0,0 +1,123 @@
+""" Run commands in a long-lived master process.
+
+master serve loads a project once and listens on a Unix domain socket in
+the project's .master directory. Commands that only read zettels, like
+list and todo, are sent to it when it's running instead of loading the
+project themselves, and run in-process when it isn't.
+
+Requests and responses are a line of json each. A request holds the
+command line and working directory of the client, and a response holds
+what the command printed and its exit code.
+"""
+import json
+import os
+import socket
+
+from master.util.index import INDEX_DIR
+
+
+SOCKET_NAME = 'daemon.sock'
+
+# Subcommands a daemon can run for a client.
+FORWARDED = ('list', 'todo')
+
+# Options of master taking a value, which may come before the subcommand.
+_valued = ('-j', '--jobs')
+
+
+def socket_path(root):
+    """ Path of the socket of a daemon serving a directory.
+    """
+    return os.path.join(root, INDEX_DIR, SOCKET_NAME)
+
+
+def find_socket(path='.'):
+    """ Find the socket of a daemon serving a directory or any of its parents.
+
+    Returns:
+        The path of the socket, or None if there isn't one.
+    """
+    d = os.path.abspath(path)
+    while True:
+        p = socket_path(d)
+        if os.path.exists(p):
+            return p
+
+        parent = os.path.dirname(d)
+        if parent == d:
+            return None
+        d = parent
+
+
+def subcommand(argv):
+    """ Find the subcommand of a master command line.
+
+    Returns:
+        The subcommand, or None if there isn't one.
+    """
+    skip = False
+    for a in argv:
+        if skip:
+            skip = False
+        elif a in _valued:
+            skip = True
+        elif not a.startswith('-'):
+            return a
+
+    return None
+
+
+def send(sock_path, request):
+    """ Send a request to a daemon and wait for its response.
+
+    Raises:
+        OSError if the daemon couldn't be reached.
+        ValueError if the response was invalid.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.connect(sock_path)
+        s.sendall(json.dumps(request).encode() + b'\n')
+        s.shutdown(socket.SHUT_WR)
+
+        chunks = []
+        while True:
+            chunk = s.recv(1 << 16)
+            if not chunk:
+                break
+            chunks.append(chunk)
+
+    return json.loads(b''.join(chunks))
+
+
+def forward(argv, cwd=None):
+    """ Run a command line in a daemon if one serves the working directory.
+
+    Only the subcommands in FORWARDED are sent, without --watch, and any
+    failure to reach the daemon is silent. Set MASTER_NO_DAEMON to never
+    send commands.
+
+    Args:
+        argv: Arguments of master, without the program name.
+        cwd: Working directory. Defaults to the current one.
+
+    Returns:
+        (code, stdout, stderr) tuple of what the command printed and its
+        exit code, or None if it has to run in this process.
+    """
+    if os.environ.get('MASTER_NO_DAEMON') or subcommand(argv) not in FORWARDED:
+        return None
+
+    # Watching runs until interrupted, and has to see the files itself.
+    if '--watch' in argv:
+        return None
+
+    cwd = cwd or os.getcwd()
+    sock_path = find_socket(cwd)
+    if not sock_path:
+        return None
+
+    try:
+        r = send(sock_path, {'argv': argv, 'cwd': cwd})
+        return r['code'], r['stdout'], r['stderr']
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
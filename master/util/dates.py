@@ -0,0 +1,276 @@
+""" Memoized parsing of human-readable dates and durations.
+
+Attributes like event_begin or duration may be written in plain english,
+like "next thursday 4pm" or "4h 30m". superdate parses those with
+parsedatetime, which is slow, and only remembers what it parsed for the
+current second. Vaults tend to repeat the same few strings a lot, so this
+remembers them for longer.
+
+What a string resolves to may depend on when it's parsed. Each string is
+classified the first time it's seen by parsing it as if it were read at
+different times:
+
+- absolute strings, like "2022-11-01" or "4h 30m" as a duration, resolve
+  the same whenever they're read. They're remembered for good.
+- relative strings, like "next thursday 4pm", resolve the same all day.
+  They're remembered along with the day they were resolved on.
+- anything else, like "in 2 hours", depends on the time of day and is
+  parsed again on every call.
+
+Absolute and relative strings may be saved to disk and loaded on the next
+run. See DateResolver.save.
+"""
+import os
+from collections import OrderedDict
+from datetime import date, datetime, time, timedelta
+
+import parsedatetime as pdt
+from libzet.Zettel import parse_duration
+from superdate import parse_date
+
+from master.util.cache import cache_dir
+from master.util.index import dumps, loads
+
+
+# Number of strings remembered in memory.
+MAX_ENTRIES = 4096
+
+# Marks strings that must be parsed again on every call.
+_VOLATILE = object()
+
+# A day far enough from any reference day that relative strings resolve
+# differently on it.
+_FAR = timedelta(days=1000)
+
+_cal = pdt.Calendar(version=pdt.VERSION_CONTEXT_STYLE)
+
+
+def _probe(s, force_time, source):
+    """ Parse a str the way parse_date would at some other time.
+
+    Returns:
+        A date or datetime, or None if parsedatetime can't parse it.
+    """
+    d, ctx = _cal.parse(s, sourceTime=source.timetuple())
+    if not ctx.hasDateOrTime:
+        return None
+
+    if not ctx.hasTime and not force_time:
+        return date(*d[:3])
+    return datetime(*d[:6])
+
+
+def _sources(day):
+    """ Times to probe a str at. The first two are on day.
+    """
+    return [
+        datetime.combine(day, time(0, 0, 1)),
+        datetime.combine(day, time(23, 59, 58)),
+        datetime.combine(day + _FAR, time(0, 0, 1)),
+    ]
+
+
+def _classify(results, value):
+    """ Tell how probed results depend on when they were parsed.
+
+    Args:
+        results: Values parsed at each of _sources.
+        value: The value actually used.
+
+    Returns:
+        'absolute', 'relative' or None if it depends on the time of day.
+    """
+    early, late, far = results
+    if early is None:
+        # Only superdate's own formats parse this, and those are absolute.
+        return 'absolute'
+    if early != late:
+        return None
+    if early != value or early == far:
+        return 'absolute'
+    return 'relative'
+
+
+class DateResolver:
+    """ Parse dates and durations, remembering what was parsed.
+
+    Entries are keyed by the str and, for relative ones, the day they were
+    resolved on. At most maxsize of them are kept; the least recently used
+    are forgotten first.
+    """
+
+    def __init__(self, maxsize=MAX_ENTRIES):
+        self.maxsize = maxsize
+        self._memo = OrderedDict()
+
+    def __len__(self):
+        return len(self._memo)
+
+    def clear(self):
+        self._memo.clear()
+
+    def _get(self, key, today):
+        for k in (key + (None,), key + (today,)):
+            if k in self._memo:
+                self._memo.move_to_end(k)
+                return self._memo[k]
+
+        return None
+
+    def _put(self, key, today, kind, value):
+        if kind == 'absolute':
+            self._memo[key + (None,)] = value
+        elif kind == 'relative':
+            self._memo[key + (today,)] = value
+        else:
+            self._memo[key + (today,)] = _VOLATILE
+
+        while len(self._memo) > self.maxsize:
+            self._memo.popitem(last=False)
+
+    def date(self, s, force_time=False):
+        """ Parse a str into a date or datetime. See superdate.parse_date.
+
+        Args:
+            s: The str. Dates and datetimes are returned as they are.
+            force_time: Always return a datetime.
+
+        Raises:
+            ValueError if s can't be parsed.
+        """
+        if isinstance(s, date):
+            return parse_date(s, force_time=force_time)
+
+        s = str(s)
+        today = date.today()
+        key = ('date', s, force_time)
+
+        d = self._get(key, today)
+        if d is _VOLATILE:
+            return parse_date(s, force_time=force_time)
+        if d is not None:
+            return d
+
+        d = parse_date(s, force_time=force_time)
+        kind = _classify([_probe(s, force_time, t) for t in _sources(today)], d)
+        self._put(key, today, kind, d)
+        return d
+
+    def duration(self, s):
+        """ Parse a str into a timedelta. See libzet's parse_duration.
+
+        Durations like "4h 30m" are exact, rather than off by however far
+        into the current minute they were parsed.
+
+        Raises:
+            ValueError if s can't be parsed.
+        """
+        if isinstance(s, timedelta):
+            return s
+
+        s = str(s)
+        today = date.today()
+        key = ('duration', s)
+
+        d = self._get(key, today)
+        if d is _VOLATILE:
+            return parse_duration(s)
+        if d is not None:
+            return d
+
+        sources = _sources(today)
+        results = [_probe(s, True, t) for t in sources]
+        if results[0] is None:
+            # Parsed by superdate's own formats, as a point in time.
+            self._put(key, today, None, None)
+            return parse_duration(s)
+
+        deltas = [r - t for r, t in zip(results, sources)]
+        kind = _classify(deltas, deltas[0])
+        if kind is None:
+            self._put(key, today, None, None)
+            return parse_duration(s)
+
+        self._put(key, today, kind, deltas[0])
+        return deltas[0]
+
+    def save(self, path=None):
+        """ Write what's been resolved to a file, to be loaded later.
+
+        Only entries that are still valid on another run are written;
+        absolute ones, and relative ones of today. Failures to write are
+        ignored.
+
+        Args:
+            path: File to write. Defaults to dates.json in cache_dir.
+        """
+        path = path or os.path.join(cache_dir(), 'dates.json')
+        today = date.today()
+
+        entries = []
+        for (kind, *key, day), value in self._memo.items():
+            if value is _VOLATILE or day not in (None, today) or getattr(value, 'tzinfo', None):
+                continue
+            if kind == 'duration':
+                value = value.total_seconds()
+            entries.append([kind, key, day is not None, value])
+
+        s = dumps({'today': today, 'entries': entries})
+        if s is None:
+            return
+
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f'{path}.{os.getpid()}'
+            with open(tmp, 'w') as f:
+                f.write(s)
+            os.replace(tmp, path)
+        except OSError:
+            pass
+
+    def load(self, path=None):
+        """ Remember entries written by save.
+
+        Relative entries of other days, and unreadable files, are ignored.
+
+        Args:
+            path: See save.
+        """
+        path = path or os.path.join(cache_dir(), 'dates.json')
+        today = date.today()
+
+        try:
+            with open(path) as f:
+                saved = loads(f.read())
+            entries = saved['entries']
+            stale = saved['today'] != today
+        except (OSError, ValueError, KeyError, TypeError):
+            return
+
+        for kind, key, relative, value in entries:
+            if relative and stale:
+                continue
+            if kind == 'duration':
+                value = timedelta(seconds=value)
+
+            key = (kind, *key, today if relative else None)
+            self._memo.setdefault(key, value)
+
+        while len(self._memo) > self.maxsize:
+            self._memo.popitem(last=False)
+
+
+# Shared by everything within a process.
+resolver = DateResolver()
+
+
+def resolve_date(s, force_time=False):
+    """ Parse a date with the shared DateResolver. See DateResolver.date.
+    """
+    return resolver.date(s, force_time)
+
+
+def resolve_duration(s):
+    """ Parse a duration with the shared DateResolver. See DateResolver.duration.
+    """
+    return resolver.duration(s)
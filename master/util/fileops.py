@@ -0,0 +1,861 @@
+""" Batches of file moves and removals that survive interruptions.
+
+A batch is planned in full before any file is touched: every source is
+checked, every destination is decided, and moves within a filesystem are
+told apart from moves across filesystems. The plan is then written to a
+journal, and removed once the batch is done. Journals are kept in the
+.master directory of the project, or other index root, holding every path
+of the batch, so batches of one vault don't get in the way of another's.
+Those of batches outside of any are kept in the cache directory.
+
+Moves within a filesystem are a rename each, directories included. Moves
+across filesystems copy the file next to its destination, rename it into
+place and remove the source, in a pool of threads. Removals rename each
+file to a hidden name next to it, and delete those once every file was
+renamed.
+
+The state of each move can be told from which of its paths exist, so the
+journal only holds the plan. resume() finishes an interrupted batch and
+rollback() puts every file back where it was.
+
+Moves also rewrite the links of other zettels to the files they move. See
+master.util.links.
+
+Copies never pass through Python. Files are reflinked where the filesystem
+supports it and copied by the kernel otherwise, and a zettel's title is
+the only part of it that's ever rewritten.
+"""
+import errno
+import json
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import fcntl
+except ImportError:  # Not POSIX. Running batches can't be told apart.
+    fcntl = None
+
+from master.util.cache import cache_dir
+from master.util.index import INDEX_DIR, find_index_root
+from master.util.links import invert_edits, rewrite_links
+from master.util.load import resolve_jobs
+from master.util.profile import phase
+
+
+JOURNAL_DIR = 'journal'
+
+# Suffix of files copied across filesystems until they're complete.
+PART_SUFFIX = '.master-part'
+
+# Suffix of the hidden names files are renamed to when they're removed.
+TRASH_SUFFIX = '.master-rm'
+
+
+class Batch:
+    """ Planned file operations.
+
+    Args:
+        command: Name of the command that planned it, like "mv".
+        moves: List of (src, dst) tuples of paths to move. A src that's a
+            directory moves with everything in it.
+        purge: Paths to delete once every move is done.
+        mkdirs: Directories to create before moving, parents first.
+        rmdirs: Directories to remove once they're empty, children first.
+        links: (path, edits) tuples of the links to rewrite once every
+            move is done. See links.plan_link_edits.
+        id: Unique name of the batch. Defaults to one made from the time
+            and the process ID.
+        root: Index root its journal is kept in, or None to keep it in the
+            cache directory. See batch_root.
+    """
+    def __init__(self, command, moves=(), purge=(), mkdirs=(), rmdirs=(), links=(), id=None, root=None):
+        self.command = command
+        self.root = root
+        self.moves = [tuple(m) for m in moves]
+        self.purge = list(purge)
+        self.mkdirs = list(mkdirs)
+        self.rmdirs = list(rmdirs)
+        self.links = [(path, [tuple(e) for e in edits]) for path, edits in links]
+        self.id = id or f'{time.strftime("%Y%m%d%H%M%S")}-{os.getpid()}'
+
+    def to_json(self):
+        return {'command': self.command, 'id': self.id, 'moves': self.moves, 'purge': self.purge,
+                'mkdirs': self.mkdirs, 'rmdirs': self.rmdirs, 'links': self.links, 'root': self.root}
+
+    @classmethod
+    def from_json(cls, d):
+        return cls(d['command'], d['moves'], d['purge'], d['mkdirs'], d['rmdirs'], d.get('links', ()), d['id'],
+                   d.get('root'))
+
+
+def journal_dir(root=None):
+    """ Directory the journals of running and interrupted batches are in.
+
+    Args:
+        root: Index root of the batches, or None for batches outside of
+            any.
+    """
+    if root:
+        return os.path.join(root, INDEX_DIR, JOURNAL_DIR)
+    return os.path.join(cache_dir(), JOURNAL_DIR)
+
+
+def batch_root(paths):
+    """ Index root of a batch of paths. See find_index_root.
+
+    Returns:
+        The innermost index root holding every path, or None if there's
+        none.
+    """
+    if not paths:
+        return None
+    return find_index_root(os.path.commonpath([os.path.abspath(p) for p in paths]))
+
+
+def journal_roots(path, outside=False):
+    """ Index roots whose journals concern a path, innermost first.
+
+    These are the index root of the path and those of its ancestors.
+
+    Args:
+        path: File or directory.
+        outside: Also include None, for the journals of batches outside
+            of any index root.
+
+    Returns:
+        A list of roots, which is [None] outside of any index root.
+    """
+    roots = []
+    root = find_index_root(path)
+    while root:
+        roots.append(root)
+        parent = os.path.dirname(root)
+        root = find_index_root(parent) if parent != root else None
+
+    if outside or not roots:
+        roots.append(None)
+    return roots
+
+
+class Journal:
+    """ Journal of a batch, locked for as long as it's open.
+
+    Use Journal.create and Journal.pending instead of making one.
+    """
+    def __init__(self, path, fd, batch):
+        self.path = path
+        self.fd = fd
+        self.batch = batch
+
+    @classmethod
+    def create(cls, batch):
+        """ Write the journal of a batch before running it.
+
+        Raises:
+            OSError if it couldn't be written.
+        """
+        d = journal_dir(batch.root)
+        os.makedirs(d, exist_ok=True)
+        path = os.path.join(d, f'{batch.command}-{batch.id}.json')
+
+        # The plan has to be complete on disk before any file moves.
+        tmp = f'{path}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(batch.to_json(), f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+        journal = cls._open(path)
+        journal.batch = batch
+        return journal
+
+    @classmethod
+    def _open(cls, path):
+        """ Open and lock a journal.
+
+        Returns:
+            The Journal, or None if another process holds it.
+        """
+        fd = os.open(path, os.O_RDONLY)
+        if fcntl:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                os.close(fd)
+                return None
+        return cls(path, fd, None)
+
+    @classmethod
+    def pending(cls, command, roots=(None,)):
+        """ Journals of the interrupted batches of a command, oldest first.
+
+        Batches still running in another process are left out.
+
+        Args:
+            command: Name of the command, like "mv".
+            roots: Index roots whose journals to look at. See journal_dir.
+        """
+        names = []
+        for root in roots:
+            d = journal_dir(root)
+            try:
+                names.extend((n, d) for n in os.listdir(d) if n.startswith(f'{command}-') and n.endswith('.json'))
+            except FileNotFoundError:
+                pass
+
+        journals = []
+        for n, d in sorted(names):
+            try:
+                journal = cls._open(os.path.join(d, n))
+            except FileNotFoundError:
+                continue
+            if journal is None:
+                continue
+
+            try:
+                with open(journal.path) as f:
+                    journal.batch = Batch.from_json(json.load(f))
+            except (ValueError, KeyError, TypeError):
+                journal.close()
+                continue
+            journals.append(journal)
+
+        return journals
+
+    def close(self, done=False):
+        """ Unlock the journal.
+
+        Args:
+            done: Remove it too, because its batch was finished or rolled
+                back.
+        """
+        if done:
+            os.remove(self.path)
+        os.close(self.fd)
+
+
+def _same_device(src, dst):
+    return os.lstat(src).st_dev == os.stat(os.path.dirname(dst) or '.').st_dev
+
+
+def _is_inside(path, d):
+    return os.path.commonpath([path, d]) == d
+
+
+def plan_move(sources, dest):
+    """ Plan moving files and directories.
+
+    Sources move into dest if it's a directory. A single source is renamed
+    to dest otherwise. Existing files are never overwritten.
+
+    Args:
+        sources: Paths of the files and directories to move.
+        dest: Where to move them.
+
+    Returns:
+        A Batch.
+
+    Raises:
+        ValueError if a move isn't possible.
+    """
+    dest = os.path.abspath(dest)
+    into = os.path.isdir(dest)
+    if not into and len(sources) > 1:
+        raise ValueError(f'{dest} is not a directory.')
+    if not into and not os.path.isdir(os.path.dirname(dest)):
+        raise ValueError(f'{os.path.dirname(dest)} is not a directory.')
+
+    batch = Batch('mv', root=batch_root(list(sources) + [dest]))
+    targets = set()
+    for src in sources:
+        src = os.path.abspath(src)
+        if not os.path.lexists(src):
+            raise ValueError(f'{src} does not exist.')
+
+        dst = os.path.join(dest, os.path.basename(src)) if into else dest
+        if dst == src:
+            continue
+        if os.path.lexists(dst) or dst in targets:
+            raise ValueError(f'{dst} already exists.')
+        if os.path.isdir(src) and not os.path.islink(src) and _is_inside(dst, src):
+            raise ValueError(f'Cannot move {src} into itself.')
+        targets.add(dst)
+
+        if _same_device(src, dst) or not os.path.isdir(src) or os.path.islink(src):
+            batch.moves.append((src, dst))
+            continue
+
+        # Directories can't be renamed across filesystems. Their files are
+        # copied one by one instead, and they're removed once empty.
+        walked = []
+        for root, dirs, files in os.walk(src):
+            target = os.path.join(dst, os.path.relpath(root, src))
+            batch.mkdirs.append(os.path.normpath(target))
+            walked.append(root)
+            # Links to directories are moved as links.
+            for name in files + [d for d in dirs if os.path.islink(os.path.join(root, d))]:
+                batch.moves.append((os.path.join(root, name), os.path.join(target, name)))
+        batch.rmdirs.extend(reversed(walked))
+
+    return batch
+
+
+def plan_remove(paths):
+    """ Plan removing files.
+
+    Args:
+        paths: Paths of the files to remove.
+
+    Returns:
+        A Batch.
+
+    Raises:
+        ValueError if a path doesn't exist or is a directory.
+    """
+    batch = Batch('rm', root=batch_root(paths))
+    for path in dict.fromkeys(os.path.abspath(p) for p in paths):
+        if not os.path.lexists(path):
+            raise ValueError(f'{path} does not exist.')
+        if os.path.isdir(path) and not os.path.islink(path):
+            raise ValueError(f'{path} is a directory.')
+
+        d, name = os.path.split(path)
+        trash = os.path.join(d, f'.{name}.{batch.id}{TRASH_SUFFIX}')
+        batch.moves.append((path, trash))
+        batch.purge.append(trash)
+
+    return batch
+
+
+def _same_file(a, b):
+    """ Whether b is a finished copy of a. Copies keep the mtime.
+    """
+    sa, sb = os.lstat(a), os.lstat(b)
+    return sa.st_size == sb.st_size and sa.st_mtime_ns == sb.st_mtime_ns
+
+
+def _remove(path):
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path)
+    else:
+        os.remove(path)
+
+
+def _copy(src, dst):
+    """ Move a file across filesystems, or a directory if it has to.
+    """
+    part = dst + PART_SUFFIX
+    if os.path.lexists(part):
+        _remove(part)
+
+    if os.path.isdir(src) and not os.path.islink(src):
+        shutil.copytree(src, part, symlinks=True)
+    else:
+        shutil.copy2(src, part, follow_symlinks=False)
+        if not os.path.islink(part):
+            # The copy has to be on disk before its source is gone.
+            fd = os.open(part, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    os.replace(part, dst)
+    _remove(src)
+
+
+def _move(src, dst, copies):
+    """ Move src to dst, unless that's already done.
+
+    Moves that can't be a rename are added to copies instead.
+
+    Raises:
+        OSError if dst exists and isn't a copy of src.
+    """
+    if not os.path.lexists(src):
+        return
+
+    if os.path.lexists(dst):
+        # Interrupted after copying but before removing the source.
+        if not _same_file(src, dst):
+            raise FileExistsError(errno.EEXIST, 'Destination already exists', dst)
+        _remove(src)
+        return
+
+    try:
+        os.rename(src, dst)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        copies.append((src, dst))
+
+
+def _copy_all(copies, jobs):
+    if not copies:
+        return
+
+    with ThreadPoolExecutor(resolve_jobs(jobs)) as pool:
+        # Consuming the results raises the first failure.
+        for _ in pool.map(lambda m: _copy(*m), copies):
+            pass
+
+
+def apply(batch, jobs=None):
+    """ Run a batch, or what's left of it.
+
+    Args:
+        batch: The Batch.
+        jobs: Number of threads copying across filesystems. See
+            load.resolve_jobs.
+
+    Raises:
+        OSError if a file couldn't be moved or removed. The batch can be
+        applied again to finish it.
+    """
+    for d in batch.mkdirs:
+        os.makedirs(d, exist_ok=True)
+
+    copies = []
+    for src, dst in batch.moves:
+        _move(src, dst, copies)
+    _copy_all(copies, jobs)
+
+    rewrite_links(batch.links)
+
+    for path in batch.purge:
+        try:
+            _remove(path)
+        except FileNotFoundError:
+            pass
+
+    for d in batch.rmdirs:
+        try:
+            os.rmdir(d)
+        except FileNotFoundError:
+            pass
+
+
+def revert(batch, jobs=None):
+    """ Undo a batch, or what was done of it.
+
+    Files that were purged already can't be brought back.
+
+    Raises:
+        OSError if a file couldn't be moved back.
+    """
+    rewrite_links([(path, invert_edits(edits)) for path, edits in batch.links])
+
+    copies = []
+    for src, dst in reversed(batch.moves):
+        part = dst + PART_SUFFIX
+        if os.path.lexists(part):
+            _remove(part)
+
+        if os.path.lexists(dst):
+            os.makedirs(os.path.dirname(src), exist_ok=True)
+        _move(dst, src, copies)
+    _copy_all(copies, jobs)
+
+    for d in reversed(batch.mkdirs):
+        try:
+            os.rmdir(d)
+        except OSError:
+            pass
+
+
+def run(batch, jobs=None):
+    """ Journal and apply a batch.
+
+    Raises:
+        OSError if the journal couldn't be written or the batch couldn't
+        be applied. The journal is kept in the latter case.
+    """
+    journal = Journal.create(batch)
+    done = False
+    try:
+        apply(batch, jobs)
+        done = True
+    finally:
+        journal.close(done)
+
+
+def resume(command, jobs=None, where='.'):
+    """ Finish the interrupted batches of a command.
+
+    Args:
+        command: Name of the command, like "mv".
+        jobs: See apply.
+        where: Path whose batches to finish; those of its index root and
+            of their ancestors, and those outside of any. See journal_roots.
+
+    Returns:
+        The number of batches that were finished.
+
+    Raises:
+        OSError if a batch couldn't be finished. Its journal is kept.
+    """
+    return _recover(command, apply, jobs, where)
+
+
+def rollback(command, jobs=None, where='.'):
+    """ Undo the interrupted batches of a command, newest first.
+
+    Args:
+        See resume.
+
+    Returns:
+        The number of batches that were undone.
+
+    Raises:
+        OSError if a batch couldn't be undone. Its journal is kept.
+    """
+    return _recover(command, revert, jobs, where, reverse=True)
+
+
+def _recover(command, how, jobs, where, reverse=False):
+    journals = Journal.pending(command, journal_roots(where, outside=True))
+    if reverse:
+        journals.reverse()
+
+    count = 0
+    try:
+        while journals:
+            journal = journals.pop(0)
+            done = False
+            try:
+                how(journal.batch, jobs)
+                done = True
+            finally:
+                journal.close(done)
+            count += 1
+    finally:
+        for journal in journals:
+            journal.close()
+
+    return count
+
+
+# ioctl sharing the extents of a file with another on btrfs, XFS and the
+# like, so copies take no space until either is changed.
+_FICLONE = 0x40049409
+
+# Errors of copy_file_range where it can't copy between two files.
+_NO_RANGE_COPY = (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EBADF)
+
+# Bytes read from the start of a zettel to find its title.
+_TITLE_WINDOW = 4096
+
+
+def _reflink(src_fd, dst_fd):
+    """ Clone a whole file, if the filesystem can.
+    """
+    if fcntl is None:
+        return False
+    try:
+        fcntl.ioctl(dst_fd, _FICLONE, src_fd)
+        return True
+    except OSError:
+        return False
+
+
+def _copy_range(src_fd, dst_fd, offset, count):
+    """ Append count bytes of src_fd from offset to dst_fd in the kernel.
+
+    Uses copy_file_range, then sendfile, then plain reads and writes,
+    whichever works first.
+    """
+    copy_file_range = getattr(os, 'copy_file_range', None)
+    sendfile = getattr(os, 'sendfile', None)
+    while count > 0:
+        if copy_file_range:
+            try:
+                n = copy_file_range(src_fd, dst_fd, count, offset)
+            except OSError as e:
+                if e.errno not in _NO_RANGE_COPY:
+                    raise
+                copy_file_range = None
+                continue
+        elif sendfile:
+            try:
+                n = sendfile(dst_fd, src_fd, offset, count)
+            except OSError as e:
+                if e.errno not in _NO_RANGE_COPY:
+                    raise
+                sendfile = None
+                continue
+        else:
+            data = os.pread(src_fd, min(count, 1 << 20), offset)
+            n = len(data)
+            while data:
+                data = data[os.write(dst_fd, data):]
+
+        # The file shrank while it was copied.
+        if not n:
+            break
+        offset += n
+        count -= n
+
+
+def _title_span(head, zettel_format):
+    """ Find the title of a zettel in the first bytes of its file.
+
+    Returns:
+        (start, end, title) tuple of where the lines holding the title are,
+        or None if the zettel has no title there.
+    """
+    start = len(head) - len(head.lstrip())
+    lines = head[start:].splitlines(keepends=True)
+    if zettel_format == 'md':
+        if lines and lines[0].endswith(b'\n') and lines[0].strip().startswith(b'# '):
+            title = b' '.join(lines[0].split()[1:])
+            return start, start + len(lines[0]), title.decode(errors='replace')
+    elif len(lines) >= 3 and lines[2].endswith(b'\n'):
+        marks = [x.strip() for x in (lines[0], lines[2])]
+        if all(m and m == b'=' * len(m) for m in marks):
+            return start, start + len(b''.join(lines[:3])), lines[1].strip().decode(errors='replace')
+    return None
+
+
+def _title_lines(title, zettel_format):
+    if zettel_format == 'md':
+        return f'# {title}\n'.encode()
+    mark = '=' * (len(title) + 2)
+    return f'{mark}\n {title}\n{mark}\n'.encode()
+
+
+def clone_file(src, dst, retitle=None, zettel_format='md'):
+    """ Copy a file without reading it into memory.
+
+    The copy is a reflink where the filesystem supports them, and is made
+    with copy_file_range or sendfile otherwise. Only the title of a zettel
+    is ever rewritten, and the rest of it is copied as is. The copy gets
+    the mode of src, and only appears at dst once it's complete.
+
+    Args:
+        src: Path of the file.
+        dst: Path of the copy. An existing file is replaced.
+        retitle: (old, new) tuple to give the copy the title new if its
+            title is old, or None to copy the file as is.
+        zettel_format: md or rst. The format of the title.
+
+    Returns:
+        The number of bytes copied.
+    """
+    if os.path.islink(src):
+        os.symlink(os.readlink(src), dst)
+        return 0
+
+    part = dst + PART_SUFFIX
+    with open(src, 'rb') as fin, open(part, 'wb') as fout:
+        src_fd, dst_fd = fin.fileno(), fout.fileno()
+        size = os.fstat(src_fd).st_size
+
+        offset = 0
+        span = _title_span(os.pread(src_fd, _TITLE_WINDOW, 0), zettel_format) if retitle else None
+        if span and span[2] == retitle[0]:
+            start, offset, _ = span
+            fout.write(os.pread(src_fd, start, 0) + _title_lines(retitle[1], zettel_format))
+            fout.flush()
+        elif _reflink(src_fd, dst_fd):
+            offset = size
+
+        _copy_range(src_fd, dst_fd, offset, size - offset)
+
+    shutil.copymode(src, part)
+    os.replace(part, dst)
+    return size
+
+
+def plan_copy(sources, dest, ids=None, task_re=None):
+    """ Plan copying files and directories.
+
+    Sources are copied into dest if it's a directory, and a single source
+    is copied to dest otherwise. Existing files are never overwritten.
+
+    Args:
+        sources: Paths of the files and directories to copy.
+        dest: Where to copy them.
+        ids: Function allocating new IDs for the tasks copied into dest,
+            or None to keep their names. It's given the directory they're
+            copied to and how many are needed, and returns (id, path)
+            tuples of reserved files. A task titled after the ID in its
+            file name gets its new ID as its title.
+        task_re: Compiled regex of the IDs of tasks. Only zettels whose
+            file names, without their extension, match it are tasks.
+
+    Returns:
+        (mkdirs, copies) tuple of the directories to create, parents first,
+        and (src, dst, retitle) tuples for clone_file.
+
+    Raises:
+        ValueError if a copy isn't possible.
+    """
+    dest = os.path.abspath(dest)
+    into = os.path.isdir(dest)
+    if not into and len(sources) > 1:
+        raise ValueError(f'{dest} is not a directory.')
+    if not into and not os.path.isdir(os.path.dirname(dest)):
+        raise ValueError(f'{os.path.dirname(dest)} is not a directory.')
+
+    def is_task(path):
+        stem, ext = os.path.splitext(os.path.basename(path))
+        return (ids is not None and task_re is not None and ext in ('.md', '.rst') and not os.path.islink(path)
+                and task_re.fullmatch(stem) is not None)
+
+    mkdirs = []
+    copies = []
+    # Directories to the tasks copied into them.
+    renamed = {}
+    for src in sources:
+        src = os.path.abspath(src)
+        if not os.path.lexists(src):
+            raise ValueError(f'{src} does not exist.')
+
+        dst = os.path.join(dest, os.path.basename(src)) if into else dest
+        if not os.path.isdir(src) or os.path.islink(src):
+            if into and is_task(src):
+                renamed.setdefault(dest, []).append(src)
+            else:
+                copies.append((src, dst, None))
+            continue
+
+        if _is_inside(dst, src):
+            raise ValueError(f'Cannot copy {src} into itself.')
+
+        for root, dirs, files in os.walk(src):
+            target = os.path.normpath(os.path.join(dst, os.path.relpath(root, src)))
+            mkdirs.append(target)
+            for name in files:
+                path = os.path.join(root, name)
+                if is_task(path):
+                    renamed.setdefault(target, []).append(path)
+                else:
+                    copies.append((path, os.path.join(target, name), None))
+
+            # Links to directories are copied as links.
+            for name in dirs:
+                if os.path.islink(os.path.join(root, name)):
+                    copies.append((os.path.join(root, name), os.path.join(target, name), None))
+
+    targets = set()
+    for _, dst, _ in copies:
+        if os.path.lexists(dst) or dst in targets:
+            raise ValueError(f'{dst} already exists.')
+        targets.add(dst)
+
+    # IDs are only allocated once nothing else can go wrong. Their files
+    # are reserved in the directories the tasks are copied to.
+    for d, tasks in renamed.items():
+        os.makedirs(d, exist_ok=True)
+        for src, (new, path) in zip(tasks, ids(d, len(tasks))):
+            old = os.path.splitext(os.path.basename(src))[0]
+            copies.append((src, path, (old, new)))
+
+    return mkdirs, copies
+
+
+def copy_all(mkdirs, copies, jobs=None):
+    """ Run the copies planned by plan_copy in a pool of threads.
+
+    Args:
+        jobs: Number of threads. See load.resolve_jobs.
+
+    Returns:
+        The number of bytes copied.
+
+    Raises:
+        OSError if a file couldn't be copied. Copies that were complete
+        are kept, and the files reserved for the tasks that weren't are
+        removed.
+    """
+    def copy(c):
+        src, dst, retitle = c
+        try:
+            return clone_file(src, dst, retitle, 'rst' if src.endswith('.rst') else 'md')
+        except BaseException:
+            if retitle:
+                _unreserve(dst)
+            raise
+
+    try:
+        for d in mkdirs:
+            os.makedirs(d, exist_ok=True)
+    except BaseException:
+        for _, dst, retitle in copies:
+            if retitle:
+                _unreserve(dst)
+        raise
+
+    with ThreadPoolExecutor(resolve_jobs(jobs)) as pool:
+        return sum(pool.map(copy, copies))
+
+
+def _unreserve(path):
+    """ Remove the file reserved for a task if nothing was written to it.
+    """
+    try:
+        if not os.path.getsize(path):
+            os.remove(path)
+    except OSError:
+        pass
+
+
+def _hint(command, root):
+    """ How to finish or undo an interrupted batch of a command.
+    """
+    hint = f'Finish it with "master {command} --resume" or undo it with "master {command} --rollback"'
+    return f'{hint} from within {root}.' if root else f'{hint}.'
+
+
+def run_command(command, args, plan):
+    """ What mv and rm do, from their parsed arguments.
+
+    Args:
+        command: "mv" or "rm".
+        args: Parsed arguments, with resume and rollback flags.
+        plan: Function planning the batch from args.
+    """
+    paths = list(args.zettels) + ([args.dest] if getattr(args, 'dest', None) else [])
+    if args.resume or args.rollback:
+        if paths:
+            print(f'ERROR: {"--resume" if args.resume else "--rollback"} takes no zettels.')
+            sys.exit(1)
+        try:
+            count = (resume if args.resume else rollback)(command, args.jobs)
+        except OSError as e:
+            print(f'ERROR: {e}')
+            sys.exit(1)
+        if not count:
+            print(f'No interrupted {command} was found.')
+        return
+
+    # Only interrupted batches of the same vault are in the way.
+    where = os.path.commonpath([os.path.abspath(p) for p in paths]) if paths else '.'
+    pending = Journal.pending(command, journal_roots(where))
+    for journal in pending:
+        journal.close()
+    if pending:
+        print(f'ERROR: A previous {command} was interrupted. {_hint(command, pending[0].batch.root)}')
+        sys.exit(1)
+
+    try:
+        with phase('plan'):
+            batch = plan(args)
+    except ValueError as e:
+        print(f'ERROR: {e}')
+        sys.exit(1)
+
+    try:
+        with phase('run'):
+            run(batch, args.jobs)
+    except OSError as e:
+        print(f'ERROR: {e}')
+        print(_hint(command, batch.root))
+        sys.exit(1)
+    except KeyboardInterrupt:
+        print(_hint(command, batch.root))
+        raise
@@ -0,0 +1,176 @@
+""" Compile filter expressions for zettels.
+
+Filters are python expressions evaluated against each zettel. They're
+parsed once, checked against a small whitelist of syntax, and compiled
+into a function. Only comparisons, boolean logic, attribute access,
+subscripts with constant keys and literals are allowed; there are no
+calls, so filters can't run arbitrary code.
+
+Within a filter, z is the zettel and any other name is one of its
+attributes. Dates may be written as literals.
+
+    z.attrs["stage"] != 'closed'
+    stage == 'todo' and due_date < 2022-11-01
+    'urgent' in tags or z.title == 'Inbox'
+"""
+import ast
+import copy
+import re
+from datetime import datetime
+
+from libzet.NoCompare import NoCompare
+
+
+# A date or datetime literal outside of a string.
+_date_re = re.compile(r'''("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')|\b(\d{4}-\d{2}-\d{2}(?:T\d{2}:\d{2}(?::\d{2})?)?)\b''')
+
+_allowed = (
+    ast.Expression, ast.BoolOp, ast.And, ast.Or, ast.UnaryOp, ast.Not, ast.USub,
+    ast.Compare, ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.In, ast.NotIn, ast.Is, ast.IsNot,
+    ast.Name, ast.Load, ast.Constant, ast.Attribute, ast.Subscript, ast.Tuple, ast.List, ast.Set,
+)
+
+_nc = NoCompare()
+
+
+class Filter:
+    """ A compiled filter expression.
+
+    Call it with a zettel to evaluate it. attrs holds the names of the
+    attributes it reads, and whole is True if it reads anything of the
+    zettel other than its attributes and title.
+    """
+
+    def __init__(self, expr, tree, dates, fn, attrs=frozenset(), whole=True):
+        self.expr = expr
+        self.tree = tree
+        self.dates = dates
+        self.attrs = attrs
+        self.whole = whole
+        self._fn = fn
+
+    def __call__(self, z):
+        return self._fn(z, z.attrs)
+
+
+def _replace_dates(expr):
+    """ Swap date literals for placeholder names.
+
+    Returns:
+        The new expression and a dict of placeholder name to date.
+    """
+    dates = {}
+
+    def sub(m):
+        if m.group(1):
+            return m.group(1)
+
+        name = f'_d{len(dates)}'
+        try:
+            d = datetime.fromisoformat(m.group(2))
+        except ValueError as e:
+            raise ValueError(f'Invalid date {m.group(2)} in filter: {e}')
+
+        dates[name] = d.date() if 'T' not in m.group(2) else d
+        return name
+
+    return _date_re.sub(sub, expr), dates
+
+
+class _Resolver(ast.NodeTransformer):
+    """ Turn attribute names into lookups on the attrs argument.
+    """
+
+    def __init__(self, dates):
+        self.dates = dates
+        self.attrs = set()
+
+    def _get(self, key, node):
+        self.attrs.add(key)
+        call = ast.Call(
+            func=ast.Attribute(value=ast.Name(id='a', ctx=ast.Load()), attr='get', ctx=ast.Load()),
+            args=[ast.Constant(value=key), ast.Name(id='_nc', ctx=ast.Load())], keywords=[])
+        return ast.copy_location(call, node)
+
+    def visit_Name(self, node):
+        if node.id == 'z' or node.id in self.dates:
+            return node
+
+        return self._get(node.id, node)
+
+    def visit_Subscript(self, node):
+        # z.attrs['key'] is the same as a bare key.
+        v = node.value
+        if (isinstance(v, ast.Attribute) and v.attr == 'attrs' and isinstance(v.value, ast.Name)
+                and v.value.id == 'z' and isinstance(node.slice, ast.Constant)
+                and type(node.slice.value) is str):
+            return self._get(node.slice.value, node)
+
+        return self.generic_visit(node)
+
+
+def parse_filter(expr):
+    """ Parse and validate a filter expression.
+
+    Args:
+        expr: The filter.
+
+    Returns:
+        A tuple of the validated ast.Expression and a dict of placeholder
+        names to the date literals they replaced.
+
+    Raises:
+        ValueError if the filter is invalid or uses disallowed syntax.
+    """
+    source, dates = _replace_dates(expr)
+
+    try:
+        tree = ast.parse(source.strip(), mode='eval')
+    except SyntaxError as e:
+        raise ValueError(f'Invalid filter "{expr}": {e.msg}')
+
+    for node in ast.walk(tree):
+        if not isinstance(node, _allowed):
+            raise ValueError(f'"{type(node).__name__}" is not allowed in filters.')
+        if isinstance(node, ast.Attribute) and node.attr.startswith('_'):
+            raise ValueError(f'Private attribute "{node.attr}" is not allowed in filters.')
+        if isinstance(node, ast.Name) and node.id.startswith('_') and node.id not in dates:
+            raise ValueError(f'Private name "{node.id}" is not allowed in filters.')
+        if isinstance(node, ast.Subscript) and not isinstance(node.slice, ast.Constant):
+            raise ValueError('Only constant keys are allowed in filter subscripts.')
+
+    return tree, dates
+
+
+def compile_filter(expr):
+    """ Compile a filter expression into a Filter.
+
+    Args:
+        expr: The filter. See this module's docstring.
+
+    Returns:
+        A Filter. Calling it with a zettel returns whatever the expression
+        evaluated to for that zettel.
+
+    Raises:
+        ValueError if the filter is invalid or uses disallowed syntax.
+    """
+    tree, dates = parse_filter(expr)
+    resolver = _Resolver(dates)
+    body = resolver.visit(copy.deepcopy(tree)).body
+
+    # What's left of z, other than z.title, needs the whole zettel.
+    zs = sum(isinstance(n, ast.Name) and n.id == 'z' for n in ast.walk(body))
+    titles = sum(isinstance(n, ast.Attribute) and n.attr == 'title' and isinstance(n.value, ast.Name)
+                 and n.value.id == 'z' for n in ast.walk(body))
+
+    fn = ast.Expression(body=ast.Lambda(
+        args=ast.arguments(
+            posonlyargs=[], args=[ast.arg(arg='z'), ast.arg(arg='a')], kwonlyargs=[],
+            kw_defaults=[], defaults=[]),
+        body=body))
+    ast.fix_missing_locations(fn)
+
+    env = {'__builtins__': {}, '_nc': _nc}
+    env.update(dates)
+    return Filter(expr, tree, dates, eval(compile(fn, '<filter>', 'eval'), env), frozenset(resolver.attrs), zs > titles)
@@ -0,0 +1,185 @@
+""" Read iCalendar files incrementally.
+
+icalendar parses a whole file into memory before handing out any of its
+components, which doesn't do for calendars of tens of thousands of events.
+This reads one line at a time instead and yields each VEVENT as soon as it
+ends, so memory use doesn't grow with the size of the file.
+
+Only what master stores is understood; dates, datetimes, durations, text
+and rrules. See RFC 5545.
+"""
+import re
+from datetime import datetime, timedelta, timezone
+
+try:
+    from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+except ImportError:  # Python < 3.9. Datetimes keep the time of their zone.
+    ZoneInfo = None
+
+
+_duration_re = re.compile(
+    r'([+-])?P(?:(\d+)W)?(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?')
+
+_unescaped = {'n': '\n', 'N': '\n', ',': ',', ';': ';', '\\': '\\'}
+
+
+def unfold(lines):
+    """ Join folded lines. See RFC 5545 3.1.
+
+    Args:
+        lines: Iterable of lines, like a file.
+
+    Yields:
+        Content lines without their line endings. Empty lines are skipped.
+    """
+    pending = None
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if line[:1] in (' ', '\t'):
+            if pending is not None:
+                pending += line[1:]
+            continue
+
+        if pending:
+            yield pending
+        pending = line
+
+    if pending:
+        yield pending
+
+
+def parse_line(line):
+    """ Split a content line into its name, parameters and value.
+
+    Returns:
+        (name, params, value) tuple. name and the keys of the params dict
+        are upper case.
+
+    Raises:
+        ValueError if the line has no value.
+    """
+    # Parameter values may be quoted and contain : or ;.
+    parts = []
+    start = 0
+    quoted = False
+    for i, c in enumerate(line):
+        if c == '"':
+            quoted = not quoted
+        elif not quoted and c in ';:':
+            parts.append(line[start:i])
+            start = i + 1
+            if c == ':':
+                break
+    else:
+        raise ValueError(f'Invalid content line "{line}".')
+
+    params = {}
+    for p in parts[1:]:
+        k, _, v = p.partition('=')
+        params[k.upper()] = v.strip('"')
+
+    return parts[0].upper(), params, line[start:]
+
+
+def iter_events(lines):
+    """ Read the VEVENTs of a calendar one at a time.
+
+    Components nested within events, like VALARMs, are skipped.
+
+    Args:
+        lines: Iterable of lines, like a file.
+
+    Yields:
+        A dict per VEVENT of property name to (params, value) tuples. Only
+        the first of repeated properties is kept.
+
+    Raises:
+        ValueError if a line couldn't be parsed.
+    """
+    event = None
+    depth = 0
+    for line in unfold(lines):
+        name, params, value = parse_line(line)
+        if name == 'BEGIN':
+            if event is not None:
+                depth += 1
+            elif value.upper() == 'VEVENT':
+                event = {}
+        elif name == 'END' and event is not None:
+            if depth:
+                depth -= 1
+            else:
+                yield event
+                event = None
+        elif event is not None and not depth:
+            event.setdefault(name, (params, value))
+
+
+def unescape(value):
+    """ Turn an escaped TEXT value into a str.
+    """
+    return re.sub(r'\\(.)', lambda m: _unescaped.get(m.group(1), m.group(1)), value)
+
+
+def _local(d, tzid):
+    """ Turn a datetime of a time zone into the local time zone.
+    """
+    if ZoneInfo is None:
+        return d
+
+    try:
+        zone = ZoneInfo(tzid)
+    except (ZoneInfoNotFoundError, ValueError):
+        return d
+
+    return d.replace(tzinfo=zone).astimezone().replace(tzinfo=None)
+
+
+def parse_value_date(value, params=None):
+    """ Parse a DATE or DATE-TIME value.
+
+    Datetimes in UTC or a known time zone are converted to naive local
+    times, since that's what zettels keep.
+
+    Args:
+        value: Like 20221101 or 20221101T090000Z.
+        params: Parameters of the property, for VALUE and TZID.
+
+    Returns:
+        A date or datetime.
+
+    Raises:
+        ValueError if value isn't a date.
+    """
+    params = params or {}
+    value = value.strip()
+    if params.get('VALUE') == 'DATE' or len(value) == 8:
+        return datetime.strptime(value, '%Y%m%d').date()
+
+    if value.endswith('Z'):
+        d = datetime.strptime(value[:-1], '%Y%m%dT%H%M%S').replace(tzinfo=timezone.utc)
+        return d.astimezone().replace(tzinfo=None)
+
+    d = datetime.strptime(value, '%Y%m%dT%H%M%S')
+    if 'TZID' in params:
+        d = _local(d, params['TZID'])
+
+    return d
+
+
+def parse_value_duration(value):
+    """ Parse a DURATION value, like PT1H30M.
+
+    Raises:
+        ValueError if value isn't a duration.
+    """
+    m = _duration_re.fullmatch(value.strip())
+    if not m or not any(m.groups()[1:]):
+        raise ValueError(f'Invalid duration "{value}".')
+
+    sign, weeks, days, hours, minutes, seconds = m.groups()
+    d = timedelta(
+        weeks=int(weeks or 0), days=int(days or 0), hours=int(hours or 0),
+        minutes=int(minutes or 0), seconds=int(seconds or 0))
+
+    return -d if sign == '-' else d
@@ -0,0 +1,119 @@
+""" Allocate IDs for new tasks.
+
+Each directory tasks are created in keeps a high-water counter per task
+prefix in .master/ids/. The counter is read and bumped while holding a
+lock on it, and the task's file is reserved with an exclusive create, so
+concurrent allocations never hand out the same ID. A missing counter is
+rebuilt from a single scan of the directory, and of its shards if tasks
+are sharded into subdirectories.
+"""
+import os
+import re
+
+try:
+    import fcntl
+except ImportError:  # Not POSIX. Exclusive creates still prevent clashes.
+    fcntl = None
+
+from master.util.index import INDEX_DIR
+
+
+def _counter_path(path, prefix):
+    return os.path.join(path, INDEX_DIR, 'ids', prefix)
+
+
+def scan_high_water(path, prefix, zettel_format='md', depth=0):
+    """ Find the highest ID in use in a directory.
+
+    Args:
+        path: Directory holding tasks.
+        prefix: Task prefix.
+        zettel_format: md or rst.
+        depth: Levels of subdirectories to scan as well. Hidden ones are
+            skipped.
+
+    Returns:
+        The highest numeric ID of any {prefix}-{id}.{zettel_format} file
+        in path. 0 if there are none.
+    """
+    pattern = re.compile(rf'{re.escape(prefix)}-(\d+)\.{re.escape(zettel_format)}')
+    high = 0
+    with os.scandir(path) as it:
+        for e in it:
+            m = pattern.fullmatch(e.name)
+            if m:
+                high = max(high, int(m.group(1)))
+            elif depth and not e.name.startswith('.') and e.is_dir():
+                high = max(high, scan_high_water(e.path, prefix, zettel_format, depth - 1))
+
+    return high
+
+
+def allocate_ids(path, prefix, zettel_format='md', count=1, dest=None, depth=0):
+    """ Allocate new task IDs and reserve their files.
+
+    Each reserved file is created empty. Remove or overwrite it to create
+    the task.
+
+    Args:
+        path: Directory the tasks are added to. It holds the counter.
+        prefix: Task prefix.
+        zettel_format: md or rst.
+        count: Number of IDs to allocate.
+        dest: Directory to reserve files in, like a shard of path.
+            Defaults to path.
+        depth: Shard depth of path. With 0 a missing counter is rebuilt
+            by scanning dest alone, else by scanning every shard of path.
+
+    Returns:
+        List of (id, path) tuples of the reserved files, in ID order.
+
+    Raises:
+        OSError if the counter couldn't be updated or a file couldn't be
+        reserved.
+    """
+    counter = _counter_path(path, prefix)
+    os.makedirs(os.path.dirname(counter), exist_ok=True)
+
+    fd = os.open(counter, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        if fcntl:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+
+        dest = dest or path
+        text = os.read(fd, 64).decode().strip()
+        if text.isdigit():
+            high = int(text)
+        elif depth:
+            high = scan_high_water(path, prefix, zettel_format, depth)
+        else:
+            high = scan_high_water(dest, prefix, zettel_format)
+
+        reserved = []
+        while len(reserved) < count:
+            high += 1
+            fname = f'{dest}/{prefix}-{high}.{zettel_format}'
+            try:
+                os.close(os.open(fname, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644))
+            except FileExistsError:
+                continue
+
+            reserved.append((high, fname))
+
+        os.lseek(fd, 0, os.SEEK_SET)
+        os.ftruncate(fd, 0)
+        os.write(fd, f'{high}\n'.encode())
+
+    finally:
+        os.close(fd)
+
+    return reserved
+
+
+def allocate_id(path, prefix, zettel_format='md', dest=None, depth=0):
+    """ Allocate a single task ID. See allocate_ids.
+
+    Returns:
+        (id, path) tuple of the reserved file.
+    """
+    return allocate_ids(path, prefix, zettel_format, 1, dest, depth)[0]
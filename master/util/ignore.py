@@ -0,0 +1,164 @@
+""" Skip the parts of a tree that don't hold zettels.
+
+Directories may hold a .masterignore file of gitignore-style patterns,
+which applies to everything below them. Directories that are ignored are
+never descended into. Version control and master's own directories are
+always ignored.
+
+Supported patterns are those of gitignore: blank lines and lines starting
+with # are skipped, ! negates a pattern, a trailing / only matches
+directories, patterns with a / elsewhere are relative to the directory of
+the .masterignore and others match at any depth, and *, ?, [...] and **
+are wildcards.
+"""
+import os
+import re
+
+from master.util.index import INDEX_DIR, find_index_root
+
+
+IGNORE_FILE = '.masterignore'
+
+# Ignored everywhere.
+DEFAULT_PATTERNS = ['.git/', '.hg/', '.svn/', f'{INDEX_DIR}/']
+
+
+def _translate(pattern):
+    """ Translate a glob of a gitignore pattern to a regex.
+    """
+    out = []
+    i, n = 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        if pattern.startswith('**/', i):
+            out.append('(?:.*/)?')
+            i += 3
+            continue
+        elif pattern.startswith('**', i):
+            out.append('.*')
+            i += 2
+            continue
+        elif c == '*':
+            out.append('[^/]*')
+        elif c == '?':
+            out.append('[^/]')
+        elif c == '\\' and i + 1 < n:
+            out.append(re.escape(pattern[i + 1]))
+            i += 2
+            continue
+        elif c == '[':
+            j = pattern.find(']', i + 2)
+            if j < 0:
+                out.append(re.escape(c))
+            else:
+                body = pattern[i + 1:j].replace('\\', '\\\\')
+                if body.startswith('!'):
+                    body = f'^{body[1:]}'
+                out.append(f'[{body}]')
+                i = j + 1
+                continue
+        else:
+            out.append(re.escape(c))
+        i += 1
+
+    return ''.join(out)
+
+
+def parse_ignore(lines, base=''):
+    """ Parse the patterns of a .masterignore.
+
+    Args:
+        lines: Lines of the file.
+        base: Path of its directory relative to where matching starts,
+            like "notes/", or "" for that directory.
+
+    Returns:
+        A list of (base, regex, negate, dir_only) rules.
+    """
+    rules = []
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if not line.strip() or line.startswith('#'):
+            continue
+
+        line = line.rstrip()
+        negate = line.startswith('!')
+        if negate:
+            line = line[1:]
+
+        dir_only = line.endswith('/')
+        line = line.rstrip('/')
+        anchored = '/' in line
+        regex = _translate(line.lstrip('/'))
+        if not anchored:
+            regex = f'(?:.*/)?{regex}'
+
+        rules.append((base, re.compile(regex), negate, dir_only))
+
+    return rules
+
+
+def _read(d, base):
+    try:
+        with open(os.path.join(d, IGNORE_FILE), encoding='utf-8') as f:
+            return tuple(parse_ignore(f, base))
+    except (FileNotFoundError, NotADirectoryError):
+        return ()
+
+
+class Ignore:
+    """ The rules that apply to the entries of a directory.
+
+    Args:
+        rules: Tuple of rules from parse_ignore.
+        where: Path of the directory relative to where matching starts.
+    """
+
+    def __init__(self, rules=(), where=''):
+        self.rules = rules
+        self.where = where
+
+    def child(self, name, path=None):
+        """ Rules of a subdirectory.
+
+        Args:
+            name: Name of the subdirectory.
+            path: Path of the subdirectory, to read its .masterignore.
+        """
+        where = f'{self.where}{name}/'
+        return Ignore(self.rules + _read(path, where) if path else self.rules, where)
+
+    def ignored(self, name, is_dir=False):
+        """ Whether an entry of the directory is ignored.
+        """
+        rel = f'{self.where}{name}'
+        ignored = False
+        for base, regex, negate, dir_only in self.rules:
+            if dir_only and not is_dir:
+                continue
+            if rel.startswith(base) and regex.fullmatch(rel[len(base):]):
+                ignored = not negate
+
+        return ignored
+
+
+def ignore_for(path):
+    """ Rules of a directory, including those of its ancestors up to its project.
+
+    Returns:
+        An Ignore. Call its child method for the subdirectories of path.
+    """
+    ignore = Ignore(tuple(parse_ignore(DEFAULT_PATTERNS)))
+
+    root = find_index_root(path)
+    path = os.path.abspath(path)
+    if not root or root == path:
+        return Ignore(ignore.rules + _read(path, ''))
+
+    ignore = Ignore(ignore.rules + _read(root, ''))
+    d = root
+    for name in os.path.relpath(path, root).split(os.path.sep):
+        d = os.path.join(d, name)
+        ignore = ignore.child(name, d)
+
+    return ignore
@@ -0,0 +1,446 @@
+""" Persistent index of parsed zettels.
+
+Parsing every zettel of a vault on every invocation dominates the runtime
+of master on large vaults. The index caches the title, headings and raw
+attributes of each zettel in an SQLite database that lives in the .master
+directory of a project. Entries are keyed by path and validated against
+the file's mtime and size, so only zettels that changed since the last run
+have to be parsed again.
+
+The values of a few commonly queried attributes are also indexed, so
+list filters can find candidate zettels without decoding every one of
+them. So are the spans of days the events of zettels may be active on.
+See master.util.query.
+"""
+import datetime
+import json
+import os
+import re
+import sqlite3
+import time
+
+
+INDEX_DIR = '.master'
+INDEX_NAME = 'index.sqlite'
+
+# Bump whenever the schema or the encoding of cached records changes. Older
+# indexes are dropped and rebuilt.
+SCHEMA_VERSION = 3
+
+# Files modified this recently are not cached. Their mtime may not change
+# again on filesystems with coarse timestamps even if their content does.
+_RACY_NS = 2 * 10**9
+
+# Attributes whose values are indexed.
+INDEXED_ATTRS = ('stage', 'type', 'sprint', 'assignee', 'due_date', 'event_begin')
+
+# Attributes libzet parses into SuperDates, besides those containing "date".
+_DATE_ATTRS = ('event_begin', 'event_end', 'recurring_stop')
+
+# An absolute date as written by hand or by libzet, like "2022-11-01, Tue, 10:00".
+_abs_date_re = re.compile(
+    r'(\d{4}-\d{2}-\d{2})(?:,\s*[A-Za-z]{3})?(?:(?:,\s*|\s+|T)\d{1,2}:\d{2}(?::\d{2})?)?')
+
+# Stands in for values that can't be indexed because they may change over
+# time, like a due_date of "tomorrow". They match every query.
+VOLATILE = None
+
+# Ends of unbounded spans. They sort before and after any ISO date.
+SPAN_MIN = ''
+SPAN_MAX = '~'
+
+
+def find_index_root(path):
+    """ Find the directory that hosts the index for a path.
+
+    This is the nearest directory, starting at the path itself, that
+    contains either a ztemplate.yaml or a .master directory. Create an
+    empty .master directory to enable the index for a tree of zettels
+    that isn't a project.
+
+    Args:
+        path: File or directory to find the index root of.
+
+    Returns:
+        Absolute path of the root directory. None if no ancestor of path
+        is a project.
+    """
+    d = os.path.abspath(path)
+    if not os.path.isdir(d):
+        d = os.path.dirname(d)
+
+    while True:
+        if (os.path.exists(os.path.join(d, 'ztemplate.yaml'))
+                or os.path.isdir(os.path.join(d, INDEX_DIR))):
+            return d
+
+        parent = os.path.dirname(d)
+        if parent == d:
+            return None
+        d = parent
+
+
+def is_date_attr(name):
+    """ Whether libzet parses an attribute into a SuperDate.
+    """
+    return 'date' in name or name in _DATE_ATTRS
+
+
+def index_value(name, value):
+    """ Convert a raw attribute value to the form it's indexed in.
+
+    Dates are stored as ISO strings. The values of date attributes are cut
+    down to the date, since SuperDates compare that way against dates.
+
+    Args:
+        name: Attribute name.
+        value: Raw value of the attribute, as loaded from yaml.
+
+    Returns:
+        The value to index, VOLATILE if its value depends on when it's
+        read, or NotImplemented if it can't be indexed at all.
+    """
+    if is_date_attr(name) and value:
+        if isinstance(value, datetime.datetime):
+            return value.date().isoformat()
+        if isinstance(value, datetime.date):
+            return value.isoformat()
+        if isinstance(value, str):
+            m = _abs_date_re.fullmatch(value.strip())
+            if m:
+                try:
+                    return datetime.date.fromisoformat(m.group(1)).isoformat()
+                except ValueError:
+                    pass
+
+        return VOLATILE
+
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    if isinstance(value, (str, int, float)):
+        return value
+
+    return NotImplemented
+
+
+def active_span(attrs):
+    """ Find the days the events of a zettel may be active on.
+
+    The span is generous. It covers every day an occurrence of the
+    zettel's event may be active on, and every day one of its dates falls
+    on, but it may cover more.
+
+    Args:
+        attrs: Raw attributes of the zettel, as loaded from yaml.
+
+    Returns:
+        A (lo, hi) tuple of ISO dates, both inclusive. Either may be
+        SPAN_MIN or SPAN_MAX if the span is unbounded. None if the zettel
+        has no scheduling attributes.
+    """
+    if type(attrs) is not dict:
+        return None
+
+    recurring = attrs.get('recurring') is not None
+    dates = {}
+    for name in ['event_begin', 'due_date', 'event_end', 'recurring_stop']:
+        if attrs.get(name):
+            dates[name] = index_value(name, attrs[name])
+
+    if not dates and not recurring:
+        return None
+    if VOLATILE in dates.values():
+        return SPAN_MIN, SPAN_MAX
+
+    starts = [dates[n] for n in ['event_begin', 'due_date'] if n in dates]
+    lo = min(starts) if starts else SPAN_MIN
+
+    # Durations, and the ends of recurring events, may stretch occurrences
+    # arbitrarily far.
+    if attrs.get('duration') or recurring and (not attrs.get('recurring_stop') or 'event_end' in dates):
+        return lo, SPAN_MAX
+
+    return lo, max(dates.values())
+
+
+def _encode(o):
+    if isinstance(o, datetime.datetime):
+        return {'__datetime__': o.isoformat()}
+    if isinstance(o, datetime.date):
+        return {'__date__': o.isoformat()}
+
+    raise TypeError(f'{type(o).__name__} is not serializable.')
+
+
+def _decode(d):
+    if len(d) == 1:
+        if '__datetime__' in d:
+            return datetime.datetime.fromisoformat(d['__datetime__'])
+        if '__date__' in d:
+            return datetime.date.fromisoformat(d['__date__'])
+
+    return d
+
+
+def dumps(o):
+    """ Serialize raw zettel attributes to json.
+
+    Returns:
+        A json str, or None if the value can't be faithfully serialized.
+        Yaml allows things json doesn't, like non-str keys.
+    """
+    try:
+        s = json.dumps(o, default=_encode, sort_keys=True)
+    except (TypeError, ValueError):
+        return None
+
+    return s if loads(s) == o else None
+
+
+def loads(s):
+    """ Reverse of dumps.
+    """
+    return json.loads(s, object_hook=_decode)
+
+
+class ZettelIndex:
+    """ SQLite cache of parsed zettels under a single root directory.
+
+    Keys are paths relative to the root. Each entry holds a record; the
+    title, headings and raw attributes of a zettel as returned by
+    master.util.load.parse_zettel.
+    """
+
+    def __init__(self, root):
+        """ Open or create the index of a root directory.
+
+        Args:
+            root: Directory hosting the index.
+
+        Raises:
+            OSError if the .master directory couldn't be created.
+            sqlite3.Error if the database couldn't be opened.
+        """
+        self.root = root
+        self.path = os.path.join(root, INDEX_DIR, INDEX_NAME)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+        self._db = sqlite3.connect(self.path, timeout=10)
+        self._pending = []
+        self._init_schema()
+
+    @classmethod
+    def open(cls, root):
+        """ Open the index of a root. Errors are swallowed.
+
+        Returns:
+            A ZettelIndex or None if it couldn't be opened; for example
+            because the root is on a read-only filesystem.
+        """
+        try:
+            return cls(root)
+        except (OSError, sqlite3.Error):
+            return None
+
+    def _init_schema(self):
+        version = self._db.execute('PRAGMA user_version').fetchone()[0]
+        if version == SCHEMA_VERSION:
+            return
+
+        with self._db:
+            self._db.execute('DROP TABLE IF EXISTS zettels')
+            self._db.execute('DROP TABLE IF EXISTS attr_values')
+            self._db.execute('DROP TABLE IF EXISTS spans')
+            self._db.execute(
+                'CREATE TABLE zettels ('
+                ' key TEXT PRIMARY KEY,'
+                ' mtime_ns INTEGER NOT NULL,'
+                ' size INTEGER NOT NULL,'
+                ' format TEXT NOT NULL,'
+                ' title TEXT NOT NULL,'
+                ' headings TEXT,'
+                ' attrs TEXT NOT NULL)')
+
+            # value is untyped so SQLite keeps numbers and text apart. NULL
+            # marks volatile values.
+            self._db.execute(
+                'CREATE TABLE attr_values ('
+                ' key TEXT NOT NULL,'
+                ' name TEXT NOT NULL,'
+                ' value)')
+            self._db.execute('CREATE INDEX attr_values_lookup ON attr_values (name, value)')
+            self._db.execute('CREATE INDEX attr_values_key ON attr_values (key)')
+
+            self._db.execute(
+                'CREATE TABLE spans ('
+                ' key TEXT PRIMARY KEY,'
+                ' lo TEXT NOT NULL,'
+                ' hi TEXT NOT NULL)')
+            self._db.execute('CREATE INDEX spans_hi ON spans (hi)')
+            self._db.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+    def lookup(self, keys, headings=True):
+        """ Fetch the cached entries of several keys.
+
+        Args:
+            keys: List of keys relative to the root.
+            headings: False to skip reading the headings. They'll be None.
+
+        Returns:
+            A dict of key to a (mtime_ns, size, format, title, headings,
+            attrs) tuple. headings and attrs are still serialized. headings
+            is None if they weren't cached. Keys that aren't cached are
+            absent.
+        """
+        found = {}
+        batch = 500
+        column = 'headings' if headings else 'NULL'
+        for i in range(0, len(keys), batch):
+            chunk = keys[i:i + batch]
+            marks = ','.join('?' * len(chunk))
+            cur = self._db.execute(
+                f'SELECT key, mtime_ns, size, format, title, {column}, attrs'
+                f' FROM zettels WHERE key IN ({marks})', chunk)
+            for row in cur:
+                found[row[0]] = row[1:]
+
+        return found
+
+    def match(self, name, op, value):
+        """ Find the keys whose indexed value of an attribute matches.
+
+        Keys whose value is volatile always match.
+
+        Args:
+            name: One of INDEXED_ATTRS.
+            op: One of ==, <, <=, > and >=.
+            value: Value to compare with, as returned by index_value.
+
+        Returns:
+            A set of keys. Entries may be stale; check them before use.
+        """
+        sql = {'==': '=', '<': '<', '<=': '<=', '>': '>', '>=': '>='}[op]
+        where = f'value {sql} ?'
+        params = [name, value]
+
+        # SQLite orders numbers before text. Keep ranges within the type of
+        # the value; python can't compare across them either.
+        if op != '==':
+            if isinstance(value, str):
+                where += " AND value >= ''"
+            else:
+                where += " AND value < ''"
+
+        cur = self._db.execute(
+            f'SELECT key FROM attr_values WHERE name = ? AND {where}'
+            ' UNION SELECT key FROM attr_values WHERE name = ? AND value IS NULL', params + [name])
+        return {k for k, in cur}
+
+    def active(self, start, end=None):
+        """ Find the keys of zettels that may be active within a window.
+
+        Args:
+            start: First date of the window.
+            end: Date after the last of the window. None if unbounded.
+
+        Returns:
+            A set of keys whose active_span overlaps the window. Entries
+            may be stale; check them before use.
+        """
+        if end is None:
+            cur = self._db.execute('SELECT key FROM spans WHERE hi >= ?', (start.isoformat(),))
+        else:
+            cur = self._db.execute(
+                'SELECT key FROM spans WHERE hi >= ? AND lo < ?', (start.isoformat(), end.isoformat()))
+
+        return {k for k, in cur}
+
+    def store(self, key, st, zettel_format, record):
+        """ Queue a parsed record to be written on the next commit.
+
+        Records that can't be serialized, or whose files were modified
+        too recently to be trusted, are silently skipped.
+
+        Args:
+            key: Key relative to the root.
+            st: os.stat_result of the file the record was parsed from.
+            zettel_format: md or rst.
+            record: (title, headings, attrs) tuple.
+        """
+        if time.time_ns() - st.st_mtime_ns < _RACY_NS:
+            return
+
+        title, headings, attrs = record
+        raw = dumps(attrs)
+        if raw is None:
+            return
+
+        if headings is not None:
+            headings = json.dumps(headings)
+
+        span = active_span(attrs)
+        values = []
+        if type(attrs) is dict:
+            for name in INDEXED_ATTRS:
+                if name in attrs:
+                    value = index_value(name, attrs[name])
+                    if value is not NotImplemented:
+                        values.append((key, name, value))
+
+        self._pending.append(((key, st.st_mtime_ns, st.st_size, zettel_format, title, headings, raw), values, span))
+
+    def prune(self, prefix, seen):
+        """ Forget entries under a directory that no longer exist.
+
+        Args:
+            prefix: Key of a directory that was fully walked. '' for the
+                root itself.
+            seen: Set of keys found during the walk.
+        """
+        if prefix:
+            cur = self._db.execute(
+                'SELECT key FROM zettels WHERE key >= ? AND key < ?', (f'{prefix}/', f'{prefix}0'))
+        else:
+            cur = self._db.execute('SELECT key FROM zettels')
+
+        gone = [(k,) for k, in cur if k not in seen]
+        if not gone:
+            return
+
+        try:
+            with self._db:
+                self._db.executemany('DELETE FROM zettels WHERE key = ?', gone)
+                self._db.executemany('DELETE FROM attr_values WHERE key = ?', gone)
+                self._db.executemany('DELETE FROM spans WHERE key = ?', gone)
+        except sqlite3.Error:
+            pass
+
+    def commit(self):
+        """ Write queued records to disk.
+
+        Failures to write are ignored; the index is only a cache.
+        """
+        pending, self._pending = self._pending, []
+        if not pending:
+            return
+
+        try:
+            with self._db:
+                self._db.executemany('DELETE FROM attr_values WHERE key = ?', [(p[0][0],) for p in pending])
+                self._db.executemany('DELETE FROM spans WHERE key = ?', [(p[0][0],) for p in pending])
+                self._db.executemany(
+                    'INSERT OR REPLACE INTO zettels'
+                    ' (key, mtime_ns, size, format, title, headings, attrs)'
+                    ' VALUES (?, ?, ?, ?, ?, ?, ?)', [p[0] for p in pending])
+                self._db.executemany(
+                    'INSERT INTO attr_values (key, name, value) VALUES (?, ?, ?)',
+                    [v for p in pending for v in p[1]])
+                self._db.executemany(
+                    'INSERT INTO spans (key, lo, hi) VALUES (?, ?, ?)',
+                    [(p[0][0],) + p[2] for p in pending if p[2]])
+        except sqlite3.Error:
+            pass
+
+    def close(self):
+        self.commit()
+        self._db.close()
@@ -0,0 +1,148 @@
+""" Where new tasks are placed and what they're named.
+
+A project's ztemplate.yaml controls this with two keys.
+
+task_prefix prefixes the IDs of new tasks. The special value "__date"
+uses the date the task was created instead, like 2022-07-28-1.
+
+task_shard is an optional strftime pattern of subdirectories to create
+tasks in, like "%Y/%m". It keeps directories small as projects grow.
+"""
+import os
+import re
+from datetime import date
+
+import yaml
+
+
+DATE_PREFIX = '__date'
+DATE_FORMAT = '%Y-%m-%d'
+
+# What strftime directives of task_shard expand to. Others match anything.
+_DIRECTIVES = {
+    'Y': r'\d{4}', 'G': r'\d{4}', 'y': r'\d\d', 'm': r'\d\d', 'd': r'\d\d', 'j': r'\d{3}',
+    'U': r'\d\d', 'W': r'\d\d', 'V': r'\d\d', 'u': r'\d', 'w': r'\d',
+    'a': r'\w+', 'A': r'\w+', 'b': r'\w+', 'B': r'\w+', 'h': r'\w+', '%': '%',
+}
+
+
+def task_prefix(settings, when=None):
+    """ Prefix of a new task's ID.
+
+    Args:
+        settings: Project settings.
+        when: Date the task is created. Defaults to today.
+
+    Returns:
+        The prefix. None if the project doesn't prefix IDs.
+    """
+    if 'task_prefix' not in settings:
+        return None
+
+    prefix = settings['task_prefix']
+    if prefix == DATE_PREFIX:
+        prefix = (when or date.today()).strftime(DATE_FORMAT)
+
+    return prefix
+
+
+def task_id_re(settings):
+    """ Pattern of the IDs of a project's tasks, which name their files.
+
+    Args:
+        settings: Project settings.
+
+    Returns:
+        A compiled regex, or None if the project doesn't prefix IDs.
+    """
+    if 'task_prefix' not in settings:
+        return None
+
+    prefix = settings['task_prefix']
+    head = r'\d{4}-\d\d-\d\d' if prefix == DATE_PREFIX else re.escape(str(prefix))
+    return re.compile(rf'{head}-\d+')
+
+
+def shard_depth(settings):
+    """ Number of directory levels new tasks are sharded into.
+    """
+    pattern = settings['task_shard'] if 'task_shard' in settings else None
+    if not pattern:
+        return 0
+
+    return len(pattern.strip('/').split('/'))
+
+
+def shard_dir(path, settings, when=None):
+    """ Directory a new task should be created in.
+
+    Args:
+        path: Directory the task is added to.
+        settings: Project settings.
+        when: Date the task is created. Defaults to today.
+
+    Returns:
+        path itself, or the shard under it if the project is sharded.
+    """
+    pattern = settings['task_shard'] if 'task_shard' in settings else None
+    if not pattern:
+        return path
+
+    return os.path.join(path, (when or date.today()).strftime(pattern.strip('/')))
+
+
+def _name_re(part):
+    out = []
+    for m in re.finditer(r'%(.)|%|[^%]+', part):
+        if m.group(1) is not None:
+            out.append(_DIRECTIVES.get(m.group(1), '.+'))
+        else:
+            out.append(re.escape(m.group(0)))
+    return re.compile(''.join(out))
+
+
+def shard_patterns(settings):
+    """ Patterns of the names of shard directories, one per level.
+
+    Args:
+        settings: Project settings.
+
+    Returns:
+        A list of compiled regexes. Empty if the project isn't sharded.
+    """
+    pattern = settings['task_shard'] if 'task_shard' in settings else None
+    if not pattern:
+        return []
+
+    return [_name_re(part) for part in pattern.strip('/').split('/')]
+
+
+def project_shards(path):
+    """ Shard patterns of the project at a directory. Empty if it isn't one.
+
+    Args:
+        path: Directory that may contain a ztemplate.yaml.
+    """
+    try:
+        with open(os.path.join(path, 'ztemplate.yaml')) as f:
+            settings = yaml.safe_load(f)
+    except (OSError, yaml.YAMLError):
+        return []
+
+    return shard_patterns(settings) if type(settings) is dict else []
+
+
+def is_shard(parent, name, shards):
+    """ Whether a subdirectory holds a project's shards.
+
+    Args:
+        parent: Directory the subdirectory is in.
+        name: Name of the subdirectory.
+        shards: Shard patterns left at parent's level. See shard_patterns.
+
+    Returns:
+        True if its name matches the first pattern and it isn't a project
+        of its own.
+    """
+    return (bool(shards) and shards[0].fullmatch(name) is not None
+            and not os.path.exists(os.path.join(parent, name, 'ztemplate.yaml')))
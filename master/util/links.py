@@ -0,0 +1,351 @@
+""" Index of the links between zettels.
+
+Zettels link to each other and to attachments with markdown links, like
+[text](../notes/other.md) or ![image](img/plot.png), and with rst links,
+like `text <other.rst>`_. The link index keeps where in its file each link
+is, in bytes, and which path it points to. It lives in a links.sqlite next
+to the zettel index, so moving files only has to rewrite the zettels that
+link to them or that they link from, without reading any other.
+
+The index is refreshed before it's used. Zettels are stat'ed and only the
+ones whose mtime or size changed since they were last scanned are read.
+"""
+import os
+import re
+import shutil
+import sqlite3
+import time
+from urllib.parse import quote, unquote
+
+from master.util.index import INDEX_DIR, find_index_root
+from master.util.load import _walk
+
+
+LINKS_NAME = 'links.sqlite'
+
+# Bump whenever the schema or what's indexed changes. Older indexes are
+# dropped and rebuilt.
+SCHEMA_VERSION = 1
+
+# Files modified this recently are scanned again next time. See index.py.
+_RACY_NS = 2 * 10**9
+
+# Suffix of rewritten zettels until they replace the originals.
+REWRITE_SUFFIX = '.master-links'
+
+_link_res = {
+    'md': re.compile(rb'\[[^\]\n]*\]\(\s*(?:<([^>\n]+)>|([^)\s]+))'),
+    'rst': re.compile(rb'`[^`<\n]*<([^>\n]+)>`__?'),
+}
+
+
+def find_links(data, zettel_format='md'):
+    """ Find the links to files in the text of a zettel.
+
+    Links to URLs and to anchors of the zettel itself are left out.
+
+    Args:
+        data: bytes of the zettel file.
+        zettel_format: md or rst.
+
+    Returns:
+        List of (start, end, path) tuples; the byte span of the path a link
+        points to, without its #anchor, and the path as written.
+    """
+    links = []
+    for m in _link_res[zettel_format].finditer(data):
+        group = 1 if m.group(1) is not None else 2
+        target = m.group(group)
+        path = target.split(b'#', 1)[0].split(b'?', 1)[0]
+        if not path or b'://' in path or path.startswith(b'mailto:'):
+            continue
+
+        start = m.start(group)
+        links.append((start, start + len(path), path.decode(errors='replace')))
+
+    return links
+
+
+def _resolve(root, source, raw):
+    """ Key of the path a link of source points to, or None if it's outside the root.
+    """
+    path = unquote(raw)
+    if not os.path.isabs(path):
+        path = os.path.join(root, os.path.dirname(source), path)
+
+    path = os.path.normpath(path)
+    if os.path.commonpath([path, root]) != root:
+        return None
+    return os.path.relpath(path, root)
+
+
+class LinkIndex:
+    """ SQLite index of the links of the zettels under a root directory.
+
+    Keys are paths relative to the root, like in ZettelIndex.
+    """
+
+    def __init__(self, root):
+        """ Open or create the link index of a root directory.
+
+        Raises:
+            OSError if the .master directory couldn't be created.
+            sqlite3.Error if the database couldn't be opened.
+        """
+        self.root = os.path.abspath(root)
+        self.path = os.path.join(self.root, INDEX_DIR, LINKS_NAME)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+        self._db = sqlite3.connect(self.path, timeout=10)
+        self._init_schema()
+
+    @classmethod
+    def open(cls, root):
+        """ Open the link index of a root. Errors are swallowed.
+
+        Returns:
+            A LinkIndex or None if it couldn't be opened.
+        """
+        try:
+            return cls(root)
+        except (OSError, sqlite3.Error):
+            return None
+
+    def _init_schema(self):
+        version = self._db.execute('PRAGMA user_version').fetchone()[0]
+        if version == SCHEMA_VERSION:
+            return
+
+        with self._db:
+            self._db.execute('DROP TABLE IF EXISTS files')
+            self._db.execute('DROP TABLE IF EXISTS links')
+            self._db.execute(
+                'CREATE TABLE files ('
+                ' key TEXT PRIMARY KEY,'
+                ' mtime_ns INTEGER NOT NULL,'
+                ' size INTEGER NOT NULL)')
+            self._db.execute(
+                'CREATE TABLE links ('
+                ' source TEXT NOT NULL,'
+                ' start INTEGER NOT NULL,'
+                ' end INTEGER NOT NULL,'
+                ' raw TEXT NOT NULL,'
+                ' target TEXT NOT NULL)')
+            self._db.execute('CREATE INDEX links_target ON links (target)')
+            self._db.execute('CREATE INDEX links_source ON links (source)')
+            self._db.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+    def refresh(self):
+        """ Scan the zettels that changed since the last refresh.
+
+        Returns:
+            The number of zettels that were scanned.
+        """
+        known = {k: (m, s) for k, m, s in self._db.execute('SELECT key, mtime_ns, size FROM files')}
+
+        seen = set()
+        changed = []
+        for zettel_format in ('md', 'rst'):
+            for loadpath, key, st in _walk(self.root, zettel_format, True):
+                seen.add(key)
+                if known.get(key) != (st.st_mtime_ns, st.st_size):
+                    changed.append((loadpath, key, st, zettel_format))
+
+        gone = [(k,) for k in known if k not in seen]
+        files = []
+        links = []
+        now = time.time_ns()
+        for loadpath, key, st, zettel_format in changed:
+            try:
+                with open(loadpath, 'rb') as f:
+                    data = f.read()
+            except OSError:
+                continue
+
+            # Recently modified files may change again within their mtime.
+            files.append((key, 0 if now - st.st_mtime_ns < _RACY_NS else st.st_mtime_ns, st.st_size))
+            for start, end, raw in find_links(data, zettel_format):
+                target = _resolve(self.root, key, raw)
+                if target is not None:
+                    links.append((key, start, end, raw, target))
+
+        with self._db:
+            stale = gone + [(f[0],) for f in files]
+            self._db.executemany('DELETE FROM files WHERE key = ?', gone)
+            self._db.executemany('DELETE FROM links WHERE source = ?', stale)
+            self._db.executemany('INSERT OR REPLACE INTO files (key, mtime_ns, size) VALUES (?, ?, ?)', files)
+            self._db.executemany('INSERT INTO links (source, start, end, raw, target) VALUES (?, ?, ?, ?, ?)', links)
+
+        return len(changed)
+
+    def _select(self, column, keys, prefixes):
+        rows = set()
+        for k in keys:
+            rows.update(self._db.execute(f'SELECT source, start, end, raw, target FROM links WHERE {column} = ?', (k,)))
+        # Directories themselves, and everything in them.
+        for p in prefixes:
+            rows.update(self._db.execute(
+                f'SELECT source, start, end, raw, target FROM links'
+                f' WHERE {column} = ? OR ({column} >= ? AND {column} < ?)', (p, f'{p}/', f'{p}0')))
+        return rows
+
+    def links_to(self, keys, prefixes=()):
+        """ Find the links pointing to some files, or to some directories or into them.
+
+        Args:
+            keys: Keys of the files.
+            prefixes: Keys of the directories.
+
+        Returns:
+            A set of (source, start, end, raw, target) tuples. See
+            find_links.
+        """
+        return self._select('target', keys, prefixes)
+
+    def links_from(self, keys, prefixes=()):
+        """ Find the links of some zettels, or of the zettels in some directories.
+
+        Returns:
+            A set like links_to's.
+        """
+        return self._select('source', keys, prefixes)
+
+    def close(self):
+        self._db.close()
+
+
+def _relocate(path, moves):
+    """ Where a path is once moves are done.
+    """
+    if path in moves:
+        return moves[path]
+
+    d = path
+    while True:
+        parent = os.path.dirname(d)
+        if parent == d:
+            return path
+        d = parent
+        if d in moves:
+            return moves[d] + path[len(d):]
+
+
+def plan_link_edits(moves):
+    """ Plan rewriting the links that moving files would break.
+
+    Links pointing to the moved files, and relative links of the moved
+    zettels themselves, are rewritten to where their targets are after the
+    moves. Only links between zettels of the same index root are known.
+
+    Args:
+        moves: List of (src, dst) tuples of absolute paths. A src may be a
+            directory.
+
+    Returns:
+        A list of (path, edits) tuples, where path is where a zettel is
+        once moved and edits are (start, end, old, new) tuples of the byte
+        spans of its links to replace.
+    """
+    relocated = dict(moves)
+    roots = {}
+    for src, _ in moves:
+        root = find_index_root(os.path.dirname(src))
+        if root:
+            roots.setdefault(root, []).append(src)
+
+    edits = {}
+    for root, sources in roots.items():
+        index = LinkIndex.open(root)
+        if index is None:
+            continue
+
+        try:
+            index.refresh()
+            keys = [os.path.relpath(s, root) for s in sources]
+            dirs = [k for k, s in zip(keys, sources) if os.path.isdir(s) and not os.path.islink(s)]
+            files = [k for k in keys if k not in dirs]
+            rows = index.links_to(files, dirs) | index.links_from(files, dirs)
+        finally:
+            index.close()
+
+        for source, start, end, raw, target in rows:
+            path = os.path.join(root, source)
+            moved = _relocate(path, relocated)
+            target = _relocate(os.path.join(root, target), relocated)
+
+            new = target if os.path.isabs(unquote(raw)) else os.path.relpath(target, os.path.dirname(moved))
+            if raw.endswith('/'):
+                new += '/'
+            if unquote(raw) != raw:
+                new = quote(new)
+
+            if new != raw:
+                edits.setdefault(moved, []).append((start, end, raw, new))
+
+    return [(path, sorted(e)) for path, e in sorted(edits.items())]
+
+
+def invert_edits(edits):
+    """ Edits undoing a list of edits once they're applied.
+    """
+    inverse = []
+    shift = 0
+    for start, end, old, new in sorted(edits):
+        size = len(new.encode())
+        inverse.append((start + shift, start + shift + size, new, old))
+        shift += size - len(old.encode())
+    return inverse
+
+
+def _matches(data, edits):
+    return all(data[s:e] == old.encode() for s, e, old, _ in edits)
+
+
+def rewrite_links(planned):
+    """ Apply planned link edits.
+
+    Every zettel is written to a temporary file first, and they all replace
+    the originals once every one was written. Zettels whose links were
+    rewritten already, that are gone, or that changed since the edits
+    were planned are left alone, so edits may be applied again.
+
+    Args:
+        planned: List of (path, edits) tuples from plan_link_edits.
+
+    Returns:
+        Paths of the zettels that were rewritten.
+
+    Raises:
+        OSError if a zettel couldn't be rewritten.
+    """
+    staged = []
+    try:
+        for path, edits in planned:
+            try:
+                with open(path, 'rb') as f:
+                    data = f.read()
+            except FileNotFoundError:
+                continue
+
+            if not _matches(data, edits):
+                continue
+
+            for start, end, _, new in sorted(edits, reverse=True):
+                data = data[:start] + new.encode() + data[end:]
+
+            tmp = path + REWRITE_SUFFIX
+            with open(tmp, 'wb') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            shutil.copymode(path, tmp)
+            staged.append((tmp, path))
+    except BaseException:
+        for tmp, _ in staged:
+            os.remove(tmp)
+        raise
+
+    for tmp, path in staged:
+        os.replace(tmp, path)
+
+    return [path for _, path in staged]
@@ -0,0 +1,602 @@
+""" Load zettels from the filesystem.
+
+load_zettels is a drop-in replacement for libzet.load_zettels that serves
+unchanged zettels from the persistent index of their project, and parses
+the rest with a pool of processes when there are many of them.
+
+Read-only commands may load zettels lazily. Only the title and attribute
+block of each file is read, and headings are read from disk the first time
+they're accessed.
+
+Long-lived processes, like master serve, may keep the zettels they load in
+memory with keep_in_memory. Later loads then only stat their files. The
+dates of zettels with relative dates, like "tomorrow", are resolved again
+on every load.
+"""
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import yaml
+from libzet import Zettel
+from libzet.parsing import md_sep, rst_sep
+
+from master.util.columns import ZettelColumns
+from master.util.dates import resolve_date
+from master.util.ignore import ignore_for
+from master.util.index import VOLATILE, ZettelIndex, find_index_root, index_value, is_date_attr, loads
+from master.util.layout import is_shard, project_shards
+
+
+_attr_headers = {
+    'md': '<!--- attributes --->',
+    'rst': '.. attributes\n::',
+}
+
+_seps = {
+    'md': md_sep,
+    'rst': rst_sep,
+}
+
+# Below this many files to parse, a process pool costs more than it saves.
+PARALLEL_THRESHOLD = 256
+
+# Files sent to a worker at a time.
+_BATCH_MIN = 32
+
+# Zettels iter_zettels and load_columns look up and parse at once.
+CHUNK_SIZE = 1000
+
+# Bytes read from each end of a file when only its header is needed.
+_HEADER_WINDOW = 4096
+
+# (abspath, zettel_format) to (mtime_ns, size, zettel, record) of loaded
+# zettels. record is kept for zettels with relative dates, and None for the
+# rest. None unless keep_in_memory was called.
+_memory = None
+
+
+def parse_zettel(text, zettel_format='md'):
+    """ Parse the first zettel out of a zettel file's text.
+
+    This parses exactly like libzet, but keeps the attributes as the raw
+    values loaded from yaml. Dates are not resolved yet, so the record may
+    be cached and relative dates like "next week" still work later.
+
+    Args:
+        text: Text of a zettel file.
+        zettel_format: md or rst.
+
+    Returns:
+        A record; a (title, headings, attrs) tuple. attrs is whatever yaml
+        loaded from the attribute block, None if there was none.
+
+    Raises:
+        ValueError if the text was invalid.
+        yaml.YAMLError if the attribute block was invalid yaml.
+    """
+    if zettel_format not in _attr_headers:
+        raise ValueError(f'zettel_format must be in {list(_attr_headers)}')
+
+    text = text.strip()
+    if not text:
+        return '', {}, None
+
+    # libzet only keeps the first zettel of a file.
+    text = text.split(_seps[zettel_format])[0].strip()
+
+    header = _attr_headers[zettel_format]
+    parts = text.split(header)
+
+    attrs = None
+    if len(parts) > 1:
+        attrs = yaml.safe_load(parts[-1].strip())
+
+        # Leave an empty attribute block for libzet so yaml runs only once.
+        text = header.join(parts[:-1]) + header
+
+    if zettel_format == 'md':
+        z = Zettel.createFromMd(text)
+    else:
+        z = Zettel.createFromRst(text)
+
+    return z.title, z.headings, attrs
+
+
+def read_zettel(path, zettel_format='md'):
+    """ Read and parse a zettel file into a record.
+
+    See parse_zettel.
+    """
+    with open(path) as f:
+        return parse_zettel(f.read(), zettel_format)
+
+
+def _is_rst_heading(s):
+    s = s.strip()
+    return s.startswith('=') and s.endswith('=')
+
+
+def read_header(path, zettel_format='md'):
+    """ Read only the title and attributes of a zettel file.
+
+    The title is at the start of a zettel file and its attributes are at
+    the end, so only both ends of large files are read. Small files, files
+    holding several zettels, and files whose attribute block doesn't fit
+    in the window are parsed whole.
+
+    Args:
+        path: Path to a zettel file.
+        zettel_format: md or rst.
+
+    Returns:
+        A record like read_zettel's, except headings is None when they
+        weren't read.
+    """
+    if os.stat(path).st_size <= 2 * _HEADER_WINDOW:
+        return read_zettel(path, zettel_format)
+
+    with open(path, 'rb') as f:
+        head = f.read(_HEADER_WINDOW)
+        f.seek(-_HEADER_WINDOW, os.SEEK_END)
+        tail = f.read()
+
+    # Same newline translation as reading in text mode.
+    head, tail = [x.decode(errors='ignore').replace('\r\n', '\n').replace('\r', '\n') for x in (head, tail)]
+
+    sep = _seps[zettel_format]
+    header = _attr_headers[zettel_format]
+    pos = tail.rfind(header)
+    if sep in head or sep in tail or pos < 0:
+        return read_zettel(path, zettel_format)
+
+    attrs = yaml.safe_load(tail[pos + len(header):].strip())
+
+    title = ''
+    lines = head.strip().splitlines()
+    if zettel_format == 'md':
+        if lines and lines[0].strip().startswith('# '):
+            title = ' '.join(lines[0].split()[1:])
+    elif len(lines) >= 3 and _is_rst_heading(lines[0]) and _is_rst_heading(lines[2]):
+        title = lines[1].strip()
+
+    return title, None, attrs
+
+
+class LazyZettel(Zettel):
+    """ Zettel whose headings are read from disk on first access.
+    """
+    def __init__(self, title, headings=None, attrs=None, zettel_format='md'):
+        super().__init__(title, headings, attrs)
+        self._zettel_format = zettel_format
+        if headings is None:
+            self._headings = None
+
+    @property
+    def headings(self):
+        if self._headings is None:
+            self._headings = read_zettel(self.attrs['_loadpath'], self._zettel_format)[1]
+        return self._headings
+
+    @headings.setter
+    def headings(self, headings):
+        self._headings = headings
+
+
+def _read_batch(paths, zettel_format, lazy=False):
+    read = read_header if lazy else read_zettel
+    return [read(p, zettel_format) for p in paths]
+
+
+def resolve_jobs(jobs):
+    """ Turn a jobs setting into a number of worker processes.
+
+    Args:
+        jobs: int, str from a config file, or None. Empty, None and 0
+            mean one worker per CPU.
+
+    Returns:
+        The number of workers, at least 1.
+
+    Raises:
+        ValueError if jobs isn't a number.
+    """
+    if jobs in (None, '', 0, '0'):
+        return os.cpu_count() or 1
+
+    try:
+        return max(int(jobs), 1)
+    except ValueError:
+        raise ValueError(f'jobs must be a number, not "{jobs}".')
+
+
+def read_zettels(paths, zettel_format='md', jobs=None, lazy=False):
+    """ Read and parse many zettel files into records.
+
+    Large numbers of files are parsed in batches by a pool of processes.
+    Records are returned in the same order as paths regardless.
+
+    Args:
+        paths: List of paths to zettel files.
+        zettel_format: md or rst.
+        jobs: Number of worker processes. See resolve_jobs.
+        lazy: Only read titles and attributes. See read_header.
+
+    Returns:
+        A list of records. See parse_zettel.
+    """
+    jobs = resolve_jobs(jobs)
+    if jobs == 1 or len(paths) < PARALLEL_THRESHOLD:
+        return _read_batch(paths, zettel_format, lazy)
+
+    size = max(-(-len(paths) // (jobs * 4)), _BATCH_MIN)
+    batches = [paths[i:i + size] for i in range(0, len(paths), size)]
+
+    records = []
+    with ProcessPoolExecutor(max_workers=min(jobs, len(batches))) as pool:
+        for batch in pool.map(_read_batch, batches, [zettel_format] * len(batches), [lazy] * len(batches)):
+            records.extend(batch)
+
+    return records
+
+
+def to_zettel(record, loadpath, zettel_format='md', lazy=False):
+    """ Create a Zettel from a record.
+
+    Args:
+        record: (title, headings, attrs) tuple.
+        loadpath: Path the zettel was loaded from.
+        zettel_format: md or rst.
+        lazy: Return a LazyZettel. Required if headings is None.
+
+    Returns:
+        A new Zettel with a _loadpath attribute.
+    """
+    title, headings, attrs = record
+
+    # Vaults repeat the same few date strings a lot. Resolve them once.
+    dates = {}
+    for k, v in (attrs or {}).items():
+        if v and isinstance(v, str) and is_date_attr(k):
+            try:
+                dates[k] = resolve_date(v)
+            except ValueError:
+                pass
+    if dates:
+        attrs = {**attrs, **dates}
+
+    if lazy:
+        z = LazyZettel(title, headings, attrs, zettel_format)
+    else:
+        z = Zettel(title, headings, attrs)
+    z.attrs['_loadpath'] = loadpath
+    return z
+
+
+def _descend(d, name, recurse, shards):
+    """ How to walk a subdirectory, if at all.
+
+    Args:
+        d: Directory being walked.
+        name: Name of its subdirectory.
+        recurse: Levels of subdirectories of d to walk. See _walk.
+        shards: Shard patterns left at d's level. See _walk.
+
+    Returns:
+        (recurse, shards) to walk the subdirectory with, or None to skip it.
+    """
+    shard = is_shard(d, name, shards)
+    if not recurse and not shard:
+        return None
+    return (recurse if recurse is True else max((recurse or 0) - 1, 0)), (shards[1:] if shard else [])
+
+
+def _walk(path, zettel_format, recurse, shards=()):
+    """ Yield (loadpath, suffix, stat) of the zettels in a directory.
+
+    suffix is the path of the zettel relative to the walked directory.
+    Files are visited in sorted order before subdirectories. recurse is a
+    bool or a number of levels of subdirectories. Shard directories of a
+    project are walked too, whatever recurse is; shards are the patterns of
+    their names, from layout.shard_patterns. Entries ignored by
+    .masterignore files are skipped, and ignored directories aren't
+    descended into. Only zettels are stat'ed.
+    """
+    ext = f'.{zettel_format}'
+
+    def walk(d, rel, recurse, shards, ignore):
+        with os.scandir(d) as it:
+            entries = sorted(it, key=lambda e: e.name)
+
+        dirs = []
+        for e in entries:
+            if e.is_dir():
+                if (recurse or shards) and not ignore.ignored(e.name, True):
+                    sub = _descend(d, e.name, recurse, shards)
+                    if sub is not None:
+                        dirs.append((e, sub))
+            elif e.name.endswith(ext) and e.is_file() and not ignore.ignored(e.name):
+                yield f'{d}/{e.name}', f'{rel}{e.name}', e.stat()
+
+        for e, (sub, sub_shards) in dirs:
+            child = f'{d}/{e.name}'
+            yield from walk(child, f'{rel}{e.name}/', sub, sub_shards, ignore.child(e.name, child))
+
+    path = path.rstrip(os.path.sep) or os.path.sep
+    yield from walk(path, '', recurse, list(shards), ignore_for(path))
+
+
+def keep_in_memory(enable=True):
+    """ Keep the zettels loaded by this process in memory.
+
+    Loads serve zettels whose files haven't changed from memory, without
+    looking them up in the index. Served zettels are shared between loads,
+    so they must not be modified.
+
+    Args:
+        enable: False to forget the zettels and stop keeping them.
+    """
+    global _memory
+    _memory = {} if enable else None
+
+
+def _remember(loadpath, st, zettel_format, record, z):
+    """ Keep a zettel in memory, with its record if its dates are relative.
+    """
+    attrs = record[2]
+    volatile = type(attrs) is dict and any(index_value(k, v) is VOLATILE for k, v in attrs.items())
+    st = st or os.stat(loadpath)
+    _memory[(os.path.abspath(loadpath), zettel_format)] = (st.st_mtime_ns, st.st_size, z, record if volatile else None)
+
+
+def _recall(loadpath, st, zettel_format):
+    """ The zettel kept in memory for a file, or None if it changed since.
+
+    Zettels with relative dates are made again from their records, so their
+    dates are those of today.
+    """
+    hit = _memory.get((os.path.abspath(loadpath), zettel_format))
+    if not hit or hit[0] != st.st_mtime_ns or hit[1] != st.st_size:
+        return None
+
+    z, record = hit[2], hit[3]
+    if record is not None:
+        z = to_zettel(record, loadpath, zettel_format, isinstance(z, LazyZettel))
+    return z
+
+
+def _join_key(base, suffix):
+    if not base:
+        return suffix
+    if not suffix:
+        return base
+    return f'{base}/{suffix}'
+
+
+def load_zettels(paths, zettel_format='md', recurse=False, index=True, jobs=None, lazy=False, where=None):
+    """ Load zettels from the filesystem.
+
+    Behaves like libzet.load_zettels. Zettels under a project are served
+    from the project's index when their files haven't changed, and the
+    index is updated with the ones that had to be parsed.
+
+    Args:
+        paths: Path or list of paths to zettels. Each may be a dir or file.
+        zettel_format: md or rst
+        recurse: True to recurse into subdirs, False otherwise, or the
+            number of levels of subdirs to recurse into. The shard
+            directories of projects that shard their tasks are always
+            recursed into, but not subprojects.
+        index: False to bypass the index.
+        jobs: Number of processes used to parse zettels. See read_zettels.
+        lazy: Load LazyZettels. Only their titles and attributes are read
+            up front. Use this when the headings are rarely needed.
+        where: A master.util.query.Plan or ActiveWindow. Indexed zettels
+            it rules out are skipped, so the result is a superset of the
+            zettels it's looking for. Its stats are updated.
+
+    Returns:
+        A list of zettels with _loadpath attributes.
+
+    Raises:
+        FileNotFoundError if one of the paths doesn't exist.
+        OSError if one of the files couldn't be opened.
+        ValueError if one of the zettels contained invalid text.
+    """
+    return list(iter_zettels(paths, zettel_format, recurse, index, jobs, lazy, where, chunk_size=None))
+
+
+def iter_zettels(paths, zettel_format='md', recurse=False, index=True, jobs=None, lazy=False, where=None,
+                 chunk_size=CHUNK_SIZE):
+    """ Load zettels like load_zettels, yielding them as they're loaded.
+
+    Zettels are looked up and parsed chunk_size at a time, so the first ones
+    come out before the rest are loaded. Stopping early skips loading the
+    rest, and leaves the index of zettels that were removed to the next
+    full load.
+
+    Args:
+        chunk_size: Number of zettels loaded at once, or None for all of
+            them. Other arguments are those of load_zettels.
+
+    Yields:
+        Zettels with _loadpath attributes.
+
+    Raises:
+        The same as load_zettels, once the zettel that causes them is
+        loaded.
+    """
+    for loadpath, st, record, z in _iter_records(paths, zettel_format, recurse, index, jobs, lazy, where, chunk_size):
+        if z is not None:
+            z.attrs['_loadpath'] = loadpath
+        else:
+            z = to_zettel(record, loadpath, zettel_format, lazy)
+            if _memory is not None:
+                _remember(loadpath, st, zettel_format, record, z)
+
+        yield z
+
+
+def load_columns(paths, attrs, zettel_format='md', recurse=False, index=True, jobs=None, where=None):
+    """ Load the titles and some attributes of zettels into columns.
+
+    Like load_zettels, but no Zettel is created and only the attributes
+    asked for are kept, so memory stays small however many zettels there
+    are. Zettels are looked up and parsed CHUNK_SIZE at a time. Zettels
+    are still kept in memory if keep_in_memory was called.
+
+    Args:
+        paths: See load_zettels.
+        attrs: Names of the attributes to keep.
+        zettel_format: md or rst.
+        recurse: See load_zettels.
+        index: False to bypass the index.
+        jobs: See load_zettels.
+        where: See load_zettels.
+
+    Returns:
+        A master.util.columns.ZettelColumns.
+
+    Raises:
+        The same as load_zettels.
+    """
+    columns = ZettelColumns(attrs)
+    for loadpath, st, record, z in _iter_records(paths, zettel_format, recurse, index, jobs, True, where, CHUNK_SIZE):
+        if z is None and _memory is not None:
+            # Processes keeping zettels in memory want them next time.
+            z = to_zettel(record, loadpath, zettel_format, True)
+            _remember(loadpath, st, zettel_format, record, z)
+
+        if z is not None:
+            columns.append(loadpath, z.title, z.attrs)
+        else:
+            columns.append(loadpath, record[0], record[2] or {})
+
+    return columns
+
+
+def _iter_records(paths, zettel_format, recurse, index, jobs, lazy, where, chunk_size=None):
+    """ Yield what there is to load for load_zettels, in order.
+
+    Yields:
+        (loadpath, stat, record, zettel) tuples. zettel is a zettel kept in
+        memory, and record is None for those. stat is None if the zettel
+        isn't under an index.
+    """
+    if type(paths) is not list:
+        paths = [paths]
+
+    # Resolve what to load first; (loadpath, index, key, stat)
+    entries = []
+    indexes = {}
+    walked = []
+
+    try:
+        for path in paths:
+            if not os.path.exists(path):
+                raise FileNotFoundError(f'{path} does not exist.')
+
+            idx = None
+            base = ''
+            if index:
+                root = find_index_root(path)
+                if root:
+                    if root not in indexes:
+                        indexes[root] = ZettelIndex.open(root)
+                    idx = indexes[root]
+
+                if idx:
+                    base = os.path.relpath(os.path.abspath(path), root)
+                    base = '' if base == '.' else base
+
+            if os.path.isdir(path):
+                shards = [] if recurse is True else project_shards(path)
+                found = [(lp, idx, _join_key(base, s), st) for lp, s, st in _walk(path, zettel_format, recurse, shards)]
+                entries.extend(found)
+                if idx and recurse is True:
+                    walked.append((idx, base, {e[2] for e in found}))
+
+            elif os.path.isfile(path):
+                entries.append((path, idx, base, os.stat(path) if idx else None))
+
+            else:
+                raise ValueError(f'{path} is not a regular file or directory.')
+
+        # Zettels kept in memory need neither the index nor parsing.
+        kept = {}
+        if _memory is not None:
+            for i, (loadpath, _, _, st) in enumerate(entries):
+                z = _recall(loadpath, st or os.stat(loadpath), zettel_format)
+                if z is not None:
+                    kept[i] = z
+
+        candidates = {}
+        if where is not None:
+            candidates = {idx: where.candidates(idx) for idx in indexes.values() if idx}
+
+        indexed = skipped = 0
+        size = chunk_size or len(entries) or 1
+        for start in range(0, len(entries), size):
+            chunk = range(start, min(start + size, len(entries)))
+
+            # Fetch cached records for everything else under an index.
+            cached = {}
+            for idx in indexes.values():
+                if idx:
+                    keys = [entries[i][2] for i in chunk if entries[i][1] is idx and i not in kept]
+                    cached[idx] = idx.lookup(keys, headings=not lazy)
+
+            # Zettels the plan ruled out are skipped; only up to date
+            # entries can be trusted to rule them out.
+            records = {}
+            misses = []
+            for i in chunk:
+                loadpath, idx, key, st = entries[i]
+
+                # The index may not know about zettels kept in memory, so
+                # they can't be ruled out.
+                if i in kept:
+                    indexed += 1
+                    continue
+
+                if idx:
+                    hit = cached[idx].get(key)
+                    if (hit and hit[0] == st.st_mtime_ns and hit[1] == st.st_size
+                            and hit[2] == zettel_format and (lazy or hit[4] is not None)):
+                        indexed += 1
+                        keys = candidates.get(idx)
+                        if keys is not None and key not in keys:
+                            skipped += 1
+                            continue
+
+                        headings = None if lazy else json.loads(hit[4])
+                        records[i] = (hit[3], headings, loads(hit[5]))
+                        continue
+
+                misses.append(i)
+
+            # Parse whatever the index couldn't provide.
+            if misses:
+                parsed = read_zettels([entries[i][0] for i in misses], zettel_format, jobs, lazy)
+                for i, record in zip(misses, parsed):
+                    records[i] = record
+                    _, idx, key, st = entries[i]
+                    if idx:
+                        idx.store(key, st, zettel_format, record)
+
+            for i in chunk:
+                if i in kept:
+                    yield entries[i][0], entries[i][3], None, kept[i]
+                elif i in records:
+                    yield entries[i][0], entries[i][3], records[i], None
+
+        if where is not None:
+            where.stats = (len(entries), indexed, skipped)
+
+        for idx, base, seen in walked:
+            idx.prune(base, seen)
+
+    finally:
+        for idx in indexes.values():
+            if idx:
+                idx.close()
@@ -0,0 +1,197 @@
+""" Timing of the phases of a command.
+
+Commands mark their phases with phase(), which does nothing until
+profiling is started. Once started, each phase records its wall time and
+the memory blocks it left allocated, and when the process exits they're
+printed as a table to stderr, written as a Chrome trace, or both. Traces
+open in chrome://tracing or https://ui.perfetto.dev.
+
+Pass --profile to master to print the table, and set MASTER_TRACE to the
+path of a trace to write it.
+"""
+import atexit
+import os
+import sys
+import time
+
+
+TRACE_ENV = 'MASTER_TRACE'
+
+
+class _Off:
+    """ What phase() returns while profiling is off.
+
+    It can be entered any number of times. Importing contextlib for its
+    nullcontext would slow down every start.
+    """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_OFF = _Off()
+
+_profiler = None
+
+
+def _since_exec():
+    """ Seconds since the process started, or None where that's unknown.
+    """
+    try:
+        with open('/proc/self/stat') as f:
+            # The command name may hold spaces, but not after its ")".
+            fields = f.read().rsplit(')', 1)[1].split()
+        started = int(fields[19]) / os.sysconf('SC_CLK_TCK')
+        return max(time.clock_gettime(time.CLOCK_BOOTTIME) - started, 0.0)
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+class _Phase:
+    """ A phase being timed. See Profiler.phase.
+    """
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        p = self.profiler
+        self.depth = p.depth
+        p.depth += 1
+        self.blocks = sys.getallocatedblocks()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.start
+        p = self.profiler
+        p.depth -= 1
+        p.spans.append((self.name, self.depth, self.start - p.origin, seconds,
+                        sys.getallocatedblocks() - self.blocks))
+        return False
+
+
+class Profiler:
+    """ Recorder of the phases of a command.
+
+    Phases can nest. Each is recorded as a (name, depth, start, seconds,
+    blocks) tuple, where start is in seconds since the process started and
+    blocks is how many more memory blocks were allocated at its end than at
+    its start.
+
+    Args:
+        startup: Seconds the process ran before the profiler was made. It's
+            recorded as the "startup" phase.
+    """
+    def __init__(self, startup=None):
+        import threading
+
+        now = time.perf_counter()
+        self.origin = now - (startup or 0.0)
+        self.depth = 0
+        self.spans = []
+        self.tid = threading.get_ident()
+        if startup:
+            self.spans.append(('startup', 0, 0.0, startup, None))
+
+    def phase(self, name):
+        """ Context manager timing a phase.
+        """
+        return _Phase(self, name)
+
+    def total(self):
+        """ Seconds since the process started.
+        """
+        return time.perf_counter() - self.origin
+
+    def table(self):
+        """ Format the phases as a table, in the order they started.
+        """
+        total = self.total()
+        lines = [f'{"phase":<32} {"ms":>9} {"%":>6} {"blocks":>9}']
+        for name, depth, _, seconds, blocks in sorted(self.spans, key=lambda s: (s[2], s[1])):
+            label = f'{"  " * depth}{name}'
+            blocks = '' if blocks is None else blocks
+            lines.append(f'{label:<32} {seconds * 1000:9.1f} {100 * seconds / total:6.1f} {blocks:>9}')
+        lines.append(f'{"total":<32} {total * 1000:9.1f} {100.0:6.1f}')
+        return '\n'.join(lines)
+
+    def trace(self):
+        """ The phases as a Chrome trace.
+
+        Returns:
+            A dict to write as JSON.
+        """
+        events = []
+        for name, depth, start, seconds, blocks in self.spans:
+            e = {'name': name, 'cat': 'master', 'ph': 'X', 'ts': round(start * 1e6), 'dur': round(seconds * 1e6),
+                 'pid': os.getpid(), 'tid': self.tid}
+            if blocks is not None:
+                e['args'] = {'blocks': blocks}
+            events.append(e)
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+
+def phase(name):
+    """ Time a phase of the running command if it's being profiled.
+
+        with phase('load'):
+            zettels = load_zettels(paths)
+
+    Args:
+        name: Name of the phase in the table and the trace.
+
+    Returns:
+        A context manager.
+    """
+    if _profiler is None:
+        return _OFF
+    return _profiler.phase(name)
+
+
+def enabled():
+    """ Whether the running command is being profiled.
+    """
+    return _profiler is not None
+
+
+def start(table=True, trace=None):
+    """ Start profiling the running command.
+
+    What was recorded is reported when the process exits.
+
+    Args:
+        table: Print a table of the phases to stderr.
+        trace: Path to write a Chrome trace of the phases to, or None.
+
+    Returns:
+        The Profiler.
+    """
+    global _profiler
+    _profiler = Profiler(_since_exec())
+    atexit.register(_report, _profiler, table, trace)
+    return _profiler
+
+
+def stop():
+    """ Stop profiling, without reporting what was recorded so far.
+    """
+    global _profiler
+    if _profiler is not None:
+        atexit.unregister(_report)
+    _profiler = None
+
+
+def _report(profiler, table, trace):
+    import json
+
+    if table:
+        print(profiler.table(), file=sys.stderr)
+    if trace:
+        try:
+            with open(trace, 'w') as f:
+                json.dump(profiler.trace(), f)
+        except OSError as e:
+            print(f'ERROR: Could not write trace to {trace}: {e}', file=sys.stderr)
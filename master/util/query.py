@@ -0,0 +1,313 @@
+""" Plan list filters against the index.
+
+Most filters are simple predicates on a few attributes, like
+
+    stage == 'todo' and due_date < 2022-11-01
+
+The values of those attributes are indexed, see INDEXED_ATTRS in
+master.util.index, so a filter like this can pick its candidate zettels
+from the index instead of decoding every cached zettel. SQLite keeps the
+values in a B-tree, which answers equality and range lookups alike.
+
+Plans only narrow down the candidates. Each candidate is still run through
+the whole filter, so a plan may let through too many zettels but never too
+few. Filters that can't be answered from the index are scanned.
+
+The index also keeps the span of days the events of each zettel may be
+active on, sorted by their last day. ActiveWindow looks up the zettels
+active on or after a date, or between two dates, in that.
+"""
+import ast
+from datetime import datetime
+
+from superdate import parse_date
+
+from master.util.index import INDEXED_ATTRS, index_value, is_date_attr
+
+
+_ops = {ast.Eq: '==', ast.Lt: '<', ast.LtE: '<=', ast.Gt: '>', ast.GtE: '>=', ast.In: 'in'}
+
+# The same comparison with its operands swapped.
+_flipped = {'==': '==', '<': '>', '<=': '>=', '>': '<', '>=': '<='}
+
+
+class _Unplannable(Exception):
+    pass
+
+
+class Lookup:
+    """ Keys whose indexed attribute compares true with one of some values.
+    """
+
+    def __init__(self, name, op, values):
+        self.name = name
+        self.op = op
+        self.values = values
+
+    def keys(self, idx):
+        keys = set()
+        for v in self.values:
+            keys |= idx.match(self.name, self.op, v)
+
+        return keys
+
+    def explain(self, indent=''):
+        if len(self.values) == 1:
+            return [f'{indent}index {self.name} {self.op} {self.values[0]!r}']
+
+        return [f'{indent}index {self.name} in {self.values!r}']
+
+
+class And:
+    """ Keys matched by all of several plans.
+    """
+
+    def __init__(self, children):
+        self.children = children
+
+    def keys(self, idx):
+        return set.intersection(*(c.keys(idx) for c in self.children))
+
+    def explain(self, indent=''):
+        return [f'{indent}and'] + [line for c in self.children for line in c.explain(indent + '  ')]
+
+
+class Or:
+    """ Keys matched by any of several plans.
+    """
+
+    def __init__(self, children):
+        self.children = children
+
+    def keys(self, idx):
+        return set.union(*(c.keys(idx) for c in self.children))
+
+    def explain(self, indent=''):
+        return [f'{indent}or'] + [line for c in self.children for line in c.explain(indent + '  ')]
+
+
+def _conjunction(children):
+    return children[0] if len(children) == 1 else And(children)
+
+
+def _attr_name(node, dates):
+    """ Name of the attribute a node looks up. None if it isn't one.
+    """
+    if isinstance(node, ast.Name) and node.id != 'z' and node.id not in dates:
+        return node.id
+
+    if (isinstance(node, ast.Subscript) and isinstance(node.value, ast.Attribute)
+            and node.value.attr == 'attrs' and isinstance(node.value.value, ast.Name)
+            and node.value.value.id == 'z' and isinstance(node.slice, ast.Constant)
+            and type(node.slice.value) is str):
+        return node.slice.value
+
+    return None
+
+
+def _constant(node, dates):
+    if isinstance(node, ast.Constant):
+        return node.value
+    if isinstance(node, ast.Name) and node.id in dates:
+        return dates[node.id]
+    if (isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub)
+            and isinstance(node.operand, ast.Constant) and type(node.operand.value) in (int, float)):
+        return -node.operand.value
+
+    raise _Unplannable()
+
+
+def _query_value(name, op, value):
+    """ Turn a constant of a filter into an index query.
+
+    Returns:
+        The (op, value) to look up.
+
+    Raises:
+        _Unplannable if the comparison can't be answered from the index.
+    """
+    if value is None:
+        raise _Unplannable()
+
+    if is_date_attr(name):
+        # SuperDates parse whatever they're compared with.
+        if isinstance(value, str):
+            try:
+                value = parse_date(value)
+            except ValueError:
+                raise _Unplannable()
+
+        # Dates are indexed without their time, so make ranges inclusive.
+        if isinstance(value, datetime):
+            op = {'<': '<=', '>': '>='}.get(op, op)
+            value = value.date()
+
+        value = index_value(name, value)
+        if not isinstance(value, str):
+            raise _Unplannable()
+
+        return op, value
+
+    value = index_value(name, value)
+    if value is NotImplemented:
+        raise _Unplannable()
+
+    return op, value
+
+
+def _plan_compare(left, op, right, dates):
+    name = _attr_name(left, dates)
+    if name is None:
+        name = _attr_name(right, dates)
+        if name is None or op == 'in':
+            raise _Unplannable()
+        left, right, op = right, left, _flipped[op]
+
+    if name not in INDEXED_ATTRS:
+        raise _Unplannable()
+
+    if op == 'in':
+        if not isinstance(right, (ast.Tuple, ast.List, ast.Set)):
+            raise _Unplannable()
+        queries = [_query_value(name, '==', _constant(e, dates)) for e in right.elts]
+        return Lookup(name, '==', [v for _, v in queries])
+
+    op, value = _query_value(name, op, _constant(right, dates))
+    return Lookup(name, op, [value])
+
+
+def _plan(node, dates):
+    """ Plan a node of a filter.
+
+    Raises:
+        _Unplannable if none of the node can be answered from the index.
+    """
+    if isinstance(node, ast.BoolOp):
+        if isinstance(node.op, ast.Or):
+            return Or([_plan(v, dates) for v in node.values])
+
+        # Any planned part of a conjunction narrows it down.
+        children = []
+        for v in node.values:
+            try:
+                children.append(_plan(v, dates))
+            except _Unplannable:
+                pass
+
+        if not children:
+            raise _Unplannable()
+        return _conjunction(children)
+
+    if isinstance(node, ast.Compare):
+        operands = [node.left] + node.comparators
+        children = []
+        for i, op in enumerate(node.ops):
+            if type(op) not in _ops:
+                continue
+            try:
+                children.append(_plan_compare(operands[i], _ops[type(op)], operands[i + 1], dates))
+            except _Unplannable:
+                pass
+
+        if not children:
+            raise _Unplannable()
+        return _conjunction(children)
+
+    raise _Unplannable()
+
+
+class Plan:
+    """ How a filter finds its candidate zettels.
+
+    Attributes:
+        filter: The master.util.filter.Filter that was planned.
+        root: Tree of index lookups. None if the filter has to scan every
+            zettel.
+        stats: (zettels, indexed, skipped) counts of the last load that
+            used this plan. See load_zettels.
+    """
+
+    def __init__(self, filter, root):
+        self.filter = filter
+        self.root = root
+        self.stats = None
+
+    def candidates(self, idx):
+        """ Keys of an index that may match the filter.
+
+        Args:
+            idx: A master.util.index.ZettelIndex.
+
+        Returns:
+            A set of keys, or None if every key may match.
+        """
+        if self.root is None:
+            return None
+
+        return self.root.keys(idx)
+
+    def explain(self):
+        """ Describe the plan, and how the last load went.
+
+        Returns:
+            A str of several lines.
+        """
+        if self.root is None:
+            lines = ['plan: full scan']
+        else:
+            lines = ['plan: index lookup'] + self.root.explain('  ')
+
+        lines.append(f'  filter {self.filter.expr}')
+
+        if self.stats:
+            total, indexed, skipped = self.stats
+            lines.append(f'zettels: {total}, {indexed} indexed, {total - skipped} candidates')
+
+        return '\n'.join(lines)
+
+
+def plan_filter(filter):
+    """ Plan how to find the zettels a filter may match.
+
+    Args:
+        filter: A master.util.filter.Filter.
+
+    Returns:
+        A Plan.
+    """
+    try:
+        root = _plan(filter.tree.body, filter.dates)
+    except _Unplannable:
+        root = None
+
+    return Plan(filter, root)
+
+
+class ActiveWindow:
+    """ Find the zettels that may be active within a window of days.
+
+    Like a Plan, this may be passed to load_zettels as where. Only zettels
+    with scheduling attributes, like event_begin or recurring, can be
+    active.
+
+    Attributes:
+        start: First date of the window.
+        end: Date after the last of the window. None if unbounded.
+        stats: See Plan.
+    """
+
+    def __init__(self, start, end=None):
+        self.start = start
+        self.end = end
+        self.stats = None
+
+    def candidates(self, idx):
+        """ Keys of an index that may be active within the window.
+
+        Args:
+            idx: A master.util.index.ZettelIndex.
+
+        Returns:
+            A set of keys.
+        """
+        return idx.active(self.start, self.end)
@@ -0,0 +1,370 @@
+""" Watch zettel files for changes.
+
+Directories are watched with inotify on Linux, and polled elsewhere or when
+inotify isn't available. Either way a Watcher reports the paths of zettel
+files that were created, modified, moved or deleted, in the form
+load_zettels gives them as _loadpath.
+
+Changes come in bursts; editors often save by writing a temporary file and
+renaming it over the zettel. A Watcher waits for a burst to settle before
+reporting it, so each save is reported once.
+"""
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+import time
+
+import yaml
+
+from master.util.ignore import IGNORE_FILE, ignore_for
+from master.util.layout import project_shards
+from master.util.load import _descend, _walk, load_zettels
+
+
+# Seconds without changes before a burst of them is reported.
+DEBOUNCE = 0.2
+
+# Seconds between scans when polling.
+POLL_INTERVAL = 1.0
+
+_IN_MODIFY = 0x2
+_IN_CLOSE_WRITE = 0x8
+_IN_MOVED_FROM = 0x40
+_IN_MOVED_TO = 0x80
+_IN_CREATE = 0x100
+_IN_DELETE = 0x200
+_IN_Q_OVERFLOW = 0x4000
+_IN_IGNORED = 0x8000
+_IN_ONLYDIR = 0x1000000
+_IN_ISDIR = 0x40000000
+
+_MASK = _IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE | _IN_ONLYDIR
+_EVENT = struct.Struct('iIII')
+
+
+def _libc():
+    """ libc, if it can watch files with inotify.
+    """
+    if not sys.platform.startswith('linux'):
+        return None
+
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        libc.inotify_init1
+    except (OSError, AttributeError):
+        return None
+
+    return libc
+
+
+class Watcher:
+    """ Watch the zettels of some paths, like load_zettels would load them.
+
+    Directories are watched as deep as load_zettels recurses into them, and
+    files only for themselves. Start watching before loading the zettels
+    so no change is missed.
+
+    Args:
+        paths: Path or list of paths (dirs or files) to zettels.
+        zettel_format: md or rst.
+        recurse: See load_zettels.
+        poll: True to poll even if inotify is available.
+    """
+
+    def __init__(self, paths, zettel_format='md', recurse=False, poll=False):
+        if type(paths) is not list:
+            paths = [paths]
+
+        self.ext = f'.{zettel_format}'
+        self.debounce = DEBOUNCE
+
+        # Watched directories to their (depth, shards), and the parents of
+        # watched files to their names and paths. See load._walk.
+        self._dirs = {}
+        self._singles = {}
+        for path in paths:
+            if os.path.isdir(path):
+                shards = [] if recurse is True else project_shards(path)
+                self._dirs[path.rstrip(os.path.sep) or os.path.sep] = (recurse, shards)
+            else:
+                parent, name = os.path.split(path)
+                self._singles.setdefault(parent or '.', {})[name] = path
+
+        self._fd = None
+        self._libc = None if poll else _libc()
+        if self._libc:
+            try:
+                self._start()
+            except OSError:
+                self.close()
+                self._libc = None
+
+        if not self._libc:
+            self._snapshot = self._scan()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def changes(self, timeout=None):
+        """ Wait for zettels to change.
+
+        Args:
+            timeout: Seconds to wait for a first change, or None to wait
+                until one happens.
+
+        Returns:
+            A set of the paths of zettels that changed. Empty if nothing
+            changed before the timeout.
+        """
+        end = None if timeout is None else time.monotonic() + timeout
+        changed = set()
+        while not changed:
+            remaining = None if end is None else end - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return changed
+            self._read(changed, remaining)
+
+        # Wait for the burst to settle.
+        while self._read(changed, self.debounce):
+            pass
+
+        return changed
+
+    def _read(self, changed, timeout):
+        """ Collect the changes that happen within a timeout.
+
+        Returns:
+            True if anything happened, even to files that aren't zettels.
+        """
+        if not self._libc:
+            time.sleep(POLL_INTERVAL if timeout is None else min(timeout, POLL_INTERVAL))
+            snapshot = self._scan()
+            diff = {p for p in snapshot.keys() | self._snapshot.keys() if snapshot.get(p) != self._snapshot.get(p)}
+            self._snapshot = snapshot
+            changed.update(diff)
+            return bool(diff)
+
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return False
+
+        try:
+            data = os.read(self._fd, 1 << 16)
+        except BlockingIOError:
+            return False
+
+        stale = False
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, offset)
+            name = os.fsdecode(data[offset + _EVENT.size:offset + _EVENT.size + length].rstrip(b'\0'))
+            offset += _EVENT.size + length
+            stale = self._event(changed, wd, mask, name) or stale
+
+        if stale:
+            # Anything may have changed. Start over.
+            changed.update(self._files)
+            self._start()
+            changed.update(self._files)
+
+        return True
+
+    def _event(self, changed, wd, mask, name):
+        """ Handle an inotify event.
+
+        Returns:
+            True if events were lost or ignore rules changed, so every
+            directory has to be watched again.
+        """
+        if mask & _IN_Q_OVERFLOW:
+            return True
+
+        if mask & _IN_IGNORED:
+            self._wds.pop(wd, None)
+            return False
+
+        if wd not in self._wds:
+            return False
+        d, walk, ignore = self._wds[wd]
+
+        if ignore is not None and name == IGNORE_FILE:
+            return True
+
+        if mask & _IN_ISDIR:
+            if ignore is None or ignore.ignored(name, True):
+                return False
+
+            path = f'{d}/{name}'
+            if mask & (_IN_DELETE | _IN_MOVED_FROM):
+                self._forget(path, changed)
+            elif mask & (_IN_CREATE | _IN_MOVED_TO):
+                sub = _descend(d, name, *walk)
+                if sub is not None:
+                    self._add(path, sub, ignore.child(name, path), changed)
+            return False
+
+        if ignore is not None and name.endswith(self.ext) and not ignore.ignored(name):
+            path = f'{d}/{name}'
+        elif d in self._singles and name in self._singles[d]:
+            path = self._singles[d][name]
+        else:
+            return False
+
+        changed.add(path)
+        if os.path.isfile(path):
+            self._files.add(path)
+        else:
+            self._files.discard(path)
+        return False
+
+    def _start(self):
+        """ (Re)start watching every path.
+        """
+        self.close()
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            self._fd = None
+            e = ctypes.get_errno()
+            raise OSError(e, os.strerror(e))
+
+        # Watch descriptors to (dir, (depth, shards), ignore). ignore is None
+        # for the parents of watched files.
+        self._wds = {}
+        self._files = set()
+        for d, walk in self._dirs.items():
+            self._add(d, walk, ignore_for(d))
+
+        for parent, names in self._singles.items():
+            if parent not in self._dirs and os.path.isdir(parent):
+                self._watch(parent, None, None)
+            self._files.update(p for p in names.values() if os.path.isfile(p))
+
+    def _watch(self, d, walk, ignore):
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(d), _MASK)
+        if wd < 0:
+            e = ctypes.get_errno()
+            if e in (errno.ENOENT, errno.ENOTDIR):
+                return False
+            raise OSError(e, os.strerror(e), d)
+
+        self._wds[wd] = (d, walk, ignore)
+        return True
+
+    def _add(self, d, walk, ignore, changed=None):
+        """ Watch a directory and its subdirectories, and report the zettels in them.
+        """
+        if not self._watch(d, walk, ignore):
+            return
+
+        try:
+            with os.scandir(d) as it:
+                entries = list(it)
+        except (FileNotFoundError, NotADirectoryError):
+            return
+
+        for e in entries:
+            if ignore.ignored(e.name, e.is_dir()):
+                continue
+
+            if e.is_dir():
+                sub = _descend(d, e.name, *walk)
+                if sub is not None:
+                    path = f'{d}/{e.name}'
+                    self._add(path, sub, ignore.child(e.name, path), changed)
+            elif e.name.endswith(self.ext):
+                path = f'{d}/{e.name}'
+                self._files.add(path)
+                if changed is not None:
+                    changed.add(path)
+
+    def _forget(self, d, changed):
+        """ Stop watching a directory that was removed, and report the zettels that were in it.
+        """
+        prefix = f'{d}/'
+        for wd, (path, _, _) in list(self._wds.items()):
+            if path == d or path.startswith(prefix):
+                self._libc.inotify_rm_watch(self._fd, wd)
+                del self._wds[wd]
+
+        gone = {p for p in self._files if p.startswith(prefix)}
+        self._files -= gone
+        changed.update(gone)
+
+    def _scan(self):
+        """ Stat every watched zettel.
+
+        Returns:
+            A dict of their paths to (mtime, size, inode).
+        """
+        snapshot = {}
+        for d, walk in self._dirs.items():
+            try:
+                for loadpath, _, st in _walk(d, self.ext[1:], *walk):
+                    snapshot[loadpath] = (st.st_mtime_ns, st.st_size, st.st_ino)
+            except (FileNotFoundError, NotADirectoryError):
+                pass
+
+        for names in self._singles.values():
+            for path in names.values():
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                snapshot[path] = (st.st_mtime_ns, st.st_size, st.st_ino)
+
+        return snapshot
+
+
+def load_changed(changed, zettel_format='md', jobs=None):
+    """ Load the zettels reported by a Watcher.
+
+    Zettels that can't be read, like ones an editor is still writing, are
+    left out. They're reported again once they change.
+
+    Args:
+        changed: Paths of zettels that changed.
+        zettel_format: md or rst.
+        jobs: See load_zettels.
+
+    Returns:
+        (zettels, removed) tuple of the zettels that exist, with their new
+        contents, and the paths of the ones that were removed.
+    """
+    paths = sorted(p for p in changed if os.path.isfile(p))
+    removed = sorted(p for p in changed if not os.path.isfile(p))
+
+    try:
+        return load_zettels(paths, zettel_format, jobs=jobs, lazy=True), removed
+    except (OSError, ValueError, yaml.YAMLError):
+        pass
+
+    zettels = []
+    for p in paths:
+        try:
+            zettels.extend(load_zettels(p, zettel_format, lazy=True))
+        except (OSError, ValueError, yaml.YAMLError):
+            pass
+
+    return zettels, removed
+
+
+def redraw(text, file=None):
+    """ Replace what's on a terminal with text, or just print it if file isn't one.
+    """
+    file = file or sys.stdout
+    if file.isatty():
+        file.write('\033[H\033[2J')
+    file.write(f'{text}\n')
+    file.flush()
@@ -1,5 +1,7 @@
+import importlib.util
 import os
 from setuptools import setup, find_packages
+from setuptools.command.build_py import build_py
 from os import path
 
 
@@ -14,6 +16,19 @@ for r, d, f in os.walk(path.join(here, 'docs', 'man')):
     manfiles = [path.join(r, f) for f in f if f.endswith('.1.gz')]
     break
 
+
+class BuildWithRegistry(build_py):
+    """ Generate the static registry of subcommands before building.
+    """
+    def run(self):
+        cli = path.join(here, 'master', 'cli')
+        spec = importlib.util.spec_from_file_location('registry', path.join(cli, 'registry.py'))
+        registry = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(registry)
+        registry.write_registry(cli)
+        super().run()
+
+
 install_requires = []
 if 'DEBBUILD' not in os.environ:
     install_requires = [
@@ -32,7 +47,7 @@ setup(
     url='',
     author='Logan Reece',
     author_email='onereddime@protonmail.com',
-    packages=find_packages(exclude=['tests']),
+    packages=find_packages(exclude=['tests', 'benchmarks']),
     license='GPLv2',
     python_requires='>3, <4',
     install_requires=install_requires,
@@ -40,6 +55,7 @@ setup(
         ('/etc/bash_completion.d', ['etc/master_completion.sh']),
         ('/usr/share/man/man1', manfiles),
     ],
+    cmdclass={'build_py': BuildWithRegistry},
     entry_points={
         'console_scripts': [
             'master=master.main:main',
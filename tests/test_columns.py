@@ -0,0 +1,89 @@
+import os
+import shutil
+import unittest
+from datetime import date, datetime
+
+from libzet.NoCompare import NoCompare
+
+from master.util.columns import ZettelColumns
+from master.util.filter import compile_filter
+from master.util.load import load_columns, load_zettels
+
+
+resources = '{}/resources'.format(os.path.dirname(__file__))
+vault = f'{resources}/test_columns'
+
+
+class TestColumns(unittest.TestCase):
+
+    def setUp(self):
+        os.makedirs(f'{vault}/.master')
+        attrs = [
+            'stage: todo\ndue_date: 2022-11-01\n',
+            'stage: closed\nevent_begin: 2022-11-02 10:30\ntags: [a, b]\n',
+            'stage: todo\nsprint: 3\nrecurring_stop:\n',
+            '',
+        ]
+        for i, a in enumerate(attrs):
+            with open(f'{vault}/{i}.md', 'w') as f:
+                f.write(f'# Zettel {i}\n## Notes\ntext\n<!--- attributes --->\n{a}')
+
+    def tearDown(self):
+        shutil.rmtree(vault)
+
+    def test_store(self):
+        columns = ZettelColumns(['stage', 'due_date'])
+        columns.append('a.md', 'A', {'stage': 'todo', 'due_date': datetime(2022, 1, 2, 3, 4, 5)})
+        columns.append('b.md', 'B', {'stage': 'todo', 'due_date': 'not a date'})
+        columns.append('c.md', 'C', {'stage': None})
+
+        self.assertEqual(3, len(columns))
+        self.assertEqual(['todo', None], columns.columns['stage'].values[1:])
+        a, b, c = columns
+        self.assertEqual(('A', 'a.md'), (a.title, a.attrs['_loadpath']))
+        self.assertEqual(datetime(2022, 1, 2, 3, 4, 5), a.attrs['due_date']._date)
+        self.assertEqual('not a date', b.attrs['due_date'])
+        self.assertIsNone(c.attrs['stage'])
+        self.assertNotIn('due_date', c.attrs)
+        self.assertIsInstance(c.attrs['due_date'], NoCompare)
+        self.assertRaises(KeyError, c.attrs.get, 'sprint')
+
+    def test_same_as_zettels(self):
+        """ Filters see the same attributes in columns as in zettels.
+        """
+        zettels = load_zettels(vault)
+        for expr in ['True', 'stage == "todo"', 'due_date < 2022-11-02', 'event_begin >= 2022-11-02',
+                     '"a" in tags', 'sprint == 3 or z.title == "Zettel 3"', 'recurring_stop == None']:
+            f = compile_filter(expr)
+            self.assertFalse(f.whole)
+
+            columns = load_columns(vault, f.attrs)
+            self.assertEqual(
+                sorted(z.attrs['_loadpath'] for z in zettels if f(z)),
+                sorted(z.attrs['_loadpath'] for z in columns if f(z)), expr)
+
+        self.assertTrue(compile_filter('"Notes" in z.headings').whole)
+        self.assertEqual({'stage', 'due_date'}, compile_filter('stage == 1 or z.attrs["due_date"]').attrs)
+
+    def test_defaults(self):
+        """ Zettels without a creation_date or zlinks get libzet's defaults.
+        """
+        zettels = {z.title: z for z in load_zettels(vault)}
+        columns = {z.title: z for z in load_columns(vault, ['creation_date', 'zlinks'])}
+        self.assertEqual(zettels.keys(), columns.keys())
+        for title, z in zettels.items():
+            self.assertEqual(z.attrs['creation_date'], columns[title].attrs['creation_date'], title)
+            self.assertEqual(z.attrs['zlinks'], columns[title].attrs['zlinks'], title)
+
+        f = compile_filter(f'creation_date >= {date.today().isoformat()}')
+        self.assertEqual(4, len([z for z in load_columns(vault, f.attrs) if f(z)]))
+
+    def test_dates(self):
+        columns = load_columns(vault, ['due_date', 'event_begin'])
+        z = {z.title: z for z in columns}
+        self.assertEqual(date(2022, 11, 1), z['Zettel 0'].attrs['due_date']._date)
+        self.assertEqual(datetime(2022, 11, 2, 10, 30), z['Zettel 1'].attrs['event_begin']._date)
+
+
+if __name__ == '__main__':
+    unittest.main()
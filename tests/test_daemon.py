@@ -0,0 +1,83 @@
+import os
+import shutil
+import threading
+import unittest
+from unittest import mock
+
+import master.cli.serve.main
+import master.util.load
+from master.cli.serve.main import Daemon
+from master.util.daemon import forward, socket_path, subcommand
+from master.util.load import keep_in_memory
+
+
+resources = '{}/resources'.format(os.path.dirname(__file__))
+vault = f'{resources}/test_served'
+conf = f'{resources}/test_master.ini'
+
+
+class TestDaemon(unittest.TestCase):
+
+    def setUp(self):
+        os.makedirs(f'{vault}/.master')
+        for name, stage in [('a', 'todo'), ('b', 'closed')]:
+            with open(f'{vault}/{name}.md', 'w') as f:
+                f.write(f'# {name.upper()}\n<!--- attributes --->\nstage: {stage}\n')
+
+        with open(conf, 'w') as f:
+            f.write('[default]\nusername = kim\nemail = kim@example.com\njobs = 1\n')
+
+        self.cwd = os.getcwd()
+        keep_in_memory()
+        self.patch = mock.patch.object(master.cli.serve.main, 'user_conf', conf)
+        self.patch.start()
+
+        self.daemon = Daemon(os.path.abspath(vault), socket_path(vault))
+        self.thread = threading.Thread(target=self.daemon.serve_forever)
+        self.thread.start()
+
+    def tearDown(self):
+        self.daemon.shutdown()
+        self.daemon.server_close()
+        self.thread.join()
+        self.patch.stop()
+        keep_in_memory(False)
+        os.chdir(self.cwd)
+        shutil.rmtree(vault)
+        os.remove(conf)
+
+    def test_subcommand(self):
+        self.assertEqual('list', subcommand(['-j', '2', 'list', '-f', 'True']))
+        self.assertEqual(None, subcommand(['--version']))
+
+    def test_forward(self):
+        """ Commands run by the daemon print what they would in-process.
+        """
+        self.assertEqual(
+            (0, './a.md: A\n', ''), forward(['list', '-f', 'stage == "todo"'], cwd=os.path.abspath(vault)))
+
+        # Changes are picked up, and errors are reported.
+        with open(f'{vault}/b.md', 'w') as f:
+            f.write('# B\n<!--- attributes --->\nstage: todo\nextra: 1\n')
+        code, out, _ = forward(['list', '-f', 'stage == "todo"'], cwd=os.path.abspath(vault))
+        self.assertEqual((0, './a.md: A\n./b.md: B\n'), (code, out))
+
+        code, out, _ = forward(['list', '-f', 'bogus('], cwd=os.path.abspath(vault))
+        self.assertEqual(1, code)
+        self.assertIn('ERROR', out)
+
+        # Only read-only commands are sent, and only to a running daemon.
+        self.assertIsNone(forward(['add'], cwd=os.path.abspath(vault)))
+        self.assertIsNone(forward(['list'], cwd=resources))
+
+    def test_memory(self):
+        """ Unchanged zettels are served from memory.
+        """
+        forward(['list'], cwd=os.path.abspath(vault))
+        with mock.patch.object(master.util.load, 'parse_zettel', side_effect=AssertionError):
+            code, out, err = forward(['list'], cwd=os.path.abspath(vault))
+        self.assertEqual((0, './a.md: A\n./b.md: B\n'), (code, out), err)
+
+
+if __name__ == '__main__':
+    unittest.main()
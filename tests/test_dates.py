@@ -0,0 +1,90 @@
+import os
+import unittest
+from datetime import date, datetime, timedelta
+from unittest import mock
+
+from superdate import parse_date
+
+import master.util.dates
+from master.util.dates import DateResolver
+
+
+resources = '{}/resources'.format(os.path.dirname(__file__))
+dates_path = f'{resources}/test_dates.json'
+
+
+class TestDates(unittest.TestCase):
+
+    def test_same_as_superdate(self):
+        """ Strings resolve to what superdate parses them as.
+        """
+        resolver = DateResolver()
+        for s in ['2022-11-01', '2022-11-01 09:00', '2022-11-01, Tue, 09:00', 'tomorrow', 'next thursday 4pm']:
+            self.assertEqual(parse_date(s), resolver.date(s), s)
+            self.assertEqual(parse_date(s), resolver.date(s), s)
+
+        self.assertEqual(timedelta(hours=4, minutes=30), resolver.duration('4h 30m'))
+        self.assertEqual(timedelta(minutes=40), resolver.duration('40min'))
+
+        with self.assertRaises(ValueError):
+            resolver.date('not a date')
+
+    def test_memoized(self):
+        """ Strings are parsed once, unless they depend on the time of day.
+        """
+        resolver = DateResolver()
+        for s in ['2022-11-01', 'tomorrow', 'in 2 hours']:
+            resolver.date(s)
+        resolver.duration('4h 30m')
+
+        with mock.patch.object(master.util.dates, 'parse_date', side_effect=AssertionError):
+            self.assertEqual(date(2022, 11, 1), resolver.date('2022-11-01'))
+            self.assertEqual(date.today() + timedelta(days=1), resolver.date('tomorrow'))
+            self.assertEqual(timedelta(hours=4, minutes=30), resolver.duration('4h 30m'))
+            with self.assertRaises(AssertionError):
+                resolver.date('in 2 hours')
+
+        self.assertIsInstance(resolver.date('in 2 hours'), datetime)
+
+    def test_bounded(self):
+        """ The least recently used strings are forgotten first.
+        """
+        resolver = DateResolver(maxsize=2)
+        resolver.date('2022-11-01')
+        resolver.date('2022-11-02')
+        resolver.date('2022-11-01')
+        resolver.date('2022-11-03')
+
+        self.assertEqual(2, len(resolver))
+        with mock.patch.object(master.util.dates, 'parse_date', side_effect=AssertionError):
+            resolver.date('2022-11-01')
+            with self.assertRaises(AssertionError):
+                resolver.date('2022-11-02')
+
+    def test_persist(self):
+        """ Saved strings are reused by other resolvers.
+        """
+        resolver = DateResolver()
+        resolver.date('2022-11-01, Tue, 09:00')
+        resolver.date('tomorrow')
+        resolver.date('now')
+        resolver.duration('4h 30m')
+
+        try:
+            resolver.save(dates_path)
+            loaded = DateResolver()
+            loaded.load(dates_path)
+            self.assertEqual(3, len(loaded))
+
+            with mock.patch.object(master.util.dates, 'parse_date', side_effect=AssertionError):
+                self.assertEqual(datetime(2022, 11, 1, 9), loaded.date('2022-11-01, Tue, 09:00'))
+                self.assertEqual(date.today() + timedelta(days=1), loaded.date('tomorrow'))
+                self.assertEqual(timedelta(hours=4, minutes=30), loaded.duration('4h 30m'))
+
+        finally:
+            if os.path.exists(dates_path):
+                os.remove(dates_path)
+
+
+if __name__ == '__main__':
+    unittest.main()
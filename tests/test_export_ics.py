@@ -0,0 +1,113 @@
+import io
+import os
+import shutil
+import time
+import unittest
+from datetime import date
+from unittest import mock
+
+import icalendar
+import libzet
+
+from master.cli.export_ics.main import export_base, write_calendar
+import master.util.load
+from master.util.cache import EventCache
+from master.util.dates import resolve_date
+from master.util.load import load_zettels
+
+
+resources = '{}/resources'.format(os.path.dirname(__file__))
+vault = f'{resources}/test_export'
+cache_path = f'{resources}/test_events.sqlite'
+
+
+def _write(path, text, age=60):
+    with open(path, 'w') as f:
+        f.write(text)
+
+    t = time.time() - age
+    os.utime(path, (t, t))
+
+
+class TestExportIcs(unittest.TestCase):
+
+    def setUp(self):
+        os.makedirs(vault)
+        with open(f'{vault}/ztemplate.yaml', 'w') as f:
+            f.write('zettel_format: md\n')
+
+        _write(f'{vault}/standup.md', (
+            '# Standup\n<!--- attributes --->\n'
+            'event_begin: 2022-11-01 09:00\nduration: 15m\nrecurring: FREQ=DAILY\n'))
+        _write(f'{vault}/dentist.md', '# Dentist\n<!--- attributes --->\nevent_begin: 2022-11-03\n')
+        _write(f'{vault}/notes.md', '# Notes\n<!--- attributes --->\nstage: todo\n')
+
+    def tearDown(self):
+        shutil.rmtree(vault)
+        if os.path.exists(cache_path):
+            os.remove(cache_path)
+
+    def _export(self):
+        out = io.BytesIO()
+        cache = EventCache(export_base(vault), cache_path)
+        counts = write_calendar(load_zettels(vault, lazy=True), out, export_base(vault), cache)
+        cache.close()
+
+        cal = icalendar.Calendar.from_ical(out.getvalue())
+        events = {str(e['SUMMARY']): e for e in cal.walk('VEVENT')}
+        return counts, events
+
+    def test_export(self):
+        """ Every event is exported once, with an exact duration.
+        """
+        (exported, serialized), events = self._export()
+        self.assertEqual((2, 2), (exported, serialized))
+        self.assertEqual(['Dentist', 'Standup'], sorted(events))
+        self.assertEqual(15 * 60, events['Standup']['DURATION'].dt.total_seconds())
+
+    def test_incremental(self):
+        """ Only changed zettels are serialized again, and keep their UIDs.
+        """
+        _, first = self._export()
+
+        with mock.patch.object(libzet.Zettel, 'asIcsEvent', side_effect=AssertionError):
+            (exported, serialized), _ = self._export()
+        self.assertEqual((2, 0), (exported, serialized))
+
+        # Touched zettels keep their SEQUENCE, changed ones bump it.
+        _write(f'{vault}/dentist.md', '# Dentist\n<!--- attributes --->\nevent_begin: 2022-11-03\n', age=30)
+        _write(f'{vault}/standup.md', (
+            '# Standup\n<!--- attributes --->\n'
+            'event_begin: 2022-11-01 09:30\nduration: 15m\nrecurring: FREQ=DAILY\n'), age=30)
+        (exported, serialized), changed = self._export()
+        self.assertEqual((2, 2), (exported, serialized))
+
+        for name in first:
+            self.assertEqual(first[name]['UID'], changed[name]['UID'])
+        self.assertEqual(0, changed['Dentist']['SEQUENCE'])
+        self.assertEqual(1, changed['Standup']['SEQUENCE'])
+
+        # Removed events are dropped.
+        os.remove(f'{vault}/dentist.md')
+        _, events = self._export()
+        self.assertEqual(['Standup'], sorted(events))
+
+    def test_relative_dates(self):
+        """ Events with relative dates are serialized again once those resolve to another day.
+        """
+        _write(f'{vault}/call.md', '# Call\n<!--- attributes --->\ndue_date: tomorrow\n')
+        self._export()
+
+        def tomorrow_changed(s):
+            return date(2000, 1, 1) if s == 'tomorrow' else resolve_date(s)
+
+        # As if the day changed.
+        with mock.patch.object(master.util.load, 'resolve_date', side_effect=tomorrow_changed):
+            (exported, serialized), events = self._export()
+        self.assertEqual((3, 1), (exported, serialized))
+        self.assertEqual(date(2000, 1, 1), events['Call']['DTSTART'].dt)
+        self.assertEqual(1, events['Call']['SEQUENCE'])
+
+
+if __name__ == '__main__':
+    unittest.main()
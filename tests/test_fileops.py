@@ -0,0 +1,213 @@
+import errno
+import os
+import re
+import shutil
+import unittest
+from argparse import Namespace
+from unittest import mock
+
+from master.util import fileops
+from master.util.fileops import (
+    Journal, clone_file, copy_all, plan_copy, plan_move, plan_remove, resume, rollback, run, run_command)
+
+
+resources = '{}/resources'.format(os.path.dirname(__file__))
+tree = f'{resources}/test_fileops'
+
+
+def _files(d):
+    return sorted(os.path.relpath(os.path.join(root, n), d) for root, _, names in os.walk(d) for n in names)
+
+
+def _exdev(src, dst):
+    raise OSError(errno.EXDEV, 'Invalid cross-device link')
+
+
+class TestFileOps(unittest.TestCase):
+
+    def setUp(self):
+        os.makedirs(f'{tree}/src/sub')
+        os.makedirs(f'{tree}/dst')
+        for name in ['a.md', 'b.md', 'sub/c.md']:
+            with open(f'{tree}/src/{name}', 'w') as f:
+                f.write(f'# {name}\n')
+
+        env = mock.patch.dict(os.environ, {'XDG_CACHE_HOME': f'{tree}/cache'})
+        env.start()
+        self.addCleanup(env.stop)
+
+    def tearDown(self):
+        shutil.rmtree(tree)
+
+    def test_move(self):
+        run(plan_move([f'{tree}/src/a.md', f'{tree}/src/sub'], f'{tree}/dst'))
+        self.assertEqual(['a.md', 'sub/c.md'], _files(f'{tree}/dst'))
+        self.assertEqual(['b.md'], _files(f'{tree}/src'))
+
+        run(plan_move([f'{tree}/src/b.md'], f'{tree}/dst/renamed.md'))
+        self.assertEqual(['a.md', 'renamed.md', 'sub/c.md'], _files(f'{tree}/dst'))
+        self.assertEqual([], os.listdir(f'{tree}/cache/master/journal'))
+
+    def test_plan(self):
+        self.assertRaises(ValueError, plan_move, [f'{tree}/src/a.md', f'{tree}/src/b.md'], f'{tree}/x.md')
+        self.assertRaises(ValueError, plan_move, [f'{tree}/src/a.md'], f'{tree}/src/b.md')
+        self.assertRaises(ValueError, plan_move, [f'{tree}/src'], f'{tree}/src/sub')
+        self.assertRaises(ValueError, plan_move, [f'{tree}/nope.md'], f'{tree}/dst')
+        self.assertRaises(ValueError, plan_remove, [f'{tree}/src/sub'])
+
+    def test_cross_device(self):
+        """ Directories are copied file by file across filesystems.
+        """
+        with mock.patch.object(fileops, '_same_device', return_value=False), \
+                mock.patch.object(fileops.os, 'rename', _exdev):
+            run(plan_move([f'{tree}/src'], f'{tree}/dst'), jobs=2)
+
+        self.assertEqual(['src/a.md', 'src/b.md', 'src/sub/c.md'], _files(f'{tree}/dst'))
+        self.assertFalse(os.path.exists(f'{tree}/src'))
+
+    def test_resume(self):
+        copy = fileops._copy
+
+        def flaky(src, dst):
+            if src.endswith('b.md'):
+                raise OSError(errno.EIO, 'Interrupted')
+            copy(src, dst)
+
+        batch = plan_move([f'{tree}/src/a.md', f'{tree}/src/b.md'], f'{tree}/dst')
+        with mock.patch.object(fileops.os, 'rename', _exdev), mock.patch.object(fileops, '_copy', flaky):
+            self.assertRaises(OSError, run, batch, 1)
+
+        pending = Journal.pending('mv')
+        self.assertEqual([batch.moves], [j.batch.moves for j in pending])
+        pending[0].close()
+        self.assertEqual(['b.md', 'sub/c.md'], _files(f'{tree}/src'))
+
+        self.assertEqual(1, resume('mv'))
+        self.assertEqual(['a.md', 'b.md'], _files(f'{tree}/dst'))
+        self.assertEqual([], Journal.pending('mv'))
+
+    def test_rollback(self):
+        move = fileops._move
+
+        def interrupted(src, dst, copies):
+            if src.endswith('b.md'):
+                raise KeyboardInterrupt
+            move(src, dst, copies)
+
+        batch = plan_move([f'{tree}/src/a.md', f'{tree}/src/b.md'], f'{tree}/dst')
+        with mock.patch.object(fileops, '_move', interrupted):
+            self.assertRaises(KeyboardInterrupt, run, batch)
+
+        self.assertEqual(['a.md'], _files(f'{tree}/dst'))
+        self.assertEqual(1, rollback('mv'))
+        self.assertEqual([], _files(f'{tree}/dst'))
+        self.assertEqual(['a.md', 'b.md', 'sub/c.md'], _files(f'{tree}/src'))
+
+    def test_vaults(self):
+        """ Interrupted batches are journaled in their vault, and only get in that vault's way.
+        """
+        for v in ['v1', 'v2']:
+            os.makedirs(f'{tree}/{v}/.master')
+            for name in ['a.md', 'b.md']:
+                shutil.copy(f'{tree}/src/{name}', f'{tree}/{v}/{name}')
+
+        batch = plan_move([f'{tree}/v1/a.md'], f'{tree}/v1/c.md')
+        with mock.patch.object(fileops, 'rewrite_links', side_effect=KeyboardInterrupt):
+            self.assertRaises(KeyboardInterrupt, run, batch)
+        self.assertEqual(1, len(os.listdir(f'{tree}/v1/.master/journal')))
+
+        def mv(*paths, **kwargs):
+            args = Namespace(zettels=list(paths[:-1]), dest=paths[-1] if paths else None, jobs=1, resume=False,
+                             rollback=False)
+            vars(args).update(kwargs)
+            with mock.patch('sys.stdout'):
+                run_command('mv', args, lambda args: plan_move(args.zettels, args.dest))
+
+        mv(f'{tree}/v2/a.md', f'{tree}/v2/c.md')
+        self.assertRaises(SystemExit, mv, f'{tree}/v1/b.md', f'{tree}/v1/d.md')
+        self.assertRaises(SystemExit, mv, f'{tree}/v1/b.md', rollback=True)
+
+        self.assertEqual(0, rollback('mv', where=f'{tree}/v2'))
+        self.assertEqual(1, rollback('mv', where=f'{tree}/v1'))
+        self.assertEqual(['a.md', 'b.md'], _files(f'{tree}/v1'))
+
+    def test_remove(self):
+        batch = plan_remove([f'{tree}/src/a.md', f'{tree}/src/sub/c.md'])
+        with mock.patch.object(fileops, '_remove', side_effect=OSError):
+            self.assertRaises(OSError, run, batch)
+
+        # Removed files are hidden until the batch is done.
+        self.assertEqual(['b.md'], [n for n in os.listdir(f'{tree}/src') if n.endswith('.md')])
+        self.assertEqual(1, rollback('rm'))
+        self.assertEqual(['a.md', 'b.md', 'sub/c.md'], _files(f'{tree}/src'))
+
+        run(plan_remove([f'{tree}/src/a.md']))
+        self.assertEqual(['b.md', 'sub/c.md'], _files(f'{tree}/src'))
+
+    def test_clone(self):
+        """ Only titles that are the old ID are rewritten.
+        """
+        with open(f'{tree}/src/T-1.md', 'w') as f:
+            f.write('\n# T-1\n## Notes\n' + 'x' * 10000 + '\n<!--- attributes --->\nstage: todo\n')
+        with open(f'{tree}/src/T-2.rst', 'w') as f:
+            f.write('=====\n T-2\n=====\n\nNotes\n<!--- attributes --->\n')
+
+        clone_file(f'{tree}/src/T-1.md', f'{tree}/dst/T-7.md', ('T-1', 'T-7'))
+        with open(f'{tree}/dst/T-7.md') as f:
+            self.assertEqual('\n# T-7\n## Notes\n' + 'x' * 10000 + '\n<!--- attributes --->\nstage: todo\n', f.read())
+
+        clone_file(f'{tree}/src/T-2.rst', f'{tree}/dst/T-10.rst', ('T-2', 'T-10'), 'rst')
+        with open(f'{tree}/dst/T-10.rst') as f:
+            self.assertEqual('======\n T-10\n======\n\nNotes\n<!--- attributes --->\n', f.read())
+
+        # Kernel copies fall back to sendfile.
+        with mock.patch.object(fileops.os, 'copy_file_range', side_effect=OSError(errno.EXDEV, 'No')):
+            clone_file(f'{tree}/src/a.md', f'{tree}/dst/a.md', ('B', 'C'))
+        with open(f'{tree}/dst/a.md') as f:
+            self.assertEqual('# a.md\n', f.read())
+
+    def test_copy(self):
+        """ Only tasks get new IDs, in whichever directory they're copied to.
+        """
+        with open(f'{tree}/src/T-1.md', 'w') as f:
+            f.write('# T-1\n')
+        with open(f'{tree}/src/sub/T-2.md', 'w') as f:
+            f.write('# T-2\n')
+
+        reserved = []
+
+        def ids(d, count):
+            start = 5 + sum(n for _, n in reserved)
+            reserved.append((os.path.relpath(d, tree), count))
+            out = [(f'T-{i}', f'{d}/T-{i}.md') for i in range(start, start + count)]
+            for _, path in out:
+                open(path, 'w').close()
+            return out
+
+        task_re = re.compile(r'T-\d+')
+        sources = [f'{tree}/src/T-1.md', f'{tree}/src/a.md', f'{tree}/src/sub']
+        mkdirs, copies = plan_copy(sources, f'{tree}/dst', ids, task_re)
+        self.assertEqual([('dst', 1), ('dst/sub', 1)], reserved)
+        self.assertEqual(6 + 7 + 11 + 6, copy_all(mkdirs, copies, jobs=2))
+        self.assertEqual(['T-5.md', 'a.md', 'sub/T-6.md', 'sub/c.md'], _files(f'{tree}/dst'))
+        with open(f'{tree}/dst/T-5.md') as f:
+            self.assertEqual('# T-5\n', f.read())
+        with open(f'{tree}/dst/sub/T-6.md') as f:
+            self.assertEqual('# T-6\n', f.read())
+        with open(f'{tree}/dst/a.md') as f:
+            self.assertEqual('# a.md\n', f.read())
+
+        self.assertRaises(ValueError, plan_copy, [f'{tree}/src/sub'], f'{tree}/dst')
+        self.assertRaises(ValueError, plan_copy, [f'{tree}/src'], f'{tree}/src/sub')
+
+        # Files reserved for tasks that couldn't be copied are removed.
+        shutil.rmtree(f'{tree}/dst')
+        os.makedirs(f'{tree}/dst')
+        mkdirs, copies = plan_copy([f'{tree}/src/T-1.md'], f'{tree}/dst', ids, task_re)
+        with mock.patch.object(fileops, 'clone_file', side_effect=OSError(errno.ENOSPC, 'No space')):
+            self.assertRaises(OSError, copy_all, mkdirs, copies)
+        self.assertEqual([], _files(f'{tree}/dst'))
+
+
+if __name__ == '__main__':
+    unittest.main()
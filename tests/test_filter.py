@@ -0,0 +1,59 @@
+import unittest
+from datetime import date
+
+from libzet import Zettel
+
+from master.util.filter import compile_filter
+
+
+class TestFilter(unittest.TestCase):
+
+    def setUp(self):
+        self.z = Zettel('Inbox', {}, {
+            'stage': 'todo',
+            'assignee': 'kim',
+            'tags': ['urgent'],
+            'due_date': date(2022, 10, 30),
+        })
+
+    def test_names_are_attributes(self):
+        """ Bare names and z.attrs subscripts look up attributes.
+        """
+        self.assertTrue(compile_filter('stage == "todo" and assignee == "kim"')(self.z))
+        self.assertTrue(compile_filter('z.attrs["stage"] != "closed"')(self.z))
+        self.assertTrue(compile_filter('"urgent" in tags')(self.z))
+        self.assertTrue(compile_filter('z.title == "Inbox"')(self.z))
+        self.assertFalse(compile_filter('stage in ("review", "closed")')(self.z))
+
+    def test_missing_attributes(self):
+        """ Missing attributes never match comparisons.
+        """
+        self.assertFalse(compile_filter('sprint == 3')(self.z))
+        self.assertFalse(compile_filter('sprint < 3')(self.z))
+        self.assertFalse(compile_filter('z.attrs["sprint"] > 3')(self.z))
+
+    def test_date_literals(self):
+        """ Dates can be compared against date literals.
+        """
+        self.assertTrue(compile_filter('due_date < 2022-11-01')(self.z))
+        self.assertFalse(compile_filter('due_date >= 2022-11-01')(self.z))
+        self.assertTrue(compile_filter('stage != "2022-11-01"')(self.z))
+
+    def test_rejected(self):
+        """ Anything but comparisons, logic, attributes and literals is rejected.
+        """
+        for expr in [
+                'open("x")',
+                '__import__("os")',
+                'z.__class__',
+                '[x for x in tags]',
+                'lambda: 1',
+                'tags[stage]',
+                'stage ==',
+                'due_date < 2022-13-01']:
+            with self.assertRaises(ValueError, msg=expr):
+                compile_filter(expr)
+
+
+if __name__ == '__main__':
+    unittest.main()
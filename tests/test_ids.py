@@ -0,0 +1,117 @@
+import os
+import shutil
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from unittest import mock
+
+import master.Project
+from master.Project import Project
+from master.util.ids import allocate_id, allocate_ids
+from master.util.layout import shard_depth, shard_dir, task_prefix
+
+
+resources = '{}/resources'.format(os.path.dirname(__file__))
+tasks = f'{resources}/test_ids'
+
+
+def _allocate(_):
+    return allocate_id(tasks, 'TP')[0]
+
+
+class TestIds(unittest.TestCase):
+
+    def setUp(self):
+        os.mkdir(tasks)
+
+    def tearDown(self):
+        if os.path.exists(tasks):
+            shutil.rmtree(tasks)
+
+    def test_sequential(self):
+        """ IDs count up from 1 and their files are reserved.
+        """
+        self.assertEqual((1, f'{tasks}/TP-1.md'), allocate_id(tasks, 'TP'))
+        self.assertEqual([2, 3], [x[0] for x in allocate_ids(tasks, 'TP', count=2)])
+        self.assertTrue(os.path.exists(f'{tasks}/TP-3.md'))
+
+        with open(f'{tasks}/.master/ids/TP') as f:
+            self.assertEqual('3', f.read().strip())
+
+    def test_rebuild_counter(self):
+        """ A missing counter is rebuilt from the highest existing ID.
+        """
+        for name in ['TP-2.md', 'TP-10.md', 'TP-11.rst', 'XX-50.md']:
+            open(f'{tasks}/{name}', 'w').close()
+
+        self.assertEqual(11, allocate_id(tasks, 'TP')[0])
+
+    def test_existing_files_skipped(self):
+        """ Files created behind the counter's back are never reused.
+        """
+        allocate_id(tasks, 'TP')
+        open(f'{tasks}/TP-2.md', 'w').close()
+
+        self.assertEqual(3, allocate_id(tasks, 'TP')[0])
+
+    def test_sharded_rebuild(self):
+        """ Rebuilding the counter of a sharded project scans every shard.
+        """
+        settings = {'task_prefix': 'TP', 'task_shard': '%Y/%m/'}
+        old = shard_dir(tasks, settings, date(2021, 3, 4))
+        new = shard_dir(tasks, settings, date(2022, 7, 28))
+        self.assertEqual(f'{tasks}/2022/07', new)
+        self.assertEqual(2, shard_depth(settings))
+
+        os.makedirs(old)
+        open(f'{old}/TP-7.md', 'w').close()
+        os.makedirs(new)
+
+        self.assertEqual((8, f'{new}/TP-8.md'), allocate_id(tasks, 'TP', dest=new, depth=2))
+
+    def test_date_prefix(self):
+        """ The __date prefix is the task's creation date.
+        """
+        settings = {'task_prefix': '__date'}
+        self.assertEqual('2022-07-28', task_prefix(settings, date(2022, 7, 28)))
+        self.assertEqual('TP', task_prefix({'task_prefix': 'TP'}))
+        self.assertIsNone(task_prefix({}))
+
+        self.assertEqual(1, allocate_id(tasks, '2022-07-28')[0])
+        self.assertEqual(2, allocate_id(tasks, '2022-07-28')[0])
+
+    def test_create_task(self):
+        """ New tasks are written over their reserved files, which are never removed.
+        """
+        with open(f'{tasks}/ztemplate.yaml', 'w') as f:
+            f.write('task_prefix: TP\nheadings: [Notes]\nattrs:\n  stage: todo\n')
+
+        remove = os.remove
+
+        def keep_tasks(path):
+            self.assertFalse(path.startswith(tasks), path)
+            remove(path)
+
+        project = Project.loadFromDisk(tasks, load_tasks=False)
+        with mock.patch.dict(os.environ, {'EDITOR': 'true'}), \
+                mock.patch.object(master.Project.os, 'remove', side_effect=keep_tasks):
+            z = project.createTask(tasks, '')
+
+        self.assertEqual(f'{tasks}/TP-1.md', z.attrs['_loadpath'])
+        with open(f'{tasks}/TP-1.md') as f:
+            text = f.read()
+        self.assertTrue(text.startswith('# TP-1\n'), text)
+        self.assertIn('## Notes', text)
+        self.assertIn('stage: todo', text)
+
+    def test_concurrent(self):
+        """ Concurrent allocations never share an ID.
+        """
+        with ProcessPoolExecutor(4) as pool:
+            ids = list(pool.map(_allocate, range(40)))
+
+        self.assertEqual(list(range(1, 41)), sorted(ids))
+
+
+if __name__ == '__main__':
+    unittest.main()
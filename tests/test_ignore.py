@@ -0,0 +1,66 @@
+import os
+import shutil
+import unittest
+from unittest import mock
+
+from master.util.ignore import Ignore, parse_ignore
+from master.util.load import load_zettels
+
+
+resources = '{}/resources'.format(os.path.dirname(__file__))
+vault = f'{resources}/test_ignored'
+
+
+def _write(path, text='# Zettel\n<!--- attributes --->\nstage: todo\n'):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(text)
+
+
+class TestIgnore(unittest.TestCase):
+
+    def setUp(self):
+        os.makedirs(f'{vault}/.master')
+        _write(f'{vault}/.masterignore', '# attachments\nattachments/\n/build\n*.draft.md\n!keep.draft.md\n')
+        for name in ['a.md', 'x.draft.md', 'keep.draft.md', 'attachments/c.md', 'build/d.md',
+                     'notes/build/e.md', 'notes/f.md', 'notes/g.md', '.git/h.md']:
+            _write(f'{vault}/{name}')
+        _write(f'{vault}/notes/.masterignore', 'g.md\n')
+
+    def tearDown(self):
+        shutil.rmtree(vault)
+
+    def test_patterns(self):
+        ignore = Ignore(tuple(parse_ignore(['docs/**/*.pdf', 'tmp?', '[!a]*.md', '\\#x'])))
+        self.assertTrue(ignore.ignored('docs/a/b/c.pdf'))
+        self.assertTrue(ignore.ignored('docs/c.pdf'))
+        self.assertFalse(ignore.ignored('other/docs/c.pdf'))
+        self.assertTrue(ignore.child('deep').ignored('tmp1', True))
+        self.assertTrue(ignore.ignored('b.md'))
+        self.assertFalse(ignore.ignored('a.md'))
+        self.assertTrue(ignore.ignored('#x'))
+
+    def test_walk(self):
+        """ Ignored zettels aren't loaded, and ignored directories aren't entered.
+        """
+        scanned = []
+        scandir = os.scandir
+
+        def spy(path):
+            scanned.append(os.path.relpath(path, vault))
+            return scandir(path)
+
+        with mock.patch('os.scandir', spy):
+            zettels = load_zettels(vault, recurse=True, index=False)
+
+        loaded = sorted(os.path.relpath(z.attrs['_loadpath'], vault) for z in zettels)
+        self.assertEqual(['a.md', 'keep.draft.md', 'notes/build/e.md', 'notes/f.md'], loaded)
+        self.assertEqual(['.', 'notes', 'notes/build'], scanned)
+
+        # Rules of parent directories apply too.
+        loaded = sorted(os.path.relpath(z.attrs['_loadpath'], vault) for z in load_zettels(f'{vault}/notes'))
+        self.assertEqual(['notes/f.md'], loaded)
+
+
+if __name__ == '__main__':
+    unittest.main()
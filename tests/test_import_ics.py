@@ -0,0 +1,93 @@
+import io
+import os
+import shutil
+import unittest
+from datetime import date, datetime
+
+from master.Project import Project
+from master.cli.import_ics.main import import_events
+from master.cli.todo.main import extract_events
+from master.configs.calendar import calendar
+from master.util.ics import iter_events, parse_value_duration, unescape
+from master.util.load import load_zettels
+
+
+resources = '{}/resources'.format(os.path.dirname(__file__))
+project = f'{resources}/test_import'
+
+ics = '''\
+BEGIN:VCALENDAR\r
+VERSION:2.0\r
+BEGIN:VEVENT\r
+UID:standup@example.com\r
+SUMMARY:Stand\r
+ up\r
+DTSTART;TZID="Not/AZone":20221101T090000\r
+DURATION:PT15M\r
+RRULE:FREQ=DAILY;UNTIL=20221103\r
+BEGIN:VALARM\r
+SUMMARY:Alarm\r
+END:VALARM\r
+END:VEVENT\r
+BEGIN:VEVENT\r
+SUMMARY:Trip\\, with notes\r
+DESCRIPTION:Pack\\nbags\r
+DTSTART;VALUE=DATE:20221102\r
+DTEND;VALUE=DATE:20221104\r
+END:VEVENT\r
+BEGIN:VEVENT\r
+SUMMARY:Moved standup\r
+RECURRENCE-ID:20221102T090000\r
+DTSTART:20221102T100000\r
+END:VEVENT\r
+BEGIN:VEVENT\r
+SUMMARY:Broken\r
+DTSTART:yesterday\r
+END:VEVENT\r
+END:VCALENDAR\r
+'''
+
+
+class TestImportIcs(unittest.TestCase):
+
+    def setUp(self):
+        Project.initOnDisk(project, calendar)
+
+    def tearDown(self):
+        shutil.rmtree(project)
+
+    def test_parse(self):
+        """ Events are read with their folded lines joined and nested components skipped.
+        """
+        events = list(iter_events(io.StringIO(ics)))
+        self.assertEqual(4, len(events))
+        self.assertEqual('Standup', events[0]['SUMMARY'][1])
+        self.assertEqual({'TZID': 'Not/AZone'}, events[0]['DTSTART'][0])
+        self.assertEqual('Trip, with notes', unescape(events[1]['SUMMARY'][1]))
+        self.assertEqual(-90 * 60, parse_value_duration('-PT1H30M').total_seconds())
+
+    def test_import(self):
+        """ Events become zettels of the calendar template, in batches.
+        """
+        p = Project.loadFromDisk(project, load_tasks=False)
+        self.assertEqual((2, 2), import_events(io.StringIO(ics), p, project, batch_size=1))
+        self.assertEqual(['.master', 'TI-1.md', 'TI-2.md', 'ztemplate.yaml'], sorted(os.listdir(project)))
+
+        zettels = {z.title: z for z in load_zettels(project, index=False)}
+        standup = zettels['Standup'].attrs
+        self.assertEqual(datetime(2022, 11, 1, 9), standup['event_begin'])
+        self.assertEqual('15m', standup['duration'])
+        self.assertEqual('FREQ=DAILY', standup['recurring'])
+        self.assertEqual(date(2022, 11, 3), standup['recurring_stop'])
+        self.assertEqual('standup@example.com', standup['uid'])
+        self.assertEqual('test_import', standup['project_name'])
+        self.assertEqual('Pack\nbags', zettels['Trip, with notes'].headings['_notes'].strip())
+
+        # The recurrence stops where the calendar said it would.
+        general, specific = extract_events(list(zettels.values()), date(2022, 11, 1), date(2022, 11, 8))
+        self.assertEqual(3, len(specific))
+        self.assertEqual([('Trip, with notes', date(2022, 11, 2), date(2022, 11, 4))], general)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import os
+import shutil
+import unittest
+from unittest import mock
+
+from master.util.fileops import plan_move, rollback, run
+from master.util.links import LinkIndex, find_links, invert_edits, plan_link_edits, rewrite_links
+
+
+resources = '{}/resources'.format(os.path.dirname(__file__))
+vault = f'{resources}/test_links'
+
+
+def _read(path):
+    with open(f'{vault}/{path}') as f:
+        return f.read()
+
+
+def _write(path, text):
+    with open(f'{vault}/{path}', 'w') as f:
+        f.write(text)
+
+
+def _mv(sources, dest):
+    batch = plan_move([f'{vault}/{s}' for s in sources], f'{vault}/{dest}')
+    batch.links = plan_link_edits(batch.moves)
+    run(batch)
+
+
+class TestLinks(unittest.TestCase):
+
+    def setUp(self):
+        os.makedirs(f'{vault}/.master')
+        os.makedirs(f'{vault}/a/img')
+        os.makedirs(f'{vault}/b')
+        _write('a/a.md', '# A\n[b](../b/b.md#top) ![p](img/p.png) [web](https://example.com/b.md)\n')
+        _write('b/b.md', '# B\n[a](../a/a.md) [anchor](#x) [c](<../c d.md>)\n')
+        _write('c d.md', '# C\n[b](b/b.md)\n')
+        _write('a/img/p.png', '')
+
+        env = mock.patch.dict(os.environ, {'XDG_CACHE_HOME': f'{vault}/.cache'})
+        env.start()
+        self.addCleanup(env.stop)
+
+    def tearDown(self):
+        shutil.rmtree(vault)
+
+    def test_find(self):
+        data = b'[x](y.md#a) ![i](<a b.png>) [u](http://x/y.md) [z](#a)\n`r <s.rst>`_'
+        self.assertEqual([(4, 8, 'y.md'), (18, 25, 'a b.png')], find_links(data))
+        self.assertEqual([(data.index(b'<s') + 1, data.index(b'>`'), 's.rst')], find_links(data, 'rst'))
+
+    def test_refresh(self):
+        # Recently modified files are scanned again.
+        for path in ['a/a.md', 'b/b.md', 'c d.md']:
+            os.utime(f'{vault}/{path}', (0, 0))
+
+        index = LinkIndex(vault)
+        self.assertEqual(3, index.refresh())
+        self.assertEqual(0, index.refresh())
+        self.assertEqual({'a/a.md', 'c d.md'}, {r[0] for r in index.links_to(['b/b.md'])})
+        self.assertEqual({'a/a.md', 'b/b.md'}, {r[0] for r in index.links_to([], ['a'])})
+        index.close()
+
+    def test_move(self):
+        _mv(['b/b.md'], 'a')
+        self.assertEqual('# A\n[b](b.md#top) ![p](img/p.png) [web](https://example.com/b.md)\n', _read('a/a.md'))
+        self.assertEqual('# B\n[a](a.md) [anchor](#x) [c](<../c d.md>)\n', _read('a/b.md'))
+        self.assertEqual('# C\n[b](a/b.md)\n', _read('c d.md'))
+
+        # Links into moved directories follow them.
+        _mv(['a'], 'b')
+        self.assertEqual('# C\n[b](b/a/b.md)\n', _read('c d.md'))
+        self.assertEqual('# B\n[a](a.md) [anchor](#x) [c](<../../c d.md>)\n', _read('b/a/b.md'))
+
+    def test_move_linked_dir(self):
+        """ Links to a moved directory itself follow it too.
+        """
+        _write('c d.md', '# C\n![x](a/) [img](a/img) [a](a)\n')
+        _mv(['a'], 'a2')
+        self.assertEqual('# C\n![x](a2/) [img](a2/img) [a](a2)\n', _read('c d.md'))
+
+    def test_rollback(self):
+        batch = plan_move([f'{vault}/b/b.md'], f'{vault}/a')
+        batch.links = plan_link_edits(batch.moves)
+        with mock.patch('master.util.fileops.os.rmdir', side_effect=KeyboardInterrupt):
+            batch.rmdirs = [f'{vault}/b']
+            self.assertRaises(KeyboardInterrupt, run, batch)
+
+        self.assertEqual('# C\n[b](a/b.md)\n', _read('c d.md'))
+        self.assertEqual(1, rollback('mv', where=vault))
+        self.assertEqual('# C\n[b](b/b.md)\n', _read('c d.md'))
+        self.assertEqual('# A\n[b](../b/b.md#top) ![p](img/p.png) [web](https://example.com/b.md)\n', _read('a/a.md'))
+
+    def test_rewrite(self):
+        edits = [(4, 5, 'a', 'long'), (7, 8, 'b', '')]
+        _write('x.md', '# X\na, b, c\n')
+        self.assertEqual([f'{vault}/x.md'], rewrite_links([(f'{vault}/x.md', edits)]))
+        self.assertEqual('# X\nlong, , c\n', _read('x.md'))
+
+        # Edits already applied are skipped.
+        self.assertEqual([], rewrite_links([(f'{vault}/x.md', edits)]))
+        rewrite_links([(f'{vault}/x.md', invert_edits(edits))])
+        self.assertEqual('# X\na, b, c\n', _read('x.md'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import contextlib
+import io
+import os
+import shutil
+import unittest
+from argparse import Namespace
+from unittest import mock
+
+import master.util.load
+from master.cli.list.main import do_list
+
+
+resources = '{}/resources'.format(os.path.dirname(__file__))
+vault = f'{resources}/test_listed'
+
+
+def _args(**kwargs):
+    args = {'filter': 'True', 'explain': False, 'stream': False, 'sort': None, 'limit': None, 'watch': False,
+            'zettels': [vault], 'jobs': 1}
+    args.update(kwargs)
+    return Namespace(**args)
+
+
+def _list(**kwargs):
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        do_list(_args(**kwargs))
+    return [line.split(': ', 1)[1] for line in out.getvalue().splitlines()]
+
+
+class TestList(unittest.TestCase):
+
+    def setUp(self):
+        os.makedirs(vault)
+        attrs = {'a': 'due_date: 2022-11-03', 'b': 'due_date: 2022-11-01', 'c': '', 'd': 'due_date: 2022-11-02'}
+        for name, a in attrs.items():
+            with open(f'{vault}/{name}.md', 'w') as f:
+                f.write(f'# {name.upper()}\n<!--- attributes --->\nstage: todo\n{a}\n')
+
+    def tearDown(self):
+        shutil.rmtree(vault)
+
+    def test_sort(self):
+        self.assertEqual(['A', 'B', 'C', 'D'], _list())
+        self.assertEqual(['B', 'D', 'A', 'C'], _list(sort='due_date'))
+        self.assertEqual(['B', 'D'], _list(sort='due_date', limit=2))
+        self.assertEqual(['A', 'B'], _list(limit=2, filter='"Notes" not in z.headings'))
+
+    def test_sort_unordered(self):
+        """ Values that can't be compared, like dicts and mixed lists, still sort.
+        """
+        values = {'a': 'meta: {x: 1}', 'b': 'meta: [1, one]', 'c': 'meta: {y: 2}', 'd': 'meta: [two, 2]'}
+        for name, v in values.items():
+            with open(f'{vault}/{name}.md', 'a') as f:
+                f.write(f'{v}\n')
+
+        self.assertEqual(['A', 'C', 'D', 'B'], _list(sort='meta'))
+
+    def test_stream(self):
+        """ Streaming stops loading once the limit is reached.
+        """
+        loaded = []
+        to_zettel = master.util.load.to_zettel
+
+        def spy(record, *args):
+            loaded.append(record[0])
+            return to_zettel(record, *args)
+
+        with mock.patch.object(master.util.load, 'to_zettel', spy):
+            self.assertEqual(['A', 'C'], _list(stream=True, limit=2, filter='z.title != "B"'))
+
+        self.assertEqual(['A', 'B', 'C'], loaded)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,177 @@
+import os
+import shutil
+import time
+import unittest
+from datetime import date
+from unittest import mock
+
+import libzet
+
+from master.util.index import ZettelIndex
+import master.util.load
+from master.util.load import keep_in_memory, load_columns, load_zettels
+
+
+resources = '{}/resources'.format(os.path.dirname(__file__))
+vault = f'{resources}/test_vault'
+
+
+def _age(path, seconds=60):
+    """ Push a file's mtime into the past so the index trusts it.
+    """
+    t = time.time() - seconds
+    os.utime(path, (t, t))
+
+
+def _dump(zettels):
+    return sorted((z.title, z.headings, {k: str(v) for k, v in z.attrs.items()}) for z in zettels)
+
+
+class TestLoad(unittest.TestCase):
+
+    def setUp(self):
+        os.makedirs(f'{vault}/sub')
+        with open(f'{vault}/ztemplate.yaml', 'w') as f:
+            f.write('zettel_format: md\n')
+
+        with open(f'{vault}/a.md', 'w') as f:
+            f.write('# A\n## Notes\ntext\n<!--- attributes --->\ndue_date: today\nstage: todo\n')
+
+        libzet.create_zettel(
+            f'{vault}/sub/b.md', title='B', attrs={'event_begin': '2022-05-04 10:00'}, no_edit=True)
+
+        for path in [f'{vault}/a.md', f'{vault}/sub/b.md']:
+            _age(path)
+
+    def tearDown(self):
+        if os.path.exists(vault):
+            shutil.rmtree(vault)
+
+    def test_same_as_libzet(self):
+        """ Loading should produce the same zettels as libzet.
+        """
+        exp = libzet.load_zettels(vault, recurse=True)
+
+        # Once to fill the index, once to load from it.
+        self.assertEqual(_dump(exp), _dump(load_zettels(vault, recurse=True)))
+        self.assertEqual(_dump(exp), _dump(load_zettels(vault, recurse=True)))
+        self.assertTrue(os.path.exists(f'{vault}/.master/index.sqlite'))
+
+    def test_relative_dates_not_frozen(self):
+        """ The index should keep raw attributes, not resolved dates.
+        """
+        load_zettels(vault)
+        idx = ZettelIndex(vault)
+        row = idx.lookup(['a.md'])['a.md']
+        idx.close()
+
+        self.assertIn('"due_date": "today"', row[5])
+
+    def test_memory_resolves_relative_dates(self):
+        """ Zettels kept in memory shouldn't keep the relative dates of the day they were loaded.
+        """
+        keep_in_memory()
+        try:
+            first = {z.title: z for z in load_zettels(vault, recurse=True)}
+
+            # As if the day changed.
+            with mock.patch.object(master.util.load, 'resolve_date', return_value=date(2000, 1, 1)):
+                second = {z.title: z for z in load_zettels(vault, recurse=True)}
+                columns = {z.title: z for z in load_columns(vault, ['due_date'], recurse=True)}
+        finally:
+            keep_in_memory(False)
+
+        self.assertEqual(date(2000, 1, 1), second['A'].attrs['due_date'])
+        self.assertEqual(date(2000, 1, 1), columns['A'].attrs['due_date'])
+        self.assertIs(first['B'], second['B'])
+
+    def test_changed_files_reparsed(self):
+        """ Modified zettels shouldn't be served stale from the index.
+        """
+        load_zettels(vault, recurse=True)
+
+        with open(f'{vault}/sub/b.md') as f:
+            text = f.read()
+        with open(f'{vault}/sub/b.md', 'w') as f:
+            f.write(text.replace('# B', '# B changed'))
+        _age(f'{vault}/sub/b.md', 30)
+
+        titles = sorted(z.title for z in load_zettels(vault, recurse=True))
+        self.assertEqual(['A', 'B changed'], titles)
+
+    def test_deleted_files_pruned(self):
+        """ Zettels that disappeared should be dropped from the index.
+        """
+        load_zettels(vault, recurse=True)
+        os.remove(f'{vault}/sub/b.md')
+        load_zettels(vault, recurse=True)
+
+        idx = ZettelIndex(vault)
+        self.assertEqual(['a.md'], list(idx.lookup(['a.md', 'sub/b.md'])))
+        idx.close()
+
+    def test_parallel_same_as_serial(self):
+        """ Parsing with a process pool should keep results in order.
+        """
+        for i in range(20):
+            libzet.create_zettel(f'{vault}/sub/n{i}.md', title=f'N{i}', no_edit=True)
+
+        exp = load_zettels(vault, recurse=True, index=False, jobs=1)
+
+        threshold = master.util.load.PARALLEL_THRESHOLD
+        master.util.load.PARALLEL_THRESHOLD = 1
+        try:
+            zettels = load_zettels(vault, recurse=True, index=False, jobs=3)
+        finally:
+            master.util.load.PARALLEL_THRESHOLD = threshold
+
+        self.assertEqual([z.attrs['_loadpath'] for z in exp], [z.attrs['_loadpath'] for z in zettels])
+        self.assertEqual(_dump(exp), _dump(zettels))
+
+    def test_lazy_loading(self):
+        """ Lazy zettels should only read headings when they're accessed.
+        """
+        libzet.create_zettel(
+            f'{vault}/big.md', title='Big', headings={'Body': 'lorem ipsum\n' * 2000},
+            attrs={'stage': 'todo'}, no_edit=True)
+        _age(f'{vault}/big.md')
+
+        exp = load_zettels(vault, index=False)
+        for index in [False, True, True]:
+            zettels = load_zettels(vault, index=index, lazy=True)
+            self.assertTrue(all(z._headings is None for z in zettels if z.title == 'Big'))
+            self.assertEqual(_dump(exp), _dump(zettels))
+
+    def test_sharded_project(self):
+        """ Shards of a project are loaded without recursing, but not its other directories.
+        """
+        with open(f'{vault}/ztemplate.yaml', 'w') as f:
+            f.write('zettel_format: md\ntask_shard: "%Y/%m"\n')
+        for d in ['2022/07', '2022/attachments', 'sub', 'sub/2022/07']:
+            os.makedirs(f'{vault}/{d}', exist_ok=True)
+            with open(f'{vault}/{d}/t.md', 'w') as f:
+                f.write(f'# {d}\n')
+        with open(f'{vault}/sub/ztemplate.yaml', 'w') as f:
+            f.write('zettel_format: md\ntask_shard: "%Y/%m"\n')
+        os.makedirs(f'{vault}/2023')
+        with open(f'{vault}/2023/ztemplate.yaml', 'w') as f:
+            f.write('zettel_format: md\n')
+        with open(f'{vault}/2023/t.md', 'w') as f:
+            f.write('# 2023\n')
+
+        self.assertEqual(['2022/07', 'A'], sorted(z.title for z in load_zettels(vault)))
+        self.assertEqual(['2022/07', '2023', 'A', 'B', 'sub'], sorted(z.title for z in load_zettels(vault, recurse=1)))
+        self.assertEqual(['B', 'sub', 'sub/2022/07'], sorted(z.title for z in load_zettels(f'{vault}/sub')))
+
+    def test_no_index_outside_projects(self):
+        """ Trees that aren't projects shouldn't get an index.
+        """
+        os.remove(f'{vault}/ztemplate.yaml')
+        zettels = load_zettels(f'{vault}/sub')
+
+        self.assertEqual(['B'], [z.title for z in zettels])
+        self.assertFalse(os.path.exists(f'{vault}/.master'))
+
+
+if __name__ == '__main__':
+    unittest.main()
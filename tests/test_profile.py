@@ -0,0 +1,58 @@
+import os
+import tempfile
+import unittest
+
+from master.util import profile
+from master.util.profile import Profiler, phase
+
+
+class TestProfile(unittest.TestCase):
+
+    def tearDown(self):
+        profile.stop()
+
+    def test_off(self):
+        """ Phases cost nothing until profiling starts.
+        """
+        self.assertFalse(profile.enabled())
+        self.assertIs(phase('a'), phase('b'))
+        with phase('a'):
+            with phase('a'):
+                pass
+
+    def test_phases(self):
+        p = Profiler(startup=0.5)
+        with p.phase('outer'):
+            with p.phase('inner'):
+                data = [str(i) for i in range(1000)]
+
+        names = [(name, depth) for name, depth, *_ in p.spans]
+        self.assertEqual([('startup', 0), ('inner', 1), ('outer', 0)], names)
+        _, _, start, seconds, blocks = p.spans[1]
+        self.assertGreaterEqual(start, 0.5)
+        self.assertGreater(blocks, len(data) // 2)
+
+        lines = p.table().splitlines()
+        self.assertEqual(['startup', 'outer', 'inner', 'total'], [line.split()[0] for line in lines[1:]])
+        self.assertTrue(lines[3].startswith('  inner'))
+
+        events = p.trace()['traceEvents']
+        self.assertEqual({'X'}, {e['ph'] for e in events})
+        self.assertEqual((0, 500000), (events[0]['ts'], events[0]['dur']))
+        self.assertNotIn('args', events[0])
+        self.assertIn('blocks', events[1]['args'])
+
+    def test_report(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            p = profile.start(table=False, trace=f'{tmp}/trace.json')
+            self.assertTrue(profile.enabled())
+            with phase('load'):
+                pass
+            self.assertEqual('load', p.spans[-1][0])
+
+            profile._report(p, False, f'{tmp}/trace.json')
+            self.assertTrue(os.path.getsize(f'{tmp}/trace.json'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+import os
+import shutil
+import time
+import unittest
+from datetime import date
+
+from master.util.filter import compile_filter
+from master.util.index import SPAN_MAX, SPAN_MIN, active_span
+from master.util.load import load_zettels
+from master.util.query import ActiveWindow, plan_filter
+
+
+resources = '{}/resources'.format(os.path.dirname(__file__))
+project = f'{resources}/test_query'
+
+TASKS = {
+    'TP-1': 'stage: todo\nassignee: kim\nsprint: 2\ndue_date: 2022-10-30\n',
+    'TP-2': 'stage: review\nassignee: sam\nsprint: 3\ndue_date: 2022-11-05, Sat, 10:00\n',
+    'TP-3': 'stage: todo\nassignee: [kim, sam]\ndue_date: today\n',
+    'TP-4': 'stage: closed\nsprint: 2\n',
+}
+
+
+def _write(name, attrs, age=60):
+    fname = f'{project}/{name}.md'
+    with open(fname, 'w') as f:
+        f.write(f'# {name}\n<!--- attributes --->\n{attrs}')
+
+    t = time.time() - age
+    os.utime(fname, (t, t))
+
+
+def _list(expr, planned=True):
+    f = compile_filter(expr)
+    plan = plan_filter(f) if planned else None
+    return sorted(z.title for z in load_zettels(project, lazy=True, where=plan) if f(z)), plan
+
+
+class TestQuery(unittest.TestCase):
+
+    def setUp(self):
+        os.makedirs(project)
+        with open(f'{project}/ztemplate.yaml', 'w') as f:
+            f.write('zettel_format: md\n')
+
+        for name, attrs in TASKS.items():
+            _write(name, attrs)
+
+        # Fill the index.
+        load_zettels(project)
+
+    def tearDown(self):
+        if os.path.exists(project):
+            shutil.rmtree(project)
+
+    def test_same_as_scan(self):
+        """ Planned filters match the same zettels as scanning.
+        """
+        for expr in [
+                'stage == "todo"',
+                'assignee == "kim"',
+                'stage in ("todo", "review") and sprint >= 2',
+                '2 < sprint',
+                'sprint == 2 or due_date < 2022-11-01',
+                'due_date >= 2022-11-05',
+                'due_date < "2022-11-05 12:00"',
+                'z.attrs["stage"] == "closed" and z.title != "x"']:
+            exp, _ = _list(expr, planned=False)
+            got, plan = _list(expr)
+            self.assertEqual(exp, got, expr)
+            self.assertIsNotNone(plan.root, expr)
+
+    def test_narrowed(self):
+        """ Only candidates from the index are loaded.
+        """
+        titles, plan = _list('stage == "review"')
+        self.assertEqual(['TP-2'], titles)
+        self.assertEqual((4, 4, 3), plan.stats)
+        self.assertIn('index stage == ', plan.explain())
+
+    def test_volatile_dates(self):
+        """ Relative dates are always candidates.
+        """
+        titles, plan = _list('due_date > 2022-12-01')
+        self.assertEqual(['TP-3'], titles)
+
+    def test_scan(self):
+        """ Filters the index can't answer are scanned.
+        """
+        titles, plan = _list('z.title == "TP-4" or stage == "todo"')
+        self.assertEqual(['TP-1', 'TP-3', 'TP-4'], titles)
+        self.assertIsNone(plan.root)
+        self.assertIn('full scan', plan.explain())
+
+    def test_stale_entries(self):
+        """ Zettels changed since they were indexed are always candidates.
+        """
+        _write('TP-4', 'stage: review\n', age=30)
+        titles, plan = _list('stage == "review"')
+        self.assertEqual(['TP-2', 'TP-4'], titles)
+
+    def test_active_span(self):
+        """ Spans cover every day a zettel's events may be active on.
+        """
+        self.assertIsNone(active_span({'stage': 'todo'}))
+        self.assertEqual(('2022-11-01', '2022-11-01'), active_span({'event_begin': date(2022, 11, 1)}))
+        self.assertEqual(
+            ('2022-11-01', '2022-11-03'),
+            active_span({'event_begin': '2022-11-01, Tue, 10:00', 'event_end': '2022-11-03, Thu, 12:00'}))
+        self.assertEqual(
+            ('2022-11-01', SPAN_MAX), active_span({'event_begin': '2022-11-01', 'duration': '2h'}))
+        self.assertEqual(
+            ('2022-11-01', SPAN_MAX), active_span({'event_begin': '2022-11-01', 'recurring': 'FREQ=DAILY'}))
+        self.assertEqual(
+            ('2022-11-01', '2022-12-01'),
+            active_span({'event_begin': '2022-11-01', 'recurring': 'FREQ=DAILY', 'recurring_stop': '2022-12-01'}))
+        self.assertEqual((SPAN_MIN, SPAN_MAX), active_span({'due_date': 'next friday'}))
+
+    def test_active_window(self):
+        """ Only zettels that may be active within a window are loaded.
+        """
+        def titles(window):
+            return sorted(z.title for z in load_zettels(project, where=window))
+
+        self.assertEqual(['TP-2', 'TP-3'], titles(ActiveWindow(date(2022, 11, 1))))
+        self.assertEqual(['TP-1', 'TP-3'], titles(ActiveWindow(date(2022, 10, 30), date(2022, 11, 1))))
+        self.assertEqual(['TP-3'], titles(ActiveWindow(date(2022, 11, 6), date(2022, 11, 10))))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,174 @@
+import os
+import random
+import unittest
+from argparse import Namespace
+from datetime import date, datetime, timedelta
+from unittest import mock
+
+import recurring_ical_events
+from libzet import Zettel
+
+import master.cli.todo.main
+import master.util.load
+from master.cli.todo.main import (bucket_events, expand_recurring, extract_calendar, extract_events, todo_window,
+                                  watch_todo)
+from master.util.cache import OccurrenceCache
+
+
+resources = '{}/resources'.format(os.path.dirname(__file__))
+cache_path = f'{resources}/test_occurrences.sqlite'
+
+
+def _args(**kwargs):
+    args = {'date': 'today', 'from_': None, 'to': None, 'days': None}
+    args.update(kwargs)
+    return Namespace(**args)
+
+
+class _Stop(Exception):
+    pass
+
+
+def _uids(events):
+    return sorted(str(e.uid) for e in events)
+
+
+class TestTodo(unittest.TestCase):
+
+    def setUp(self):
+        self.zettels = [
+            Zettel('standup', {}, {'event_begin': '2022-11-01 09:00', 'recurring': 'FREQ=DAILY'}),
+            Zettel('trip', {}, {'event_begin': '2022-11-02', 'event_end': '2022-11-04'}),
+            Zettel('dentist', {}, {'event_begin': '2022-11-03'}),
+            Zettel('report', {}, {'due_date': '2022-11-03 15:00'}),
+            Zettel('notes', {}, {'stage': 'todo'}),
+        ]
+
+    def test_window(self):
+        """ Windows cover --date, --from to --to, or --days days.
+        """
+        self.assertEqual(
+            (date(2022, 11, 1), date(2022, 11, 2)), todo_window(_args(date='2022-11-01')))
+        self.assertEqual(
+            (date(2022, 11, 1), date(2022, 11, 4)), todo_window(_args(from_='2022-11-01', to='2022-11-03')))
+        self.assertEqual(
+            (date(2022, 11, 1), date(2022, 11, 8)), todo_window(_args(date='2022-11-01', days=7)))
+
+        with self.assertRaises(ValueError):
+            todo_window(_args(days=0))
+
+    def test_watch_midnight(self):
+        """ Zettels are loaded again, not served from memory, once the day changed.
+        """
+        today = [date(2022, 11, 1)]
+
+        class Date(date):
+            @classmethod
+            def today(cls):
+                return today[0]
+
+        def changes(timeout):
+            if today[0] == date(2022, 11, 2):
+                raise _Stop()
+            today[0] = date(2022, 11, 2)
+            master.util.load._memory[('a.md', 'md')] = 'kept yesterday'
+            return []
+
+        watcher = mock.Mock()
+        watcher.changes.side_effect = changes
+        args = _args(date='2022-11-01', list_active=False, jobs=1)
+        window = todo_window(args)
+
+        # What was kept in memory whenever zettels were loaded.
+        loaded = []
+
+        def load(args, start, end):
+            loaded.append(dict(master.util.load._memory))
+            return []
+
+        with mock.patch.object(master.cli.todo.main, 'date', Date), \
+                mock.patch.object(master.cli.todo.main, '_load', side_effect=load), \
+                mock.patch.object(master.cli.todo.main, 'todo_output', return_value=''), \
+                mock.patch.object(master.cli.todo.main, 'redraw'), \
+                mock.patch.object(master.cli.todo.main.resolver, 'save'), \
+                mock.patch.object(master.util.load, '_memory', {}):
+            with self.assertRaises(_Stop):
+                watch_todo(args, watcher, [], window)
+
+        # The window didn't change, but the day did.
+        self.assertEqual([{}], loaded)
+
+    def test_buckets(self):
+        """ Events are bucketed into every day they're active on.
+        """
+        start, end = date(2022, 11, 1), date(2022, 11, 5)
+        days = bucket_events(*extract_events(self.zettels, start, end), start, end)
+
+        self.assertEqual([start + timedelta(days=i) for i in range(4)], [d for d, _, _ in days])
+        self.assertEqual([[], ['trip'], ['dentist', 'trip'], []], [_uids(g) for _, g, _ in days])
+        self.assertEqual([1, 1, 2, 1], [len(s) for _, _, s in days])
+
+    def test_same_as_single_days(self):
+        """ A window holds the same events as each of its days.
+        """
+        start, end = date(2022, 11, 1), date(2022, 11, 5)
+        for day, g, s in bucket_events(*extract_events(self.zettels, start, end), start, end):
+            single = extract_events(self.zettels, day, day + timedelta(days=1))
+            self.assertEqual((_uids(single[0]), _uids(single[1])), (_uids(g), _uids(s)))
+
+    def test_same_as_recurrence_engine(self):
+        """ Non-recurring events are found just like expanding them would.
+        """
+        rng = random.Random(0)
+        zettels = []
+        for i in range(200):
+            begin = datetime(2022, 11, 1) + timedelta(hours=rng.randint(0, 24 * 10))
+            attrs = {'event_begin': begin if rng.random() < 0.5 else begin.date()}
+            if rng.random() < 0.3:
+                attrs['duration'] = f'{rng.randint(1, 60 * 48)} minutes'
+            elif rng.random() < 0.3:
+                attrs['event_end'] = begin + timedelta(hours=rng.randint(0, 60))
+            zettels.append(Zettel(f'z{i}', {}, attrs))
+
+        cal = extract_calendar(zettels)
+        for i in range(10):
+            start = date(2022, 11, 1) + timedelta(days=i)
+            end = start + timedelta(days=rng.randint(1, 3))
+
+            exp = recurring_ical_events.of(cal).between(
+                datetime(start.year, start.month, start.day), datetime(end.year, end.month, end.day))
+            general, specific = extract_events(zettels, start, end)
+            self.assertEqual(
+                sorted((str(e['UID']), e['DTSTART'].dt) for e in exp),
+                sorted((e.uid, e.start) for e in general + specific))
+
+    def test_occurrence_cache(self):
+        """ Unchanged recurring events aren't expanded again.
+        """
+        start, end = date(2022, 11, 1), date(2022, 11, 8)
+        recurring = self.zettels[:1]
+        exp = expand_recurring(recurring, start, end)
+        self.assertEqual(7, len(exp))
+
+        try:
+            cache = OccurrenceCache(cache_path)
+            self.assertEqual(exp, expand_recurring(recurring, start, end, cache))
+            cache.close()
+
+            cache = OccurrenceCache(cache_path)
+            with mock.patch.object(master.cli.todo.main, 'extract_calendar', side_effect=AssertionError):
+                self.assertEqual(exp, expand_recurring(recurring, start, end, cache))
+
+            # Changed events and other windows are expanded.
+            recurring[0].attrs['recurring'] = 'FREQ=DAILY;INTERVAL=2'
+            self.assertEqual(4, len(expand_recurring(recurring, start, end, cache)))
+            self.assertEqual(1, len(expand_recurring(recurring, start, start + timedelta(days=1), cache)))
+            cache.close()
+
+        finally:
+            if os.path.exists(cache_path):
+                os.remove(cache_path)
+
+
+if __name__ == '__main__':
+    unittest.main()
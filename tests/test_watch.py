@@ -0,0 +1,80 @@
+import os
+import shutil
+import unittest
+
+import master.util.watch
+from master.util.watch import Watcher, load_changed
+
+
+resources = '{}/resources'.format(os.path.dirname(__file__))
+vault = f'{resources}/test_watched'
+
+
+def _write(path, title):
+    with open(path, 'w') as f:
+        f.write(f'# {title}\n<!--- attributes --->\nstage: todo\n')
+
+
+class TestWatch(unittest.TestCase):
+
+    def setUp(self):
+        os.makedirs(f'{vault}/sub')
+        _write(f'{vault}/a.md', 'A')
+        _write(f'{vault}/sub/b.md', 'B')
+        self.poll_interval = master.util.watch.POLL_INTERVAL
+        master.util.watch.POLL_INTERVAL = 0.05
+
+    def tearDown(self):
+        master.util.watch.POLL_INTERVAL = self.poll_interval
+        shutil.rmtree(vault)
+
+    def check(self, poll):
+        with Watcher(vault, recurse=True, poll=poll) as w:
+            self.assertEqual(set(), w.changes(timeout=0.1))
+
+            # Saving by rename is one change, and other or ignored files don't count.
+            _write(f'{vault}/.a.md.tmp', 'A2')
+            os.replace(f'{vault}/.a.md.tmp', f'{vault}/a.md')
+            _write(f'{vault}/notes.txt', 'not a zettel')
+            os.makedirs(f'{vault}/.git')
+            _write(f'{vault}/.git/ignored.md', 'Ignored')
+            self.assertEqual({f'{vault}/a.md'}, w.changes(timeout=5))
+
+            # New directories are watched, and removed ones report their zettels.
+            os.makedirs(f'{vault}/new')
+            _write(f'{vault}/new/c.md', 'C')
+            self.assertIn(f'{vault}/new/c.md', w.changes(timeout=5))
+            _write(f'{vault}/new/c.md', 'C2')
+            self.assertEqual({f'{vault}/new/c.md'}, w.changes(timeout=5))
+
+            shutil.rmtree(f'{vault}/sub')
+            self.assertEqual({f'{vault}/sub/b.md'}, w.changes(timeout=5))
+
+    def test_inotify(self):
+        if not master.util.watch._libc():
+            self.skipTest('inotify is not available')
+        self.check(poll=False)
+
+    def test_poll(self):
+        self.check(poll=True)
+
+    def test_files(self):
+        """ Watched files are reported as they were given, and only themselves.
+        """
+        with Watcher(f'{vault}/sub/b.md') as w:
+            _write(f'{vault}/sub/c.md', 'C')
+            self.assertEqual(set(), w.changes(timeout=0.3))
+            os.remove(f'{vault}/sub/b.md')
+            self.assertEqual({f'{vault}/sub/b.md'}, w.changes(timeout=5))
+
+    def test_load_changed(self):
+        with open(f'{vault}/bad.md', 'w') as f:
+            f.write('# Bad\n<!--- attributes --->\n: [\n')
+
+        zettels, removed = load_changed({f'{vault}/a.md', f'{vault}/bad.md', f'{vault}/gone.md'})
+        self.assertEqual(['A'], [z.title for z in zettels])
+        self.assertEqual([f'{vault}/gone.md'], removed)
+
+
+if __name__ == '__main__':
+    unittest.main()